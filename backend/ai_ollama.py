@@ -1,97 +1,183 @@
-# Gemini API call function
-async def call_gemini(prompt: str, system_prompt: str = None) -> str:
-    """Call Google Gemini Pro API (v1 endpoint)"""
-    url = f"https://generativelanguage.googleapis.com/v1/models/gemini-1.5-flash:generateContent?key={GEMINI_API_KEY}"
-    headers = {
-        "Content-Type": "application/json"
-    }
-    # Gemini v1 expects a single user prompt in 'parts'
-    parts = []
-    if system_prompt:
-        parts.append({"text": system_prompt})
-    parts.append({"text": prompt})
-    payload = {
-        "contents": [
-            {
-                "parts": parts
-            }
-        ]
-    }
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, headers=headers, json=payload) as resp:
-            data = await resp.json()
-            if resp.status == 200 and "candidates" in data:
-                return data["candidates"][0]["content"]["parts"][0]["text"]
-            else:
-                return f"AI Agni error: {data.get('error', {}).get('message', 'Unknown error')}"
-import json
 import os
-import aiohttp
-from typing import List, Dict
+import time
+from typing import Any, AsyncIterator, Callable, List, Dict, Optional, Tuple, Type, Union
+from pydantic import BaseModel, ConfigDict, ValidationError
+from llm_providers import ProviderError, gemini, ollama, openrouter, router
+from utils.json_extract import JSONStreamExtractor, extract_items
+from utils.latency import LatencyWindow
+from utils.llm_cache import LLMCache
+from utils.single_flight import SingleFlight
+
+# Parsed results of the JSON-producing features; chat replies are not cached
+llm_cache = LLMCache(
+    maxsize=int(os.getenv("LLM_CACHE_SIZE", "1000")),
+    ttl=float(os.getenv("LLM_CACHE_TTL_SECONDS", "86400")),
+    path=os.getenv("LLM_CACHE_PATH") or None,
+)
 
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+# Identical prompts already on their way to the provider share one upstream call
+llm_flights = SingleFlight()
 
-OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
+async def _as_text(completion) -> str:
+    """Provider errors become the "AI Agni error: ..." replies the endpoints have always returned"""
+    try:
+        return await completion
+    except ProviderError as e:
+        return f"AI Agni error: {e}"
 
-OPENROUTER_MODEL = "meta-llama/llama-3.1-8b-instruct"
+async def call_gemini(prompt: str, system_prompt: str = None) -> str:
+    """Call Google Gemini directly"""
+    return await _as_text(gemini.complete(prompt, system_prompt))
 
 async def call_openrouter(prompt: str, system_prompt: str = None) -> str:
-    """Call OpenRouter API with Google: Gemma 3n 2B"""
-    url = "https://openrouter.ai/api/v1/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    messages = []
-    if system_prompt:
-        messages.append({"role": "system", "content": system_prompt})
-    messages.append({"role": "user", "content": prompt})
-    payload = {
-        "model": OPENROUTER_MODEL,
-        "messages": messages,
-        "max_tokens": 1024,
-        "temperature": 0.7
-    }
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, headers=headers, json=payload) as resp:
-            data = await resp.json()
-            if resp.status == 200 and "choices" in data:
-                return data["choices"][0]["message"]["content"]
-            else:
-                return f"AI Agni error: {data.get('error', {}).get('message', 'Unknown error')}"
+    """Call OpenRouter directly"""
+    return await _as_text(openrouter.complete(prompt, system_prompt))
+
+async def call_ollama(prompt: str, system_prompt: str = None) -> str:
+    """Call the Ollama server at OLLAMA_HOST directly"""
+    return await _as_text(ollama.complete(prompt, system_prompt))
+
+async def call_llm(prompt: str, system_prompt: str = None) -> str:
+    """Call whichever configured provider the router picks, with fallback (and hedging, if enabled)"""
+    return await _as_text(router.complete(prompt, system_prompt))
+
+def _is_error(response: str) -> bool:
+    return response.startswith("AI Agni error:")
+
+async def _cached_completion(prompt: str, system_prompt: str, parse: Callable[[str], Any]) -> Any:
+    """call_llm + parse, answered from llm_cache for repeat prompts. Provider errors are not cached."""
+    key = llm_cache.key(prompt, system_prompt, router.model_key)
+    result = llm_cache.get(key)
+    if result is not None:
+        return result
+
+    async def complete():
+        response = await call_llm(prompt, system_prompt)
+        result = parse(response)
+        if not _is_error(response):
+            llm_cache.set(key, result)
+        return result
+
+    return await llm_flights.do(key, complete)
+
+async def _streamed_items(prompt: str, system_prompt: str, validate: Callable[[Any], Any],
+                          fallback: Callable[[str], List[Dict]]) -> AsyncIterator[Dict]:
+    """Yield each validated item as soon as the model has finished generating it.
+
+    The complete list is cached like _cached_completion's result; if the reply
+    holds no usable items, the fallback items are yielded instead.
+    """
+    key = llm_cache.key(prompt, system_prompt, router.model_key)
+    cached = llm_cache.get(key)
+    if cached is not None:
+        for item in cached:
+            yield item
+        return
+
+    extractor = JSONStreamExtractor(validate)
+    items = []
+    try:
+        async for chunk in router.stream(prompt, system_prompt):
+            for item in extractor.feed(chunk):
+                items.append(item)
+                yield item
+    except ProviderError as e:
+        if not items:
+            for item in fallback(f"AI Agni error: {e}"):
+                yield item
+        return
+    if not items:
+        items = fallback(extractor.text)
+        for item in items:
+            yield item
+    llm_cache.set(key, items)
+
+# Expected shapes of the JSON-producing features. Missing optional fields get
+# defaults; extra fields the model adds are kept.
+class ProjectSuggestion(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    title: str
+    description: str = ""
+    difficulty: str = "intermediate"
+    technologies: Union[List[Any], str] = []
+    estimated_time: str = ""
+
+class WebsiteResult(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    name: str
+    url: str = ""
+    description: str = ""
+    category: str = ""
+    sells_project: bool = False
+    note: str = ""
+
+class DomainIdea(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    title: str
+    description: str = ""
+    key_features: Union[List[Any], str] = []
+
+class ImprovementResult(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    original_idea: Optional[str] = None
+    improvements: Any = ""
+    technical_suggestions: List[Any] = []
+    feature_suggestions: List[Any] = []
+
+def _validator(schema: Type[BaseModel]) -> Callable[[Any], Optional[Dict]]:
+    def validate(item):
+        try:
+            return schema.model_validate(item).model_dump()
+        except ValidationError:
+            return None
+    return validate
+
+def _suggestion_fallback(query: str, response: str) -> List[Dict]:
+    return [
+        {
+            "title": f"Project Idea for {query}",
+            "description": response[:200] + "...",
+            "difficulty": "intermediate",
+            "technologies": ["Python", "JavaScript"],
+            "estimated_time": "2-4 weeks"
+        }
+    ]
+
+def _website_fallback(response: str) -> List[Dict]:
+    return [{"name": "AI Response", "description": response}]
 
 async def get_project_suggestions(query: str) -> List[Dict]:
     """Get 5 project suggestions based on query"""
+    prompt, system_prompt = _suggestion_prompts(query)
+    return await _cached_completion(prompt, system_prompt, lambda response: _parse_suggestions(query, response))
+
+async def stream_project_suggestions(query: str) -> AsyncIterator[Dict]:
+    """get_project_suggestions, yielding each suggestion as soon as it is complete"""
+    prompt, system_prompt = _suggestion_prompts(query)
+    async for item in _streamed_items(prompt, system_prompt, _validator(ProjectSuggestion),
+                                      lambda response: _suggestion_fallback(query, response)):
+        yield item
+
+def _suggestion_prompts(query: str) -> Tuple[str, str]:
     prompt = f"Based on the query '{query}', suggest 5 innovative project ideas. Format your response as a JSON array with objects containing: title, description, difficulty (beginner/intermediate/advanced), technologies (array), estimated_time."
     system_prompt = "You are an expert project mentor. Always return only valid JSON as described."
-    response = await call_gemini(prompt, system_prompt)
-    import re
-    # Try to extract JSON from markdown or plain text
-    match = re.search(r'```json([\s\S]*?)```', response)
-    json_str = None
-    if match:
-        json_str = match.group(1).strip()
-    else:
-        # Try to find first [ ... ] or { ... }
-        match = re.search(r'(\[.*\]|\{.*\})', response, re.DOTALL)
-        if match:
-            json_str = match.group(1)
-    try:
-        suggestions = json.loads(json_str if json_str else response)
-        return suggestions
-    except Exception:
-        return [
-            {
-                "title": f"Project Idea for {query}",
-                "description": response[:200] + "...",
-                "difficulty": "intermediate",
-                "technologies": ["Python", "JavaScript"],
-                "estimated_time": "2-4 weeks"
-            }
-        ]
+    return prompt, system_prompt
+
+def _parse_suggestions(query: str, response: str) -> List[Dict]:
+    return extract_items(response, _validator(ProjectSuggestion)) or _suggestion_fallback(query, response)
 
 async def get_relevant_websites(query: str) -> List[Dict]:
     """Get 5 websites that sell projects and check if they sell the queried project"""
+    prompt, system_prompt = _website_prompts(query)
+    return await _cached_completion(prompt, system_prompt, _parse_websites)
+
+async def stream_relevant_websites(query: str) -> AsyncIterator[Dict]:
+    """get_relevant_websites, yielding each website as soon as it is complete"""
+    prompt, system_prompt = _website_prompts(query)
+    async for item in _streamed_items(prompt, system_prompt, _validator(WebsiteResult), _website_fallback):
+        yield item
+
+def _website_prompts(query: str) -> Tuple[str, str]:
     prompt = (
         f"Check the following websites: https://projectbazaar.in/, https://www.buyprojectcode.in/, https://www.pantechsolutions.net/, https://takeoffprojects.com/, https://www.projectsforyou.com/, https://www.fiverr.com/, https://www.upwork.com/, https://github.com/ and other similar platforms where students can buy, sell, or find academic/engineering projects. "
         f"For the query '{query}', search each website and indicate if they are selling or offering this particular project or something very similar. "
@@ -99,79 +185,66 @@ async def get_relevant_websites(query: str) -> List[Dict]:
         f"If you cannot find the project on a site, say so in the note. Format your response as a JSON array as described."
     )
     system_prompt = "You are a helpful assistant. Always return only valid JSON as described."
-    response = await call_gemini(prompt, system_prompt)
-    import re
-    # Try to extract JSON from markdown or plain text
-    match = re.search(r'```json([\s\S]*?)```', response)
-    json_str = None
-    if match:
-        json_str = match.group(1).strip()
-    else:
-        # Try to find first [ ... ] or { ... }
-        match = re.search(r'(\[.*\]|\{.*\})', response, re.DOTALL)
-        if match:
-            json_str = match.group(1)
-    try:
-        data = json.loads(json_str if json_str else response)
-        # Always return as array
-        if isinstance(data, list):
-            return data
-        elif isinstance(data, dict):
-            return [data]
-        else:
-            return [{"name": "AI Response", "description": str(data)}]
-    except Exception:
-        return [{"name": "AI Response", "description": response}]
+    return prompt, system_prompt
+
+def _parse_websites(response: str) -> List[Dict]:
+    return extract_items(response, _validator(WebsiteResult)) or _website_fallback(response)
 
 async def get_domain_ideas(domain: str) -> List[Dict]:
     """Get 10 new ideas based on selected domain"""
     prompt = f"Generate 10 creative project ideas for the domain '{domain}'. Focus on innovative, practical projects that students can build. Format as JSON array with title, description, and key_features."
     system_prompt = "You are an expert project mentor. Always return only valid JSON as described."
-    response = await call_gemini(prompt, system_prompt)
-    try:
-        return json.loads(response)
-    except Exception:
-        return []
+    return await _cached_completion(prompt, system_prompt, _parse_domain_ideas)
+
+def _parse_domain_ideas(response: str) -> List[Dict]:
+    return extract_items(response, _validator(DomainIdea))
 
 async def improve_idea(idea: str) -> Dict:
     """Suggest improvements for a project idea"""
     prompt = f"Analyze this project idea and suggest improvements: '{idea}'. Provide suggestions for: technical enhancements, feature additions, best practices, potential challenges and solutions. Format as JSON with keys: improvements, technical_suggestions (array), feature_suggestions (array)."
     system_prompt = "You are an expert project reviewer. Always return only valid JSON as described."
-    response = await call_gemini(prompt, system_prompt)
-    import re
-    match = re.search(r'```json([\s\S]*?)```', response)
-    json_str = None
-    if match:
-        json_str = match.group(1).strip()
-    else:
-        match = re.search(r'(\{.*\})', response, re.DOTALL)
-        if match:
-            json_str = match.group(1)
+    return await _cached_completion(prompt, system_prompt, lambda response: _parse_improvement(idea, response))
+
+def _parse_improvement(idea: str, response: str) -> Dict:
+    validate = _validator(ImprovementResult)
+
     def flatten_any_improvement(data):
         # Recursively flatten any nested 'improvement' key
         while isinstance(data, dict) and "improvement" in data and isinstance(data["improvement"], dict):
             data = data["improvement"]
-        return data
-    try:
-        data = json.loads(json_str if json_str else response)
-        data = flatten_any_improvement(data)
-        return {
-            "original_idea": data.get("original_idea", idea),
-            "improvements": data.get("improvements", ""),
-            "technical_suggestions": data.get("technical_suggestions", []),
-            "feature_suggestions": data.get("feature_suggestions", [])
-        }
-    except Exception:
+        return validate(data)
+
+    items = extract_items(response, flatten_any_improvement)
+    if not items:
         return {
             "original_idea": idea,
             "improvements": response,
             "technical_suggestions": [],
             "feature_suggestions": []
         }
+    improvement = items[0]
+    improvement["original_idea"] = improvement["original_idea"] or idea
+    return improvement
+
+CHAT_SYSTEM_PROMPT = "You are a helpful assistant for a project marketplace platform."
+
+def _chat_prompt(message: str) -> str:
+    return f"User message: '{message}'. Provide a helpful, concise response related to project development, programming, or academic guidance."
+
+# Time from request to the first streamed chat token
+chat_ttft = LatencyWindow()
 
 async def chat_with_ollama(message: str) -> str:
     """Chat with Ollama for general help"""
-    prompt = f"User message: '{message}'. Provide a helpful, concise response related to project development, programming, or academic guidance."
-    system_prompt = "You are a helpful assistant for a project marketplace platform."
-    response = await call_gemini(prompt, system_prompt)
+    response = await call_llm(_chat_prompt(message), CHAT_SYSTEM_PROMPT)
     return response
+
+async def stream_chat_with_ollama(message: str) -> AsyncIterator[str]:
+    """chat_with_ollama, yielding the reply as it is generated"""
+    started = time.perf_counter()
+    first = True
+    async for chunk in router.stream(_chat_prompt(message), CHAT_SYSTEM_PROMPT):
+        if first:
+            chat_ttft.record(time.perf_counter() - started)
+            first = False
+        yield chunk
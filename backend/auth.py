@@ -3,12 +3,23 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from starlette.status import HTTP_401_UNAUTHORIZED
 from fastapi.security.utils import get_authorization_scheme_param
 from datetime import datetime
-from utils.supabase_client import get_supabase_client
+from utils.supabase_client import get_supabase_client, new_auth_client
+from utils.ttl_cache import TTLCache
+from utils import metrics
+from utils.executor import run_blocking
+from utils.bulk import run_bounded
+import csv
+import io
+import json
 import logging
+import os
+import random
+import jwt
 
 from pydantic import BaseModel
 import asyncio
 import time
+from typing import AsyncIterator, Dict, List
 
 class RegisterRequest(BaseModel):
     name: str
@@ -35,7 +46,7 @@ async def register_user(data: RegisterRequest):
 @router.post("/login")
 def login_user(email: str = Body(...), password: str = Body(...)):
     try:
-        supabase = get_supabase_client()
+        supabase = new_auth_client()
         result = supabase.auth.sign_in_with_password({
             "email": email,
             "password": password
@@ -46,20 +57,126 @@ def login_user(email: str = Body(...), password: str = Body(...)):
         raise HTTPException(status_code=401, detail="Invalid email or password")
 
 
-security = HTTPBearer()
+security = HTTPBearer(auto_error=False)
 
+# Tokens are verified locally when the project's JWT secret (HS256) or JWKS (asymmetric keys)
+# is configured; otherwise we fall back to asking Supabase Auth on every request.
+SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
+SUPABASE_JWKS_URL = os.getenv("SUPABASE_JWKS_URL")
+SUPABASE_JWT_AUDIENCE = os.getenv("SUPABASE_JWT_AUDIENCE", "authenticated")
 
+_jwks_client = jwt.PyJWKClient(SUPABASE_JWKS_URL, cache_keys=True) if SUPABASE_JWKS_URL else None
 
+profile_cache = TTLCache(
+    maxsize=int(os.getenv("PROFILE_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("PROFILE_CACHE_TTL_SECONDS", "300")),
+)
 
+async def verify_token(token: str) -> str:
+    """Return the user id the token was issued for, raising HTTPException if it is not valid"""
+    try:
+        if SUPABASE_JWT_SECRET:
+            payload = jwt.decode(token, SUPABASE_JWT_SECRET, algorithms=["HS256"], audience=SUPABASE_JWT_AUDIENCE)
+            return payload["sub"]
+        if _jwks_client:
+            # Only the first lookup per key id fetches the JWKS document
+            signing_key = await run_blocking(_jwks_client.get_signing_key_from_jwt, token)
+            payload = jwt.decode(token, signing_key.key, algorithms=["RS256", "ES256"], audience=SUPABASE_JWT_AUDIENCE)
+            return payload["sub"]
+    except (jwt.PyJWTError, KeyError) as e:
+        logging.warning(f"Rejected bearer token: {e}")
+        raise HTTPException(status_code=HTTP_401_UNAUTHORIZED, detail="Invalid or expired token.")
 
+    user_response = await run_blocking(get_supabase_client().auth.get_user, token)
+    if not user_response.user:
+        logging.error("Supabase could not validate user from token.")
+        raise HTTPException(status_code=HTTP_401_UNAUTHORIZED, detail="Invalid or expired token.")
+    return user_response.user.id
 
-async def create_user(email: str, password: str, name: str, role: str):
+async def get_profile(user_id: str):
+    """profiles row for user_id, served from the TTL cache when possible"""
+    profile = profile_cache.get(user_id)
+    if profile is None:
+        response = await run_blocking(get_supabase_client().table("profiles").select("*").eq("id", user_id).execute)
+        if not response.data:
+            return None
+        profile = response.data[0]
+        profile_cache.set(user_id, profile)
+    return profile
+
+def invalidate_profile(user_id: str):
+    """Drop a cached profile, e.g. after its role or name changed"""
+    profile_cache.invalidate(user_id)
+
+
+
+
+
+
+# New accounts get their profiles row either from the API ("insert", retried with backoff
+# while the auth user becomes visible to the profiles foreign key) or from the auth.users
+# trigger in profile_sync.sql ("trigger"), in which case the API only waits for the row.
+PROFILE_SYNC = os.getenv("PROFILE_SYNC", "insert")
+PROFILE_SYNC_RETRIES = int(os.getenv("PROFILE_SYNC_RETRIES", "6"))
+PROFILE_SYNC_BACKOFF_SECONDS = float(os.getenv("PROFILE_SYNC_BACKOFF_SECONDS", "0.1"))
+PROFILE_SYNC_BACKOFF_MAX = 5.0
+
+# Bulk onboarding: auth users created in parallel, profiles written in chunks
+BULK_REGISTER_CONCURRENCY = int(os.getenv("BULK_REGISTER_CONCURRENCY", "8"))
+BULK_REGISTER_CHUNK = int(os.getenv("BULK_REGISTER_CHUNK", "200"))
+BULK_REGISTER_MAX_ROWS = int(os.getenv("BULK_REGISTER_MAX_ROWS", "5000"))
+BULK_REGISTER_ROLES = ("student",)
+
+def _profile_row(user_id: str, email: str, name: str, role: str) -> Dict:
+    return {
+        "id": user_id,
+        "name": name,
+        "email": email,
+        "role": role,
+        "created_at": datetime.utcnow().isoformat()
+    }
+
+async def _with_backoff(operation, description: str):
+    """Await operation() until it succeeds, sleeping with jittered exponential backoff in between"""
+    for attempt in range(PROFILE_SYNC_RETRIES):
+        try:
+            return await operation()
+        except Exception as e:
+            if attempt == PROFILE_SYNC_RETRIES - 1:
+                raise
+            # Full jitter: a bulk import's chunks don't all retry in lockstep
+            delay = random.uniform(0, min(PROFILE_SYNC_BACKOFF_MAX, PROFILE_SYNC_BACKOFF_SECONDS * 2 ** (attempt + 1)))
+            logging.warning(f"{description} failed ({e}); retry {attempt + 1}/{PROFILE_SYNC_RETRIES - 1} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+async def sync_profiles(profiles: List[Dict]):
+    """Make sure a profiles row exists for each newly created auth user"""
     supabase = get_supabase_client()
+    if PROFILE_SYNC == "trigger":
+        ids = [profile["id"] for profile in profiles]
+
+        async def check():
+            response = await run_blocking(supabase.table("profiles").select("id").in_("id", ids).execute)
+            missing = set(ids) - {row["id"] for row in response.data or []}
+            if missing:
+                raise Exception(f"{len(missing)} profiles not created by the trigger yet")
+
+        await _with_backoff(check, "Profile sync check")
+    else:
+        # Upsert, so a retry after a partially applied attempt cannot hit a duplicate key
+        await _with_backoff(
+            lambda: run_blocking(supabase.table("profiles").upsert(profiles, on_conflict="id").execute),
+            f"Inserting {len(profiles)} profiles",
+        )
+    for profile in profiles:
+        invalidate_profile(profile["id"])
 
-    # Step 1: Create user in Supabase Auth
-    auth_response = supabase.auth.sign_up({
+async def create_user(email: str, password: str, name: str, role: str):
+    # Step 1: Create user in Supabase Auth; the metadata is what profile_sync.sql reads
+    auth_response = await run_blocking(new_auth_client().auth.sign_up, {
         "email": email,
-        "password": password
+        "password": password,
+        "options": {"data": {"name": name, "role": role}},
     })
 
     if not auth_response.user:
@@ -67,47 +184,124 @@ async def create_user(email: str, password: str, name: str, role: str):
 
     user_id = auth_response.user.id
 
-    # Step 2: Retry insert into profiles with up to 5 attempts
-    profile_data = {
+    # Step 2: Create (or wait for) the profiles row
+    try:
+        await sync_profiles([_profile_row(user_id, email, name, role)])
+    except Exception as e:
+        raise Exception(f"Failed to insert user profile: {e}")
+    return {
         "id": user_id,
-        "name": name,
         "email": email,
-        "role": role,
-        "created_at": datetime.utcnow().isoformat()
+        "name": name,
+        "role": role
     }
 
-    max_retries = 5
-    for i in range(max_retries):
+def parse_roster(content: bytes, content_type: str) -> List[Dict]:
+    """Users from a CSV (header row with name, email and optional password/role) or a JSON
+    list (or {"users": [...]}). Raises ValueError for anything else."""
+    try:
+        text = content.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise ValueError("Roster must be UTF-8 encoded")
+    if "json" in content_type or text.lstrip().startswith(("[", "{")):
         try:
-            supabase.table("profiles").insert(profile_data).execute()
-            return {
-                "id": user_id,
-                "email": email,
-                "name": name,
-                "role": role
-            }
-        except Exception as e:
-            print(f"Retry {i+1}/5: Supabase user not synced yet. Waiting...")
-            await asyncio.sleep(2)
+            data = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON roster: {e}")
+        users = data.get("users") if isinstance(data, dict) else data
+        if not isinstance(users, list) or not all(isinstance(user, dict) for user in users):
+            raise ValueError("JSON roster must be a list of user objects")
+    else:
+        reader = csv.DictReader(io.StringIO(text))
+        if not reader.fieldnames or not {"name", "email"} <= {field.strip().lower() for field in reader.fieldnames}:
+            raise ValueError("CSV roster needs a header row with at least name and email columns")
+        # Cells beyond the header (DictReader's None key) are ignored
+        users = [{key.strip().lower(): (value or "").strip() for key, value in row.items() if key is not None}
+                 for row in reader]
+    if not users:
+        raise ValueError("Roster is empty")
+    if len(users) > BULK_REGISTER_MAX_ROWS:
+        raise ValueError(f"Roster has {len(users)} users; at most {BULK_REGISTER_MAX_ROWS} per import")
+    return users
 
-    raise Exception("Failed to insert user profile after multiple retries")
+async def _create_auth_user(index: int, user: Dict) -> Dict:
+    email = str(user.get("email") or "").strip().lower()
+    name = str(user.get("name") or "").strip()
+    role = str(user.get("role") or "student").strip().lower()
+    password = user.get("password") or None
+    result = {"row": index, "email": email}
+    if not email or "@" not in email or not name:
+        return {**result, "status": "failed", "error": "name and a valid email are required"}
+    if role not in BULK_REGISTER_ROLES:
+        return {**result, "status": "failed", "error": f"role must be one of {', '.join(BULK_REGISTER_ROLES)}"}
+    metadata = {"name": name, "role": role}
+    admin = get_supabase_client().auth.admin
+    try:
+        if password:
+            # Admin API: no confirmation mail and no per-IP signup rate limit
+            response = await run_blocking(admin.create_user, {
+                "email": email, "password": password, "email_confirm": True, "user_metadata": metadata,
+            })
+            status = "created"
+        else:
+            response = await run_blocking(admin.invite_user_by_email, email, {"data": metadata})
+            status = "invited"
+    except Exception as e:
+        return {**result, "status": "failed", "error": str(e)}
+    user_id = response.user.id
+    return {**result, "status": status, "id": user_id, "profile": _profile_row(user_id, email, name, role)}
+
+async def bulk_create_users(users: List[Dict]) -> AsyncIterator[Dict]:
+    """Create auth users with bounded concurrency and their profiles in chunks, yielding one
+    result per row as soon as its profile is in place, then a summary.
+
+    Profiles are flushed when a chunk is full or no other result is waiting, so rows
+    stream back promptly when signups are slow and batch up when they are fast.
+    """
+    started = time.perf_counter()
+    counts = {"created": 0, "invited": 0, "failed": 0}
+    pending: List[Dict] = []
+    failed = lambda index, e: {"row": index, "email": str(users[index].get("email") or "").strip().lower(),
+                               "status": "failed", "error": str(e)}
+    results = run_bounded(len(users), lambda index: _create_auth_user(index, users[index]),
+                          BULK_REGISTER_CONCURRENCY, failed)
+    try:
+        async for result, idle in results:
+            if result["status"] == "failed":
+                counts["failed"] += 1
+                yield result
+            else:
+                pending.append(result)
+            if pending and (len(pending) >= BULK_REGISTER_CHUNK or idle):
+                try:
+                    with metrics.trace("auth.bulk_profiles", rows=len(pending)):
+                        await sync_profiles([result.pop("profile") for result in pending])
+                except Exception as e:
+                    # The auth users exist; re-running the import reports them as already registered
+                    for result in pending:
+                        result.update(status="failed", error=f"auth user created but profile sync failed: {e}")
+                for result in pending:
+                    result.pop("profile", None)
+                    counts[result["status"]] += 1
+                    yield result
+                pending = []
+    finally:
+        await results.aclose()
+    yield {"summary": {"rows": len(users), **counts, "seconds": round(time.perf_counter() - started, 3)}}
 
 
 async def authenticate_user(email: str, password: str):
-    supabase = get_supabase_client()
-    
     # Authenticate with Supabase
-    auth_response = supabase.auth.sign_in_with_password({
+    auth_response = await run_blocking(new_auth_client().auth.sign_in_with_password, {
         "email": email,
         "password": password
     })
     
     if auth_response.user:
         # Get user profile
-        profile = supabase.table("profiles").select("*").eq("id", auth_response.user.id).execute()
-        
-        if profile.data:
-            user_data = profile.data[0]
+        user_data = await get_profile(auth_response.user.id)
+
+        if user_data:
             return {
                 "id": user_data["id"],
                 "email": user_data["email"],
@@ -118,44 +312,27 @@ async def authenticate_user(email: str, password: str):
     
     raise Exception("Invalid credentials")
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def get_current_user(request: Request, credentials: HTTPAuthorizationCredentials = Depends(security)):
     try:
         token = None
         # Try to get token from Depends(security) (works for JSON requests)
-        if credentials and hasattr(credentials, 'credentials') and credentials.credentials:
+        if credentials and credentials.credentials:
             token = credentials.credentials
         else:
-            # Fallback: extract from request headers (for multipart/form-data)
-            import inspect
-            frame = inspect.currentframe()
-            request = None
-            while frame:
-                if 'request' in frame.f_locals:
-                    request = frame.f_locals['request']
-                    break
-                frame = frame.f_back
-            # If not found, raise a clear error
-            if not request:
-                logging.error("Request object not found in call stack for get_current_user.")
-                raise HTTPException(status_code=HTTP_401_UNAUTHORIZED, detail="Request object not found for authentication.")
-            auth_header = request.headers.get('authorization')
-            scheme, param = get_authorization_scheme_param(auth_header)
+            # Fallback: read the header directly (for multipart/form-data)
+            scheme, param = get_authorization_scheme_param(request.headers.get('authorization'))
             if scheme and scheme.lower() == 'bearer' and param:
                 token = param
         if not token:
             logging.warning("No Authorization token found in request headers.")
             raise HTTPException(status_code=HTTP_401_UNAUTHORIZED, detail="Not authenticated: Bearer token missing.")
-        supabase = get_supabase_client()
-        user_response = supabase.auth.get_user(token)
-        if user_response.user:
-            # Get user profile
-            profile = supabase.table("profiles").select("*").eq("id", user_response.user.id).execute()
-            if profile.data:
-                return profile.data[0]
-            else:
-                logging.error(f"User profile not found for id: {user_response.user.id}")
-        else:
-            logging.error("Supabase could not validate user from token.")
+        with metrics.trace("auth.verify_token"):
+            user_id = await verify_token(token)
+        with metrics.trace("auth.get_profile"):
+            profile = await get_profile(user_id)
+        if profile:
+            return profile
+        logging.error(f"User profile not found for id: {user_id}")
         raise HTTPException(status_code=HTTP_401_UNAUTHORIZED, detail="Invalid or expired token.")
     except HTTPException:
         raise
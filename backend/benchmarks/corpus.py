@@ -0,0 +1,38 @@
+# benchmarks/corpus.py
+"""Synthetic project_data rows for benchmarks; the same seed always gives the same corpus."""
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Tuple
+
+WORDS = (
+    "smart home iot automation blockchain voting secure machine learning image classifier "
+    "crop disease detection plant leaf mobile task management offline sync e-commerce react "
+    "payment chatbot sentiment analysis traffic prediction attendance face recognition drone "
+    "health monitoring wearable energy solar grid library portal inventory hospital network"
+).split()
+
+QUERIES = ["smart home automation", "crop disease detection", "blockchain voting system", "face recognition attendance"]
+
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def iter_rows(count: int, seed: int = 7, abstract_words: Tuple[int, int] = (25, 60),
+              uploaders: int = 50) -> Iterator[Dict]:
+    """Rows in created_at order, one second apart, with ids 1..count"""
+    rng = random.Random(seed)
+    for i in range(count):
+        yield {
+            "id": i + 1,
+            "student_name": f"Student {i % 5000}",
+            "student_id": f"S{i % 5000:05d}",
+            "project_title": " ".join(rng.choices(WORDS, k=rng.randint(3, 7))).title(),
+            "abstract": " ".join(rng.choices(WORDS, k=rng.randint(*abstract_words))),
+            "file_url": f"bench-{i + 1}.pdf",
+            "file_size": rng.randint(10_000, 5_000_000),
+            "uploaded_by": f"teacher-{i % uploaders}",
+            "created_at": (EPOCH + timedelta(seconds=i)).isoformat(),
+        }
+
+
+def make_rows(count: int, seed: int = 7, abstract_words: Tuple[int, int] = (25, 60)) -> List[Dict]:
+    return list(iter_rows(count, seed, abstract_words))
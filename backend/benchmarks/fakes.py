@@ -0,0 +1,557 @@
+# benchmarks/fakes.py
+"""In-process stand-ins for the Supabase REST/Storage/Auth APIs and an Ollama-compatible LLM.
+
+Each fake is a small aiohttp app served from its own thread and event loop, so the
+backend talks to it over real HTTP through its normal client stack (supabase-py,
+the shared aiohttp session) and every response can be delayed by a configurable,
+jittered latency. Only the parts of each API the backend uses are implemented.
+"""
+import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+import uuid
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import jwt
+from aiohttp import web
+from rapidfuzz import fuzz, process
+
+
+class Latency:
+    """mean seconds, +/- jitter as a fraction of the mean"""
+
+    def __init__(self, mean: float = 0.0, jitter: float = 0.2, seed: int = 7):
+        self.mean = mean
+        self.jitter = jitter
+        self._rng = random.Random(seed)
+
+    async def wait(self) -> None:
+        if self.mean > 0:
+            await asyncio.sleep(self.mean * self._rng.uniform(1 - self.jitter, 1 + self.jitter))
+
+
+class ServerThread:
+    """Serve an aiohttp app on 127.0.0.1 from a daemon thread"""
+
+    def __init__(self, app: web.Application, port: int = 0):
+        self.app = app
+        self.port = port
+        self._loop = asyncio.new_event_loop()
+        self._runner = None
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self) -> "ServerThread":
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(), self._loop).result()
+        return self
+
+    async def _start(self):
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", self.port, backlog=1024)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    def stop(self) -> None:
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+
+# PostgREST
+
+def _coerce(raw: str, like: Any) -> Any:
+    if isinstance(like, bool):
+        return raw == "true"
+    if isinstance(like, int):
+        try:
+            return int(raw)
+        except ValueError:
+            return raw
+    if isinstance(like, float):
+        try:
+            return float(raw)
+        except ValueError:
+            return raw
+    return raw
+
+
+def _matches(value: Any, op: str, raw: str) -> bool:
+    if op == "is":
+        return value is None if raw == "null" else value == (raw == "true")
+    if value is None:
+        return False
+    if op == "in":
+        return str(value) in [item.strip().strip('"') for item in raw.strip("()").split(",")]
+    other = _coerce(raw, value)
+    if type(other) is not type(value):
+        value, other = str(value), str(other)
+    if op == "eq":
+        return value == other
+    if op == "neq":
+        return value != other
+    if op == "gt":
+        return value > other
+    if op == "gte":
+        return value >= other
+    if op == "lt":
+        return value < other
+    if op == "lte":
+        return value <= other
+    raise web.HTTPBadRequest(text=json.dumps({"message": f"unsupported operator {op}"}))
+
+
+Predicate = Callable[[Dict], bool]
+
+
+def _condition(column: str, op: str, raw: str) -> Predicate:
+    if op == "not":
+        negated, _, raw = raw.partition(".")
+        return lambda row: not _matches(row.get(column), negated, raw)
+    return lambda row: _matches(row.get(column), op, raw)
+
+
+def _parse_tree(text: str, join: Callable = any) -> Predicate:
+    """A PostgREST logic tree such as (a.lt.1,and(b.eq."x",c.gt.2)) as a predicate"""
+    pos = 0
+
+    def parse_list() -> List[Predicate]:
+        nonlocal pos
+        assert text[pos] == "("
+        pos += 1
+        items = []
+        while True:
+            items.append(parse_item())
+            if text[pos] == ",":
+                pos += 1
+                continue
+            assert text[pos] == ")"
+            pos += 1
+            return items
+
+    def parse_value() -> str:
+        nonlocal pos
+        if text[pos] == '"':
+            pos += 1
+            out = []
+            while text[pos] != '"':
+                if text[pos] == "\\":
+                    pos += 1
+                out.append(text[pos])
+                pos += 1
+            pos += 1
+            return "".join(out)
+        start = pos
+        depth = 0
+        while pos < len(text) and (depth or text[pos] not in ",)"):
+            depth += {"(": 1, ")": -1}.get(text[pos], 0)
+            pos += 1
+        return text[start:pos]
+
+    def parse_item() -> Predicate:
+        nonlocal pos
+        for word in ("and(", "or(", "not.and(", "not.or("):
+            if text.startswith(word, pos):
+                pos += len(word) - 1
+                items = parse_list()
+                combine = all if "and" in word else any
+                if word.startswith("not."):
+                    return lambda row: not combine(p(row) for p in items)
+                return lambda row: combine(p(row) for p in items)
+        column_end = text.index(".", pos)
+        column = text[pos:column_end]
+        op_end = text.index(".", column_end + 1)
+        op = text[column_end + 1:op_end]
+        pos = op_end + 1
+        if op == "not":
+            inner_end = text.index(".", pos)
+            inner = text[pos:inner_end]
+            pos = inner_end + 1
+            raw = parse_value()
+            return lambda row: not _matches(row.get(column), inner, raw)
+        raw = parse_value()
+        return lambda row: _matches(row.get(column), op, raw)
+
+    items = parse_list()
+    return lambda row: join(p(row) for p in items)
+
+
+class FakeTable:
+    """Rows kept sorted by (created_at, id), so the backend's usual orderings and
+    created_at range filters are served by bisecting and slicing instead of
+    scanning and sorting the table per request."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.rows: List[Dict] = []
+        self._keys: List[Tuple[str, Any]] = []
+        self._created: List[str] = []
+        self._next_id = 1
+        self._choices = None
+
+    def insert(self, rows: Iterable[Dict], upsert: bool = False) -> List[Dict]:
+        inserted = []
+        for row in rows:
+            row = dict(row)
+            if row.get("id") is None:
+                row["id"] = self._next_id
+            if isinstance(row["id"], int):
+                self._next_id = max(self._next_id, row["id"] + 1)
+            row.setdefault("created_at", datetime.now(timezone.utc).isoformat())
+            if upsert and any(existing["id"] == row["id"] for existing in self.rows):
+                self.rows = [existing for existing in self.rows if existing["id"] != row["id"]]
+                self._keys = [(r["created_at"], r["id"]) for r in self.rows]
+                self._created = [key[0] for key in self._keys]
+            key = (row["created_at"], row["id"])
+            index = len(self.rows) if not self._keys or key >= self._keys[-1] else bisect_right(self._keys, key)
+            self._keys.insert(index, key)
+            self._created.insert(index, key[0])
+            self.rows.insert(index, row)
+            inserted.append(row)
+        self._choices = None
+        return inserted
+
+    def _span(self, bounds: Dict[str, str]) -> Tuple[int, int]:
+        lo, hi = 0, len(self.rows)
+        if "gte" in bounds:
+            lo = bisect_left(self._created, bounds["gte"])
+        if "gt" in bounds:
+            lo = max(lo, bisect_right(self._created, bounds["gt"]))
+        if "lte" in bounds:
+            hi = bisect_right(self._created, bounds["lte"])
+        if "lt" in bounds:
+            hi = min(hi, bisect_left(self._created, bounds["lt"]))
+        return lo, max(lo, hi)
+
+    def select(self, predicates: List[Predicate], order: List[Tuple[str, bool]], bounds: Dict[str, str],
+               offset: int, limit: Optional[int], count: bool) -> Tuple[List[Dict], Optional[int]]:
+        """`bounds` are created_at range filters ({"gte": ...}); `predicates` any other filters"""
+        lo, hi = self._span(bounds)
+        end = None if limit is None else offset + limit
+        natural = [("created_at", False), ("id", False)][:len(order)]
+        reverse = [("created_at", True), ("id", True)][:len(order)]
+        if order in (natural, reverse):
+            step = -1 if order and order[0][1] else 1
+            if not predicates:
+                total = hi - lo
+                positions = range(lo, hi)[::step][offset:end]
+                return [self.rows[i] for i in positions], total if count else None
+            candidates = (self.rows[i] for i in range(lo, hi)[::step])
+        else:
+            candidates = self.rows[lo:hi]
+            for column, desc in reversed(order):
+                candidates = sorted(candidates, key=lambda row: (row.get(column) is None, row.get(column)), reverse=desc)
+        matching = (row for row in candidates if all(p(row) for p in predicates))
+        if count:
+            matching = list(matching)
+            return matching[offset:end], len(matching)
+        return list(islice(matching, offset, end)), None
+
+    def similar(self, query: str, max_candidates: int, min_similarity: float) -> List[Dict]:
+        """Stand-in for search_project_candidates: best title/abstract token-set matches"""
+        if self._choices is None:
+            self._choices = [f"{row.get('project_title', '')} {row.get('abstract', '')}".lower() for row in self.rows]
+        matches = process.extract(query.lower(), self._choices, scorer=fuzz.token_set_ratio,
+                                  limit=max_candidates, score_cutoff=min_similarity * 100)
+        return [self.rows[index] for _, _, index in matches]
+
+
+def _project(row: Dict, columns: Optional[List[str]]) -> Dict:
+    if columns is None:
+        return row
+    return {column: row.get(column) for column in columns}
+
+
+class FakeSupabase:
+    """PostgREST tables, Storage buckets and GoTrue users behind one HTTP server.
+
+    Access tokens are HS256 JWTs signed with jwt_secret, so the backend can verify
+    them either locally (SUPABASE_JWT_SECRET) or by calling /auth/v1/user.
+    """
+
+    def __init__(self, latency: Optional[Latency] = None, jwt_secret: str = "bench-jwt-secret"):
+        self.latency = latency or Latency()
+        self.jwt_secret = jwt_secret
+        self.tables: Dict[str, FakeTable] = {}
+        self.objects: Dict[Tuple[str, str], Tuple[bytes, str, str]] = {}
+        self.users: Dict[str, Dict] = {}  # email -> {"id", "password"}
+        self.requests = 0
+        self.app = web.Application(client_max_size=1024 ** 3)
+        self.app.router.add_route("*", "/rest/v1/rpc/{function}", self._rpc)
+        self.app.router.add_route("*", "/rest/v1/{table}", self._table)
+        self.app.router.add_post("/storage/v1/object/sign/{bucket}/{key:.+}", self._sign)
+        self.app.router.add_get("/storage/v1/object/sign/{bucket}/{key:.+}", self._get_object)
+        self.app.router.add_get("/storage/v1/object/authenticated/{bucket}/{key:.+}", self._get_object)
+        self.app.router.add_route("*", "/storage/v1/object/{bucket}/{key:.+}", self._object)
+        self.app.router.add_delete("/storage/v1/object/{bucket}", self._remove_objects)
+        self.app.router.add_get("/auth/v1/user", self._user)
+        self.app.router.add_post("/auth/v1/signup", self._signup)
+        self.app.router.add_post("/auth/v1/token", self._token)
+        self.app.router.add_post("/auth/v1/admin/users", self._admin_create_user)
+        self.app.router.add_post("/auth/v1/invite", self._invite)
+
+    def table(self, name: str) -> FakeTable:
+        if name not in self.tables:
+            self.tables[name] = FakeTable(name)
+        return self.tables[name]
+
+    def put_object(self, bucket: str, key: str, body: bytes, content_type: str = "application/octet-stream"):
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        self.objects[(bucket, key)] = (body, content_type, etag)
+
+    def token_for(self, user_id: str, ttl: int = 3600) -> str:
+        now = int(time.time())
+        return jwt.encode({"sub": user_id, "aud": "authenticated", "role": "authenticated",
+                           "iat": now, "exp": now + ttl}, self.jwt_secret, algorithm="HS256")
+
+    async def _delay(self):
+        self.requests += 1
+        await self.latency.wait()
+
+    # REST
+
+    async def _table(self, request: web.Request) -> web.Response:
+        await self._delay()
+        table = self.table(request.match_info["table"])
+        if request.method == "GET" or request.method == "HEAD":
+            return self._select(request, table)
+        if request.method == "POST":
+            body = await request.json()
+            rows = body if isinstance(body, list) else [body]
+            prefer = request.headers.get("Prefer", "")
+            inserted = table.insert(rows, upsert="merge-duplicates" in prefer)
+            if "return=minimal" in prefer:
+                return web.Response(status=201)
+            return web.json_response(inserted, status=201)
+        raise web.HTTPMethodNotAllowed(request.method, ["GET", "HEAD", "POST"])
+
+    def _select(self, request: web.Request, table: FakeTable) -> web.Response:
+        query = request.query
+        select = query.get("select", "*")
+        columns = None if select.strip() == "*" else [c.strip() for c in select.split(",") if c.strip()]
+        predicates, bounds, order = [], {}, []
+        for name, value in query.items():
+            if name in ("select", "limit", "offset", "order"):
+                continue
+            if name in ("or", "and"):
+                predicates.append(_parse_tree(value, any if name == "or" else all))
+                continue
+            op, _, raw = value.partition(".")
+            if name == "created_at" and op in ("gt", "gte", "lt", "lte") and op not in bounds:
+                bounds[op] = raw
+            else:
+                predicates.append(_condition(name, op, raw))
+        for spec in query.getall("order", []):
+            for part in spec.split(","):
+                column, _, direction = part.partition(".")
+                order.append((column, direction.startswith("desc")))
+        offset = int(query.get("offset", 0))
+        limit = int(query["limit"]) if "limit" in query else None
+        if "Range" in request.headers:
+            start, _, end = request.headers["Range"].partition("-")
+            offset = int(start)
+            if end:
+                limit = int(end) - offset + 1 if limit is None else min(limit, int(end) - offset + 1)
+        want_count = "count=" in request.headers.get("Prefer", "")
+        rows, total = table.select(predicates, order, bounds, offset, limit, want_count)
+        end = offset + len(rows) - 1
+        content_range = f"{offset}-{end}/{total if total is not None else '*'}" if rows else f"*/{total if total is not None else '*'}"
+        body = [_project(row, columns) for row in rows]
+        return web.json_response(body, headers={"Content-Range": content_range})
+
+    async def _rpc(self, request: web.Request) -> web.Response:
+        await self._delay()
+        function = request.match_info["function"]
+        args = await request.json() if request.can_read_body else {}
+        if function == "search_project_candidates":
+            rows = self.table("project_data").similar(args["query"], int(args.get("max_candidates", 500)),
+                                                      float(args.get("min_similarity", 0.1)))
+            return web.json_response(rows)
+        return web.json_response({"message": f"function {function} does not exist"}, status=404)
+
+    # Storage
+
+    async def _object(self, request: web.Request) -> web.StreamResponse:
+        if request.method in ("GET", "HEAD"):
+            return await self._get_object(request)
+        await self._delay()
+        bucket, key = request.match_info["bucket"], request.match_info["key"]
+        if request.method not in ("POST", "PUT"):
+            raise web.HTTPMethodNotAllowed(request.method, ["GET", "POST", "PUT"])
+        content_type = request.content_type
+        if content_type.startswith("multipart/"):
+            body = b""
+            reader = await request.multipart()
+            async for part in reader:
+                if part.name == "file":
+                    body = await part.read()
+                    content_type = part.headers.get("Content-Type", "application/octet-stream")
+        else:
+            body = await request.read()
+        if request.method == "POST" and (bucket, key) in self.objects:
+            return web.json_response({"statusCode": "409", "error": "Duplicate", "message": "The resource already exists"},
+                                     status=400)
+        self.put_object(bucket, key, body, content_type)
+        return web.json_response({"Key": f"{bucket}/{key}"})
+
+    async def _remove_objects(self, request: web.Request) -> web.Response:
+        await self._delay()
+        bucket = request.match_info["bucket"]
+        body = await request.json()
+        removed = [key for key in body.get("prefixes", []) if self.objects.pop((bucket, key), None) is not None]
+        return web.json_response([{"name": key, "bucket_id": bucket} for key in removed])
+
+    async def _get_object(self, request: web.Request) -> web.Response:
+        await self._delay()
+        bucket, key = request.match_info["bucket"], request.match_info["key"]
+        stored = self.objects.get((bucket, key))
+        if stored is None:
+            return web.json_response({"statusCode": "404", "error": "not_found", "message": "Object not found"}, status=400)
+        # Imported here: the backend reads its configuration when utils.storage is first imported
+        from utils.storage import parse_range
+
+        body, content_type, etag = stored
+        headers = {"ETag": etag, "Accept-Ranges": "bytes", "Content-Type": content_type}
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers=headers)
+        try:
+            byte_range = parse_range(request.headers.get("Range"), len(body))
+        except ValueError:
+            return web.Response(status=416, headers={**headers, "Content-Range": f"bytes */{len(body)}"})
+        if byte_range:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{len(body)}"
+            return web.Response(status=206, body=body[start:end + 1], headers=headers)
+        return web.Response(body=body, headers=headers)
+
+    async def _sign(self, request: web.Request) -> web.Response:
+        await self._delay()
+        bucket, key = request.match_info["bucket"], request.match_info["key"]
+        if (bucket, key) not in self.objects:
+            return web.json_response({"statusCode": "404", "error": "not_found", "message": "Object not found"}, status=400)
+        return web.json_response({"signedURL": f"/object/sign/{bucket}/{key}?token={uuid.uuid4().hex}"})
+
+    # Auth
+
+    def _user_body(self, user_id: str, email: Optional[str]) -> Dict:
+        return {"id": user_id, "aud": "authenticated", "role": "authenticated", "email": email,
+                "app_metadata": {"provider": "email"}, "user_metadata": {},
+                "created_at": datetime.now(timezone.utc).isoformat()}
+
+    def _session(self, user_id: str, email: str) -> Dict:
+        return {"access_token": self.token_for(user_id), "token_type": "bearer", "expires_in": 3600,
+                "refresh_token": uuid.uuid4().hex, "user": self._user_body(user_id, email)}
+
+    async def _user(self, request: web.Request) -> web.Response:
+        await self._delay()
+        token = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+        try:
+            claims = jwt.decode(token, self.jwt_secret, algorithms=["HS256"], audience="authenticated")
+        except jwt.PyJWTError as e:
+            return web.json_response({"code": 401, "msg": f"invalid JWT: {e}"}, status=401)
+        email = next((email for email, user in self.users.items() if user["id"] == claims["sub"]), None)
+        return web.json_response(self._user_body(claims["sub"], email))
+
+    async def _signup(self, request: web.Request) -> web.Response:
+        await self._delay()
+        body = await request.json()
+        user_id = self._register(body["email"], body["password"])
+        if user_id is None:
+            return self._already_registered()
+        return web.json_response(self._session(user_id, body["email"]))
+
+    def _register(self, email: str, password: Optional[str]) -> Optional[str]:
+        """New user id, or None if the email is taken"""
+        if email in self.users:
+            return None
+        user_id = str(uuid.uuid4())
+        self.users[email] = {"id": user_id, "password": password}
+        return user_id
+
+    @staticmethod
+    def _already_registered() -> web.Response:
+        return web.json_response({"code": 422, "msg": "User already registered"}, status=422)
+
+    async def _admin_create_user(self, request: web.Request) -> web.Response:
+        await self._delay()
+        body = await request.json()
+        user_id = self._register(body["email"], body.get("password"))
+        if user_id is None:
+            return self._already_registered()
+        return web.json_response(self._user_body(user_id, body["email"]))
+
+    async def _invite(self, request: web.Request) -> web.Response:
+        await self._delay()
+        body = await request.json()
+        user_id = self._register(body["email"], None)
+        if user_id is None:
+            return self._already_registered()
+        return web.json_response(self._user_body(user_id, body["email"]))
+
+    async def _token(self, request: web.Request) -> web.Response:
+        await self._delay()
+        body = await request.json()
+        user = self.users.get(body.get("email"))
+        if user is None or user["password"] != body.get("password"):
+            return web.json_response({"error": "invalid_grant", "error_description": "Invalid login credentials"},
+                                     status=400)
+        return web.json_response(self._session(user["id"], body["email"]))
+
+
+class FakeOllama:
+    """Ollama's /api/chat answering every prompt with a JSON array of project ideas.
+
+    `latency` delays the first token; each further chunk takes `token_delay`.
+    """
+
+    def __init__(self, latency: Optional[Latency] = None, token_delay: float = 0.0, items: int = 5):
+        self.latency = latency or Latency()
+        self.token_delay = token_delay
+        self.items = items
+        self.requests = 0
+        self.app = web.Application()
+        self.app.router.add_post("/api/chat", self._chat)
+
+    def reply_chunks(self, prompt: str) -> List[str]:
+        seed = int(hashlib.sha256(prompt.encode()).hexdigest()[:8], 16)
+        rng = random.Random(seed)
+        ideas = [{
+            "title": f"Idea {i + 1}: {rng.choice(['Smart', 'Secure', 'Offline', 'Realtime'])} {rng.choice(['Attendance', 'Farming', 'Voting', 'Inventory'])}",
+            "description": "A synthetic project idea generated by the benchmark stand-in.",
+            "difficulty": rng.choice(["beginner", "intermediate", "advanced"]),
+            "technologies": ["Python", "FastAPI"],
+            "estimated_time": "2-4 weeks",
+            "name": f"Site {i + 1}",
+        } for i in range(self.items)]
+        text = "```json\n" + json.dumps(ideas, indent=1) + "\n```"
+        return [text[i:i + 16] for i in range(0, len(text), 16)]
+
+    async def _chat(self, request: web.Request) -> web.StreamResponse:
+        self.requests += 1
+        body = await request.json()
+        prompt = body["messages"][-1]["content"]
+        chunks = self.reply_chunks(prompt)
+        await self.latency.wait()
+        if not body.get("stream", True):
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay * len(chunks))
+            return web.json_response({"model": body.get("model"), "message": {"role": "assistant", "content": "".join(chunks)},
+                                      "done": True})
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await response.prepare(request)
+        for chunk in chunks:
+            await response.write((json.dumps({"message": {"role": "assistant", "content": chunk}, "done": False}) + "\n").encode())
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay)
+        await response.write((json.dumps({"done": True}) + "\n").encode())
+        return response
@@ -0,0 +1,52 @@
+# benchmarks/load.py
+"""Closed-loop load generation: N workers issue requests back to back until the budget is spent."""
+import asyncio
+import time
+from collections import Counter
+from typing import Awaitable, Callable, Dict
+
+from utils.latency import LatencyWindow
+
+
+async def run_load(send: Callable[[int], Awaitable[int]], requests: int, concurrency: int,
+                   warmup: int = 0) -> Dict:
+    """Call send(i) for i in range(requests) from `concurrency` workers.
+
+    send returns a status code; anything but 2xx/3xx (or an exception) counts as an
+    error. The first `warmup` requests are issued first and left out of the results.
+    """
+    for i in range(warmup):
+        await send(i)
+
+    latency = LatencyWindow(maxlen=max(1, requests))
+    statuses = Counter()
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index
+        while next_index < requests:
+            index = next_index
+            next_index += 1
+            started = time.perf_counter()
+            try:
+                status = await send(warmup + index)
+            except Exception as e:
+                status = type(e).__name__
+            latency.record(time.perf_counter() - started)
+            statuses[str(status)] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    summary = latency.stats()
+    errors = sum(count for status, count in statuses.items() if not (status.isdigit() and int(status) < 400))
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "statuses": dict(statuses),
+        "duration_s": round(elapsed, 4),
+        "throughput_rps": round(requests / elapsed, 2) if elapsed else None,
+        "latency_ms": {key: round(summary[key] * 1000, 3) for key in ("mean", "p50", "p95", "p99") if key in summary},
+    }
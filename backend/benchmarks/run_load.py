@@ -0,0 +1,290 @@
+# benchmarks/run_load.py
+"""Load-test the API end to end against in-process Supabase and LLM stand-ins.
+
+Run from the backend directory:
+
+    python -m benchmarks.run_load --rows 100000 --concurrency 32 --requests 500
+    python -m benchmarks.run_load --baseline benchmarks/results/<earlier>.json
+
+Requests go through the FastAPI app in-process (httpx ASGI transport); the app
+reaches the stand-ins over local HTTP with its normal clients. Each scenario
+reports throughput and p50/p95/p99 latency, and the whole run is written as JSON
+(with the git commit and parameters) so runs on different commits can be compared.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, Tuple
+
+from benchmarks.corpus import QUERIES, iter_rows
+from benchmarks.fakes import FakeOllama, FakeSupabase, Latency, ServerThread
+from benchmarks.load import run_load
+
+SCENARIOS = ("search_index", "search_database", "search_semantic", "search_hybrid", "search_content", "current_user", "bulk_register", "submissions", "upload", "bulk_upload", "download", "ai_suggestions")
+STUDENTS = 1000
+DOWNLOAD_OBJECTS = 100
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _configure(supabase: FakeSupabase, supabase_url: str, ollama_url: str, verify: str, index_dir: str) -> None:
+    """Point the backend at the stand-ins; must run before the backend modules are imported"""
+    service_key = supabase.token_for("service-role", ttl=86400)
+    os.environ.update({
+        "SUPABASE_URL": supabase_url,
+        "SUPABASE_SERVICE_ROLE_KEY": service_key,
+        "SUPABASE_ANON_KEY": service_key,
+        "SUPABASE_JWT_SECRET": supabase.jwt_secret if verify == "local" else "",
+        "SUPABASE_JWKS_URL": "",
+        "STORAGE_BACKEND": "supabase",
+        "SEARCH_INDEX_REFRESH_SECONDS": "0",
+        "OLLAMA_HOST": ollama_url,
+        "LLM_PROVIDERS": "ollama",
+        "LLM_CACHE_PATH": "",
+        "TRACE_EXPORT_PATH": "",
+        "SEMANTIC_INDEX_DIR": os.path.join(index_dir, "vectors"),
+        "DUPLICATE_INDEX_DIR": os.path.join(index_dir, "duplicates"),
+        "CONTENT_INDEX_DIR": os.path.join(index_dir, "content"),
+        # Seeded rows have no stored files; don't spend the run downloading them
+        "DUPLICATE_BACKFILL_FILES": "false",
+        "CONTENT_BACKFILL_FILES": "false",
+    })
+
+
+def _seed(supabase: FakeSupabase, rows: int, file_bytes: int, seed: int) -> Dict[str, str]:
+    """Corpus, users and stored objects. Returns an access token per role."""
+    supabase.table("project_data").insert(iter_rows(rows, seed=seed))
+    profiles = [
+        {"id": "bench-teacher", "name": "Teacher", "email": "teacher@bench.test", "role": "teacher"},
+        {"id": "bench-examiner", "name": "Examiner", "email": "examiner@bench.test", "role": "examiner"},
+    ] + [
+        {"id": f"bench-student-{i}", "name": f"Student {i}", "email": f"student{i}@bench.test", "role": "student"}
+        for i in range(STUDENTS)
+    ]
+    supabase.table("profiles").insert(profiles)
+    body = os.urandom(file_bytes)
+    for row in supabase.table("project_data").rows[:DOWNLOAD_OBJECTS]:
+        row["file_size"] = file_bytes
+        supabase.put_object(os.getenv("SUPABASE_BUCKET_NAME", "project-files"), row["file_url"], body)
+    tokens = {profile["id"]: supabase.token_for(profile["id"], ttl=86400) for profile in profiles}
+    return tokens
+
+
+def _scenarios(client, tokens: Dict[str, str], file_bytes: int, download_keys,
+               roster_size: int, bulk_files: int) -> Dict[str, Callable[[int], Awaitable[int]]]:
+    from fastapi.security import HTTPAuthorizationCredentials
+    from auth import get_current_user
+
+    def bearer(user_id: str) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {tokens[user_id]}"}
+
+    student = lambda i: bearer(f"bench-student-{i % STUDENTS}")
+    upload_body = os.urandom(file_bytes)
+
+    async def search(i: int, mode: str) -> int:
+        response = await client.post("/api/search/projects", headers=student(i),
+                                     json={"query": QUERIES[i % len(QUERIES)], "mode": mode, "limit": 20})
+        return response.status_code
+
+    async def current_user(i: int) -> int:
+        credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=tokens[f"bench-student-{i % STUDENTS}"])
+        await get_current_user(None, credentials)
+        return 200
+
+    async def bulk_register(i: int) -> int:
+        # One class roster per request; the response streams until the last profile is written
+        roster = "name,email,password\n" + "".join(
+            f"Bulk {i}-{j},bulk{i}-{j}@bench.test,bench-password\n" for j in range(roster_size))
+        response = await client.post("/api/auth/bulk-register", headers={**bearer("bench-teacher"), "Content-Type": "text/csv"},
+                                     content=roster)
+        lines = response.text.splitlines()
+        if response.status_code == 200 and (not lines or '"summary"' not in lines[-1] or '"failed"' in "".join(lines[:-1])):
+            return 502
+        return response.status_code
+
+    async def submissions(i: int) -> int:
+        response = await client.get("/api/files/submissions", headers=bearer("bench-examiner"), params={"limit": 50})
+        return response.status_code
+
+    async def upload(i: int) -> int:
+        response = await client.post(
+            "/api/files/upload", headers=bearer("bench-teacher"),
+            data={"title": f"Bench upload {i}", "description": "load test", "student_name": "Bench",
+                  "student_id": f"B{i:06d}", "abstract": "synthetic upload from the load test"},
+            files={"file": (f"bench-{i}.pdf", upload_body, "application/pdf")},
+        )
+        return response.status_code
+
+    async def bulk_upload(i: int) -> int:
+        # One zip per request: bulk_files projects plus their manifest
+        manifest = [{"file": f"bench-{j}.pdf", "title": f"Bench bulk {i}-{j}", "abstract": "synthetic bulk upload",
+                     "student_name": "Bench", "student_id": f"B{i:04d}{j:04d}"} for j in range(bulk_files)]
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w", zipfile.ZIP_STORED) as zf:
+            zf.writestr("manifest.json", json.dumps(manifest))
+            for entry in manifest:
+                zf.writestr(entry["file"], upload_body)
+        response = await client.post("/api/files/bulk-upload", headers=bearer("bench-teacher"),
+                                     files={"archive": ("batch.zip", archive.getvalue(), "application/zip")})
+        lines = response.text.splitlines()
+        if response.status_code == 200 and (not lines or '"summary"' not in lines[-1] or '"failed"' in "".join(lines[:-1])):
+            return 502
+        return response.status_code
+
+    async def download(i: int) -> int:
+        key = download_keys[i % len(download_keys)]
+        response = await client.get(f"/api/files/download/{key}", headers=bearer("bench-examiner"))
+        return response.status_code
+
+    async def ai_suggestions(i: int) -> int:
+        # Distinct queries, so the LLM cache does not answer them
+        response = await client.post("/api/ai/suggestions", headers=student(i), json={"query": f"benchmark topic {i}"})
+        return response.status_code
+
+    return {
+        "search_index": lambda i: search(i, "index"),
+        "search_database": lambda i: search(i, "database"),
+        "search_semantic": lambda i: search(i, "semantic"),
+        "search_hybrid": lambda i: search(i, "hybrid"),
+        "search_content": lambda i: search(i, "content"),
+        "current_user": current_user,
+        "bulk_register": bulk_register,
+        "submissions": submissions,
+        "upload": upload,
+        "bulk_upload": bulk_upload,
+        "download": download,
+        "ai_suggestions": ai_suggestions,
+    }
+
+
+async def _run(args, tokens: Dict[str, str], download_keys) -> Tuple[Dict, int]:
+    import httpx
+    import main
+    import search
+
+    results = {}
+    async with main.lifespan(main.app):
+        indexed = len(main.project_index)
+        if indexed and any(name in ("search_semantic", "search_hybrid") for name in args.scenarios):
+            # Built in the background at startup; until then these modes fall back to fuzzy ranking
+            started = time.perf_counter()
+            while not main.vector_index.ready:
+                await asyncio.sleep(0.1)
+            print(f"vector index ready in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+        if indexed and "search_content" in args.scenarios:
+            started = time.perf_counter()
+            while search._document_task is not None and not search._document_task.done():
+                await asyncio.sleep(0.1)
+            print(f"content index ready in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            scenarios = _scenarios(client, tokens, args.file_kb * 1024, download_keys, args.roster_size,
+                                   args.bulk_files)
+            for name in args.scenarios:
+                print(f"{name}: {args.requests} requests x {args.concurrency} workers", file=sys.stderr)
+                results[name] = await run_load(scenarios[name], args.requests, args.concurrency, warmup=args.warmup)
+    return results, indexed
+
+
+def _compare(results: Dict, baseline_path: str) -> None:
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nvs {baseline_path} ({baseline['meta'].get('commit')})")
+    print(f"{'scenario':<16} {'rps':>10} {'base rps':>10} {'p95 ms':>10} {'base p95':>10} {'p95 change':>11}")
+    for name, current in results.items():
+        before = baseline["scenarios"].get(name)
+        if not before:
+            continue
+        p95, base_p95 = current["latency_ms"].get("p95"), before["latency_ms"].get("p95")
+        change = f"{(p95 - base_p95) / base_p95 * 100:+.1f}%" if p95 and base_p95 else "n/a"
+        print(f"{name:<16} {current['throughput_rps']:>10} {before['throughput_rps']:>10} "
+              f"{p95:>10} {base_p95:>10} {change:>11}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000, help="synthetic project_data rows (1k to 1M)")
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--supabase-latency-ms", type=float, default=5.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=200.0, help="time to the first LLM token")
+    parser.add_argument("--llm-token-delay-ms", type=float, default=0.0)
+    parser.add_argument("--file-kb", type=int, default=256, help="size of uploaded/downloaded files")
+    parser.add_argument("--roster-size", type=int, default=200, help="students per bulk_register request")
+    parser.add_argument("--bulk-files", type=int, default=200, help="projects per bulk_upload request")
+    parser.add_argument("--verify", choices=("remote", "local"), default="remote",
+                        help="token verification: Supabase Auth per request or SUPABASE_JWT_SECRET")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", help="results file (default benchmarks/results/<time>-<commit>.json)")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    supabase = FakeSupabase(Latency(args.supabase_latency_ms / 1000), jwt_secret="bench-jwt-secret")
+    ollama = FakeOllama(Latency(args.llm_latency_ms / 1000), token_delay=args.llm_token_delay_ms / 1000)
+    supabase_server = ServerThread(supabase.app).start()
+    ollama_server = ServerThread(ollama.app).start()
+    index_dir = tempfile.mkdtemp(prefix="bench-indexes-")
+    _configure(supabase, supabase_server.url, ollama_server.url, args.verify, index_dir)
+
+    started = time.perf_counter()
+    tokens = _seed(supabase, args.rows, args.file_kb * 1024, args.seed)
+    download_keys = [row["file_url"] for row in supabase.table("project_data").rows[:DOWNLOAD_OBJECTS]]
+    print(f"seeded {args.rows} rows in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    try:
+        results, indexed = asyncio.run(_run(args, tokens, download_keys))
+    finally:
+        supabase_server.stop()
+        ollama_server.stop()
+        shutil.rmtree(index_dir, ignore_errors=True)
+
+    commit = _git_commit()
+    report = {
+        "meta": {
+            "commit": commit,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": {key: value for key, value in vars(args).items() if key not in ("out", "baseline")},
+            "indexed_rows": indexed,
+            "upstream_requests": {"supabase": supabase.requests, "llm": ollama.requests},
+        },
+        "scenarios": results,
+    }
+    out = args.out or os.path.join("benchmarks", "results",
+                                   f"{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}-{commit}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{'scenario':<16} {'rps':>10} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'errors':>7}")
+    for name, result in results.items():
+        latency = result["latency_ms"]
+        print(f"{name:<16} {result['throughput_rps']:>10} {latency.get('p50', '-'):>10} "
+              f"{latency.get('p95', '-'):>10} {latency.get('p99', '-'):>10} {result['errors']:>7}")
+    print(f"results written to {out}")
+    if args.baseline:
+        _compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
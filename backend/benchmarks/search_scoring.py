@@ -0,0 +1,66 @@
+# benchmarks/search_scoring.py
+"""Compare the original per-row search loop with the batched index scorer.
+
+Run from the backend directory:
+
+    python -m benchmarks.search_scoring --sizes 1000 10000 100000
+"""
+import argparse
+import time
+
+from rapidfuzz import fuzz
+
+from benchmarks.corpus import QUERIES, make_rows
+from utils.search_index import ProjectSearchIndex
+
+
+def legacy_search(rows, query, threshold=60):
+    """The pre-index implementation from search.search_projects."""
+    matching = []
+    for project in rows:
+        title_score = fuzz.token_sort_ratio(query.lower(), project.get("project_title", "").lower())
+        abstract_score = fuzz.token_sort_ratio(query.lower(), project.get("abstract", "").lower())
+        max_score = max(title_score, abstract_score)
+        if max_score >= threshold:
+            matching.append(dict(project, similarity_score=max_score))
+    matching.sort(key=lambda x: x["similarity_score"], reverse=True)
+    return matching
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'legacy ms':>10} {'batched ms':>11} {'top-k ms':>9} {'speedup':>8}")
+    for size in args.sizes:
+        rows = make_rows(size)
+        index = ProjectSearchIndex()
+        index._put_many(rows)
+
+        legacy = sum(best_of(lambda: legacy_search(rows, q), args.repeat) for q in QUERIES) / len(QUERIES)
+        batched = sum(best_of(lambda: index.top_matches(q), args.repeat) for q in QUERIES) / len(QUERIES)
+        top_k = sum(best_of(lambda: index.top_matches(q, limit=args.limit), args.repeat) for q in QUERIES) / len(QUERIES)
+
+        # Same matches in the same order as the loop it replaces
+        for q in QUERIES:
+            expected = [(p["id"], round(p["similarity_score"], 6)) for p in legacy_search(rows, q)]
+            actual = [(p["id"], round(s, 6)) for s, p in index.top_matches(q)]
+            assert expected == actual, f"result mismatch for {q!r} at {size} rows"
+
+        print(f"{size:>8} {legacy * 1000:>10.1f} {batched * 1000:>11.1f} {top_k * 1000:>9.1f} {legacy / batched:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
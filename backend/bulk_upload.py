@@ -0,0 +1,283 @@
+import csv
+import hashlib
+import io
+import json
+import logging
+import mimetypes
+import os
+import posixpath
+import tempfile
+import time
+import uuid
+import zipfile
+from contextlib import nullcontext
+from typing import AsyncIterator, Callable, ContextManager, Dict, List, Optional, Tuple
+
+from jobs import enqueue_post_processing
+from utils import metrics
+from utils.bulk import run_bounded
+from utils.executor import run_blocking
+from utils.storage import get_object_store
+from utils.supabase_client import get_supabase_client
+
+# Files are stored by parallel workers; their project_data rows are inserted in chunks
+BULK_UPLOAD_CONCURRENCY = int(os.getenv("BULK_UPLOAD_CONCURRENCY", "16"))
+BULK_UPLOAD_CHUNK = int(os.getenv("BULK_UPLOAD_CHUNK", "100"))
+BULK_UPLOAD_MAX_ITEMS = int(os.getenv("BULK_UPLOAD_MAX_ITEMS", "500"))
+# Whole request, refused before it is spooled
+BULK_UPLOAD_MAX_BYTES = int(os.getenv("BULK_UPLOAD_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+MANIFEST_NAMES = ("manifest.json", "manifest.csv")
+REQUIRED_FIELDS = ("file", "title", "abstract", "student_name", "student_id")
+HASH_CHUNK_BYTES = 1024 * 1024
+
+
+class BulkSource:
+    """One file of a batch: its name, size if known up front, and how to open it for reading."""
+
+    def __init__(self, name: str, open: Callable[[], ContextManager], size: Optional[int] = None,
+                 content_type: Optional[str] = None):
+        self.name = name
+        self.open = open
+        self.size = size
+        self.content_type = content_type or mimetypes.guess_type(name)[0] or "application/octet-stream"
+
+
+def parse_manifest(content: bytes, content_type: str) -> List[Dict]:
+    """Projects from a CSV (header row with file, title, abstract, student_name and student_id)
+    or a JSON list (or {"projects": [...]}). Raises ValueError for anything else."""
+    try:
+        text = content.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise ValueError("Manifest must be UTF-8 encoded")
+    if "json" in content_type or text.lstrip().startswith(("[", "{")):
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON manifest: {e}")
+        entries = data.get("projects") if isinstance(data, dict) else data
+        if not isinstance(entries, list) or not all(isinstance(entry, dict) for entry in entries):
+            raise ValueError("JSON manifest must be a list of project objects")
+    else:
+        reader = csv.DictReader(io.StringIO(text))
+        if not reader.fieldnames or not set(REQUIRED_FIELDS) <= {field.strip().lower() for field in reader.fieldnames}:
+            raise ValueError(f"CSV manifest needs a header row with {', '.join(REQUIRED_FIELDS)} columns")
+        entries = [{key.strip().lower(): (value or "").strip() for key, value in row.items() if key is not None}
+                   for row in reader]
+    if not entries:
+        raise ValueError("Manifest is empty")
+    if len(entries) > BULK_UPLOAD_MAX_ITEMS:
+        raise ValueError(f"Manifest lists {len(entries)} projects; at most {BULK_UPLOAD_MAX_ITEMS} per upload")
+    return entries
+
+
+def _upload_source(upload) -> BulkSource:
+    def open_upload():
+        # Left open: the form owns the spooled file and closes it after the response
+        upload.file.seek(0)
+        return nullcontext(upload.file)
+
+    return BulkSource(upload.filename, open_upload, getattr(upload, "size", None), upload.content_type)
+
+
+def read_archive(fileobj) -> Tuple[Optional[bytes], Dict[str, BulkSource]]:
+    """(manifest bytes if the zip has one, sources by member path) for a zip archive.
+
+    Members can also be found by their base name when it is unique in the archive.
+    Raises ValueError when fileobj is not a zip.
+    """
+    try:
+        archive = zipfile.ZipFile(fileobj)
+    except zipfile.BadZipFile:
+        raise ValueError("Archive is not a valid zip file")
+    manifest = None
+    sources: Dict[str, BulkSource] = {}
+    by_base: Dict[str, List[BulkSource]] = {}
+    for info in archive.infolist():
+        name = info.filename
+        if info.is_dir() or name.startswith("__MACOSX/"):
+            continue
+        if posixpath.basename(name).lower() in MANIFEST_NAMES and manifest is None:
+            manifest = archive.read(info)
+            continue
+        # ZipFile serializes reads of the shared underlying file, so workers can open members in parallel
+        source = BulkSource(name, lambda info=info: archive.open(info), info.file_size)
+        sources[name] = source
+        by_base.setdefault(posixpath.basename(name), []).append(source)
+    for base, matches in by_base.items():
+        if len(matches) == 1:
+            sources.setdefault(base, matches[0])
+    return manifest, sources
+
+
+async def read_bulk_form(form) -> Tuple[List[Dict], Dict[str, BulkSource]]:
+    """Manifest entries and file sources from a bulk upload form: several "files" plus a
+    "manifest", or a zip "archive" with the files and (unless "manifest" is sent) a
+    manifest.json/manifest.csv. Raises ValueError if the form is incomplete."""
+    manifest_field = form.get("manifest")
+    manifest, content_type = None, ""
+    if manifest_field is not None and hasattr(manifest_field, "read"):
+        manifest = await manifest_field.read()
+        content_type = manifest_field.content_type or ("application/json" if manifest_field.filename.endswith(".json") else "text/csv")
+    elif manifest_field:
+        manifest = str(manifest_field).encode()
+
+    archive = form.get("archive")
+    uploads = [upload for upload in form.getlist("files") if hasattr(upload, "read")]
+    if archive is not None and hasattr(archive, "read"):
+        if uploads:
+            raise ValueError("Send either an archive or files, not both")
+        archived_manifest, sources = await run_blocking(read_archive, archive.file)
+        if manifest is None:
+            if archived_manifest is None:
+                raise ValueError(f"Archive has no {' or '.join(MANIFEST_NAMES)} and no manifest field was sent")
+            manifest = archived_manifest
+    elif uploads:
+        if manifest is None:
+            raise ValueError("A manifest field is required with multiple files")
+        sources = {}
+        for upload in uploads:
+            if upload.filename in sources:
+                raise ValueError(f"File name {upload.filename} is used twice")
+            sources[upload.filename] = _upload_source(upload)
+    else:
+        raise ValueError("Send the projects as 'files' fields or as one zip 'archive'")
+    entries = parse_manifest(manifest, content_type)
+    # Each file is read by one worker only
+    listed = set()
+    for entry in entries:
+        source = sources.get(str(entry.get("file") or "").strip())
+        if source is not None:
+            if id(source) in listed:
+                raise ValueError(f"{source.name} is listed more than once in the manifest")
+            listed.add(id(source))
+    return entries, sources
+
+
+def _store(store, key: str, source: BulkSource, max_bytes: int) -> Tuple[int, str, Dict]:
+    """Copy the source to a temporary file while hashing and size-checking it, then upload
+    a reader over that file. Returns (size, sha256, stored paths).
+
+    Zip members and spooled form parts are not files storage3 can stream, and a zip
+    member would be decompressed again by a second pass.
+    """
+    with source.open() as f, tempfile.NamedTemporaryFile(prefix="bulk-") as tmp:
+        digest = hashlib.sha256()
+        size = 0
+        while True:
+            chunk = f.read(HASH_CHUNK_BYTES)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise ValueError(f"File exceeds the {max_bytes} byte upload limit")
+            digest.update(chunk)
+            tmp.write(chunk)
+        tmp.flush()
+        with open(tmp.name, "rb") as reader:
+            stored = store.upload_file(key, reader, source.content_type)
+    return size, digest.hexdigest(), stored
+
+
+async def _store_item(index: int, entry: Dict, sources: Dict[str, BulkSource], store, uploaded_by: str,
+                      max_bytes: int) -> Dict:
+    file_name = str(entry.get("file") or "").strip()
+    result = {"row": index, "file": file_name}
+    missing = [field for field in REQUIRED_FIELDS if not str(entry.get(field) or "").strip()]
+    if missing:
+        return {**result, "status": "failed", "error": f"missing {', '.join(missing)}"}
+    source = sources.get(file_name)
+    if source is None:
+        return {**result, "status": "failed", "error": "file not found in the upload"}
+    if source.size is not None and source.size > max_bytes:
+        return {**result, "status": "failed", "error": f"File exceeds the {max_bytes} byte upload limit"}
+    key = f"{uuid.uuid4()}{os.path.splitext(file_name)[1]}"
+    try:
+        size, content_sha256, stored = await run_blocking(_store, store, key, source, max_bytes)
+    except Exception as e:
+        return {**result, "status": "failed", "error": str(e)}
+    project_row = {
+        "student_name": str(entry["student_name"]).strip(),
+        "student_id": str(entry["student_id"]).strip(),
+        "project_title": str(entry["title"]).strip(),
+        "abstract": str(entry["abstract"]).strip(),
+        "file_url": key,
+        "file_size": size,
+        "content_sha256": content_sha256,
+        "uploaded_by": uploaded_by,
+    }
+    return {**result, "status": "stored", "path": stored["path"], "project": project_row}
+
+
+async def _insert_projects(store, pending: List[Dict], uploaded_by: str) -> None:
+    """Insert the stored items' rows in one request and queue their post-processing;
+    on failure their objects are removed"""
+    try:
+        with metrics.trace("files.bulk_insert", rows=len(pending)):
+            response = await run_blocking(
+                get_supabase_client().table("project_data").insert([item["project"] for item in pending]).execute)
+        inserted = {row["file_url"]: row for row in getattr(response, "data", None) or []}
+    except Exception as e:
+        inserted, error = {}, f"file stored but database insert failed: {e}"
+    else:
+        error = "file stored but no row was returned for it"
+    orphans, created = [], []
+    for item in pending:
+        row = inserted.get(item.pop("project")["file_url"])
+        if row is None:
+            orphans.append(item["path"])
+            item.update(status="failed", error=error)
+        else:
+            item.update(status="created", id=row.get("id"), file_url=row["file_url"], size=row.get("file_size"))
+            created.append((item, row))
+    if created:
+        # One post-processing job per chunk; it checks rows in upload order, so a batch's
+        # own duplicates are reported against its earlier items
+        job = await enqueue_post_processing([row for _, row in created], uploaded_by, store.bucket)
+        for item, _ in created:
+            item["job"] = job["id"]
+    if orphans:
+        try:
+            await run_blocking(store.remove, orphans)
+        except Exception as e:
+            logging.warning(f"Could not remove {len(orphans)} orphaned uploads: {e}")
+
+
+async def bulk_upload_projects(entries: List[Dict], sources: Dict[str, BulkSource], uploaded_by: str,
+                               max_bytes: int, bucket: Optional[str] = None) -> AsyncIterator[Dict]:
+    """Store each manifest entry's file with bounded concurrency and insert the project rows
+    in chunks, yielding one result per entry once its row exists (or it failed), then a summary.
+
+    Rows are flushed when a chunk is full or no other stored file is waiting, as in
+    auth.bulk_create_users. Files in the upload that no entry refers to are listed
+    in the summary as unlisted.
+    """
+    started = time.perf_counter()
+    store = get_object_store(bucket)
+    counts = {"created": 0, "failed": 0}
+    pending: List[Dict] = []
+    failed = lambda index, e: {"row": index, "file": str(entries[index].get("file") or "").strip(),
+                               "status": "failed", "error": str(e)}
+    results = run_bounded(
+        len(entries), lambda index: _store_item(index, entries[index], sources, store, uploaded_by, max_bytes),
+        BULK_UPLOAD_CONCURRENCY, failed)
+    try:
+        async for result, idle in results:
+            if result["status"] == "failed":
+                counts["failed"] += 1
+                yield result
+            else:
+                pending.append(result)
+            if pending and (len(pending) >= BULK_UPLOAD_CHUNK or idle):
+                await _insert_projects(store, pending, uploaded_by)
+                for result in pending:
+                    result.pop("path", None)
+                    counts[result["status"]] += 1
+                    yield result
+                pending = []
+    finally:
+        await results.aclose()
+    listed = {id(sources[name]) for name in (str(entry.get("file") or "").strip() for entry in entries) if name in sources}
+    unlisted = sorted({source.name for source in sources.values() if id(source) not in listed})
+    yield {"summary": {"rows": len(entries), **counts, "unlisted": unlisted,
+                       "seconds": round(time.perf_counter() - started, 3)}}
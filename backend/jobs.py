@@ -0,0 +1,57 @@
+import hashlib
+import io
+import os
+from typing import Dict, List
+
+from search import CONTENT_SEARCH, DUPLICATE_DETECTION, index_projects
+from utils.executor import run_blocking
+from utils.job_queue import JobQueue
+from utils.storage import get_object_store
+from utils.text_extract import extract_text
+
+# Upload post-processing runs here instead of inside the upload request.
+# JOB_QUEUE_PATH keeps queued jobs in a SQLite file across restarts (memory only when unset).
+job_queue = JobQueue(
+    path=os.getenv("JOB_QUEUE_PATH") or None,
+    workers=int(os.getenv("JOB_WORKERS", "4")),
+    max_attempts=int(os.getenv("JOB_MAX_ATTEMPTS", "5")),
+    backoff=float(os.getenv("JOB_BACKOFF_SECONDS", "1")),
+    keep_seconds=float(os.getenv("JOB_KEEP_SECONDS", "86400")),
+)
+
+
+def _stored_file(row: Dict, bucket: str) -> str:
+    """Download a project's file, check it against the upload's sha256 and return its text"""
+    data = get_object_store(bucket).download(row["file_url"])
+    expected = row.get("content_sha256")
+    if expected and hashlib.sha256(data).hexdigest() != expected:
+        # Raised so the job is retried: storage may not serve the new object everywhere yet
+        raise ValueError(f"Stored {row['file_url']} does not match its upload checksum")
+    if not (DUPLICATE_DETECTION or CONTENT_SEARCH):
+        return ""
+    return extract_text(io.BytesIO(data), row["file_url"])
+
+
+async def process_uploads(payload: Dict) -> Dict:
+    """Validate and extract the text of freshly uploaded projects, then add them to the search
+    and content indexes and check them for duplicates. Safe to retry: indexing a project again replaces it."""
+    rows: List[Dict] = payload["rows"]
+    bucket = payload.get("bucket")
+    texts = []
+    for row in rows:
+        texts.append(await run_blocking(_stored_file, row, bucket) if row.get("file_url") else "")
+    duplicates = await index_projects(rows, texts)
+    return {
+        "projects": [
+            {"id": row.get("id"), "file_url": row.get("file_url"), "text_chars": len(text), "possible_duplicates": matches}
+            for row, text, matches in zip(rows, texts, duplicates)
+        ]
+    }
+
+
+job_queue.register("process_uploads", process_uploads)
+
+
+async def enqueue_post_processing(rows: List[Dict], owner: str, bucket: str = None) -> Dict:
+    """Queue process_uploads for inserted project rows; returns {"id", "kind", "status"}"""
+    return await job_queue.enqueue("process_uploads", {"rows": rows, "bucket": bucket}, owner=owner)
@@ -0,0 +1,422 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import AsyncIterator, Dict, List, Optional
+
+from utils import metrics
+from utils.http_session import post_json, stream_ndjson, stream_sse
+from utils.latency import LatencyWindow
+
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+
+GEMINI_MODEL = "gemini-1.5-flash"
+
+OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
+
+OPENROUTER_MODEL = "meta-llama/llama-3.1-8b-instruct"
+
+OLLAMA_HOST = os.getenv("OLLAMA_HOST")
+
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama2")
+
+# Preference order; unconfigured providers are skipped
+LLM_PROVIDERS = [name.strip() for name in os.getenv("LLM_PROVIDERS", "gemini,openrouter,ollama").split(",") if name.strip()]
+# Bound on one attempt at one provider, queueing for its concurrency slot included
+LLM_PROVIDER_TIMEOUT = float(os.getenv("LLM_PROVIDER_TIMEOUT", "30"))
+# HTTP retries within one attempt; falling back to the next provider is usually faster
+LLM_PROVIDER_RETRIES = int(os.getenv("LLM_PROVIDER_RETRIES", "1"))
+# Start a second provider when the first has not answered within its p95 latency
+LLM_HEDGE = os.getenv("LLM_HEDGE", "false").lower() in ("1", "true", "yes")
+# Hedge delay used until a provider has HEDGE_MIN_SAMPLES latency samples
+LLM_HEDGE_DELAY = float(os.getenv("LLM_HEDGE_DELAY", "2"))
+HEDGE_MIN_SAMPLES = 20
+# A provider failing this many times in a row is tried last for LLM_COOLDOWN_SECONDS
+LLM_COOLDOWN_FAILURES = int(os.getenv("LLM_COOLDOWN_FAILURES", "3"))
+LLM_COOLDOWN_SECONDS = float(os.getenv("LLM_COOLDOWN_SECONDS", "30"))
+
+
+class ProviderError(Exception):
+    pass
+
+
+def _error_message(data) -> str:
+    if isinstance(data, dict):
+        error = data.get("error")
+        if isinstance(error, dict):
+            return error.get("message", "Unknown error")
+        if isinstance(error, str):  # Ollama
+            return error
+    return "Unknown error"
+
+
+def _messages(prompt: str, system_prompt: Optional[str]) -> List[Dict]:
+    messages = []
+    if system_prompt:
+        messages.append({"role": "system", "content": system_prompt})
+    messages.append({"role": "user", "content": prompt})
+    return messages
+
+
+class LLMProvider:
+    """One completion backend with its own concurrency limit, latency window and health.
+
+    Subclasses implement _complete and _stream; failures surface as ProviderError.
+    """
+
+    name = ""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.concurrency = int(os.getenv(f"LLM_{self.name.upper()}_CONCURRENCY", "8"))
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.latency = LatencyWindow()
+        self.active = 0
+        self.calls = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+
+    @property
+    def configured(self) -> bool:
+        return True
+
+    @property
+    def cooling_down(self) -> bool:
+        return time.monotonic() < self.cooldown_until
+
+    @property
+    def saturated(self) -> bool:
+        return self.active >= self.concurrency
+
+    def record_success(self, seconds: Optional[float] = None) -> None:
+        self.consecutive_failures = 0
+        if seconds is not None:
+            self.latency.record(seconds)
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= LLM_COOLDOWN_FAILURES:
+            self.cooldown_until = time.monotonic() + LLM_COOLDOWN_SECONDS
+
+    async def complete(self, prompt: str, system_prompt: Optional[str] = None) -> str:
+        async with self.semaphore:
+            self.active += 1
+            self.calls += 1
+            started = time.perf_counter()
+            outcome, text = "cancelled", ""
+            try:
+                with metrics.span(f"llm {self.name}", **{"llm.provider": self.name, "llm.model": self.model}):
+                    text = await self._complete(prompt, system_prompt)
+                outcome = "ok"
+            except ProviderError:
+                outcome = "error"
+                self.record_failure()
+                raise
+            except Exception as e:
+                outcome = "error"
+                self.record_failure()
+                raise ProviderError(f"{self.name}: {e!r}") from e
+            finally:
+                self.active -= 1
+                self._observe("complete", outcome, started, prompt, system_prompt, text)
+            self.record_success(time.perf_counter() - started)
+            return text
+
+    async def stream(self, prompt: str, system_prompt: Optional[str] = None) -> AsyncIterator[str]:
+        async with self.semaphore:
+            self.active += 1
+            self.calls += 1
+            started, started_ns = time.perf_counter(), time.time_ns()
+            outcome, received = "cancelled", []
+            try:
+                async for chunk in self._stream(prompt, system_prompt):
+                    received.append(chunk)
+                    yield chunk
+                outcome = "ok"
+            except ProviderError:
+                outcome = "error"
+                self.record_failure()
+                raise
+            except Exception as e:
+                outcome = "error"
+                self.record_failure()
+                raise ProviderError(f"{self.name}: {e!r}") from e
+            else:
+                self.record_success()
+            finally:
+                self.active -= 1
+                self._observe("stream", outcome, started, prompt, system_prompt, "".join(received))
+                # Recorded afterwards: a generator may resume in another task, so it cannot hold a span open
+                metrics.record_span(f"llm {self.name} stream", started_ns, time.time_ns(),
+                                    status="ERROR" if outcome == "error" else "OK",
+                                    **{"llm.provider": self.name, "llm.model": self.model, "llm.outcome": outcome})
+
+    def _observe(self, kind: str, outcome: str, started: float, prompt: str,
+                 system_prompt: Optional[str], response: str) -> None:
+        metrics.llm_request_duration.observe(time.perf_counter() - started, provider=self.name, kind=kind, outcome=outcome)
+        metrics.llm_request_bytes.observe(len(prompt.encode()) + len((system_prompt or "").encode()), provider=self.name)
+        if response:
+            metrics.llm_response_bytes.observe(len(response.encode()), provider=self.name)
+
+    async def _complete(self, prompt: str, system_prompt: Optional[str]) -> str:
+        raise NotImplementedError
+
+    def _stream(self, prompt: str, system_prompt: Optional[str]) -> AsyncIterator[str]:
+        raise NotImplementedError
+
+    def stats(self) -> Dict:
+        return {
+            "model": self.model,
+            "configured": self.configured,
+            "concurrency": self.concurrency,
+            "active": self.active,
+            "calls": self.calls,
+            "failures": self.failures,
+            "cooling_down": self.cooling_down,
+            "latency": self.latency.stats(),
+        }
+
+
+class GeminiProvider(LLMProvider):
+    name = "gemini"
+
+    @property
+    def configured(self) -> bool:
+        return bool(GEMINI_API_KEY)
+
+    def _payload(self, prompt: str, system_prompt: Optional[str]) -> Dict:
+        # Gemini v1 expects a single user prompt in 'parts'
+        parts = []
+        if system_prompt:
+            parts.append({"text": system_prompt})
+        parts.append({"text": prompt})
+        return {"contents": [{"parts": parts}]}
+
+    async def _complete(self, prompt: str, system_prompt: Optional[str]) -> str:
+        url = f"https://generativelanguage.googleapis.com/v1/models/{self.model}:generateContent?key={GEMINI_API_KEY}"
+        status, data = await post_json(url, self._payload(prompt, system_prompt),
+                                       headers={"Content-Type": "application/json"},
+                                       max_retries=LLM_PROVIDER_RETRIES)
+        if status == 200 and isinstance(data, dict) and "candidates" in data:
+            return data["candidates"][0]["content"]["parts"][0]["text"]
+        raise ProviderError(f"{self.name}: {_error_message(data)}")
+
+    async def _stream(self, prompt: str, system_prompt: Optional[str]) -> AsyncIterator[str]:
+        url = f"https://generativelanguage.googleapis.com/v1/models/{self.model}:streamGenerateContent?alt=sse&key={GEMINI_API_KEY}"
+        async for event in stream_sse(url, self._payload(prompt, system_prompt),
+                                      headers={"Content-Type": "application/json"},
+                                      max_retries=LLM_PROVIDER_RETRIES):
+            data = json.loads(event)
+            for candidate in data.get("candidates", []):
+                for part in candidate.get("content", {}).get("parts", []):
+                    if part.get("text"):
+                        yield part["text"]
+
+
+class OpenRouterProvider(LLMProvider):
+    name = "openrouter"
+    url = "https://openrouter.ai/api/v1/chat/completions"
+
+    @property
+    def configured(self) -> bool:
+        return bool(OPENROUTER_API_KEY)
+
+    def _headers(self) -> Dict:
+        return {"Authorization": f"Bearer {OPENROUTER_API_KEY}", "Content-Type": "application/json"}
+
+    def _payload(self, prompt: str, system_prompt: Optional[str], stream: bool) -> Dict:
+        return {
+            "model": self.model,
+            "messages": _messages(prompt, system_prompt),
+            "max_tokens": 1024,
+            "temperature": 0.7,
+            "stream": stream,
+        }
+
+    async def _complete(self, prompt: str, system_prompt: Optional[str]) -> str:
+        status, data = await post_json(self.url, self._payload(prompt, system_prompt, False),
+                                       headers=self._headers(), max_retries=LLM_PROVIDER_RETRIES)
+        if status == 200 and isinstance(data, dict) and "choices" in data:
+            return data["choices"][0]["message"]["content"]
+        raise ProviderError(f"{self.name}: {_error_message(data)}")
+
+    async def _stream(self, prompt: str, system_prompt: Optional[str]) -> AsyncIterator[str]:
+        async for event in stream_sse(self.url, self._payload(prompt, system_prompt, True),
+                                      headers=self._headers(), max_retries=LLM_PROVIDER_RETRIES):
+            if event == "[DONE]":
+                break
+            data = json.loads(event)
+            for choice in data.get("choices", []):
+                content = choice.get("delta", {}).get("content")
+                if content:
+                    yield content
+
+
+class OllamaProvider(LLMProvider):
+    """A local (or self-hosted) Ollama server's /api/chat endpoint."""
+
+    name = "ollama"
+
+    def __init__(self, model: str, host: Optional[str]):
+        super().__init__(model)
+        self.host = host.rstrip("/") if host else None
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.host)
+
+    def _payload(self, prompt: str, system_prompt: Optional[str], stream: bool) -> Dict:
+        return {"model": self.model, "messages": _messages(prompt, system_prompt), "stream": stream}
+
+    async def _complete(self, prompt: str, system_prompt: Optional[str]) -> str:
+        status, data = await post_json(f"{self.host}/api/chat", self._payload(prompt, system_prompt, False),
+                                       max_retries=LLM_PROVIDER_RETRIES)
+        if status == 200 and isinstance(data, dict) and "message" in data:
+            return data["message"].get("content", "")
+        raise ProviderError(f"{self.name}: {_error_message(data)}")
+
+    async def _stream(self, prompt: str, system_prompt: Optional[str]) -> AsyncIterator[str]:
+        async for data in stream_ndjson(f"{self.host}/api/chat", self._payload(prompt, system_prompt, True),
+                                        max_retries=LLM_PROVIDER_RETRIES):
+            if data.get("error"):
+                raise ProviderError(f"{self.name}: {_error_message(data)}")
+            content = data.get("message", {}).get("content")
+            if content:
+                yield content
+            if data.get("done"):
+                break
+
+
+class ProviderRouter:
+    """Sends each completion to the best-ranked provider, falling back on errors and timeouts.
+
+    Providers are ranked healthy first, then those with free concurrency slots,
+    then by median latency, then by configured preference. With hedging on, a
+    second provider is started once the first has been running for its p95
+    latency, and whichever answers first wins; the other request is cancelled.
+    """
+
+    def __init__(self, providers: List[LLMProvider], timeout: float = LLM_PROVIDER_TIMEOUT,
+                 hedge: bool = LLM_HEDGE, hedge_delay: float = LLM_HEDGE_DELAY):
+        self.providers = [provider for provider in providers if provider.configured]
+        self.timeout = timeout
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+        self.hedges = 0
+        self.fallbacks = 0
+
+    @property
+    def model_key(self) -> str:
+        """Identifies the provider/model composition, for cache keys"""
+        return ",".join(f"{provider.name}:{provider.model}" for provider in self.providers)
+
+    def ranked(self) -> List[LLMProvider]:
+        def rank(item):
+            index, provider = item
+            p50 = provider.latency.percentile(50)
+            return (provider.cooling_down, provider.saturated, p50 if p50 is not None else float("inf"), index)
+        return [provider for _, provider in sorted(enumerate(self.providers), key=rank)]
+
+    def _hedge_after(self, provider: LLMProvider) -> float:
+        if provider.latency.count >= HEDGE_MIN_SAMPLES:
+            return provider.latency.percentile(95)
+        return self.hedge_delay
+
+    async def _attempt(self, provider: LLMProvider, prompt: str, system_prompt: Optional[str]) -> str:
+        try:
+            return await asyncio.wait_for(provider.complete(prompt, system_prompt), self.timeout)
+        except asyncio.TimeoutError:
+            provider.record_failure()
+            raise ProviderError(f"{provider.name}: no response within {self.timeout:g}s")
+
+    async def complete(self, prompt: str, system_prompt: Optional[str] = None) -> str:
+        remaining = self.ranked()
+        if not remaining:
+            raise ProviderError("No LLM provider is configured")
+        errors = []
+        pending = set()
+        hedged = False
+
+        def launch():
+            provider = remaining.pop(0)
+            pending.add(asyncio.ensure_future(self._attempt(provider, prompt, system_prompt)))
+            return provider
+
+        primary = launch()
+        try:
+            while pending:
+                wait_for = None
+                if self.hedge and not hedged and remaining and len(pending) == 1:
+                    wait_for = self._hedge_after(primary)
+                done, pending = await asyncio.wait(pending, timeout=wait_for, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    self.hedges += 1
+                    logging.info(f"{primary.name} slower than {wait_for:.2f}s, hedging with {remaining[0].name}")
+                    launch()
+                    continue
+                for task in done:
+                    try:
+                        return task.result()
+                    except ProviderError as e:
+                        errors.append(str(e))
+                if not pending and remaining:
+                    self.fallbacks += 1
+                    logging.warning(f"LLM provider failed ({errors[-1]}), falling back to {remaining[0].name}")
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+        raise ProviderError("; ".join(errors))
+
+    async def stream(self, prompt: str, system_prompt: Optional[str] = None) -> AsyncIterator[str]:
+        """Yield chunks from the best-ranked provider. A provider that fails or times out
+        before its first chunk is replaced by the next one; later errors are raised."""
+        providers = self.ranked()
+        if not providers:
+            raise ProviderError("No LLM provider is configured")
+        errors = []
+        for provider in providers:
+            if errors:
+                self.fallbacks += 1
+                logging.warning(f"LLM provider failed ({errors[-1]}), falling back to {provider.name}")
+            chunks = provider.stream(prompt, system_prompt)
+            try:
+                try:
+                    first = await asyncio.wait_for(chunks.__anext__(), self.timeout)
+                except StopAsyncIteration:
+                    return
+                except asyncio.TimeoutError:
+                    provider.record_failure()
+                    errors.append(f"{provider.name}: no response within {self.timeout:g}s")
+                    continue
+                except ProviderError as e:
+                    errors.append(str(e))
+                    continue
+                yield first
+                async for chunk in chunks:
+                    yield chunk
+                return
+            finally:
+                await chunks.aclose()
+        raise ProviderError("; ".join(errors))
+
+    def stats(self) -> Dict:
+        return {
+            "order": [provider.name for provider in self.ranked()],
+            "hedge": self.hedge,
+            "hedges": self.hedges,
+            "fallbacks": self.fallbacks,
+            "providers": {provider.name: provider.stats() for provider in self.providers},
+        }
+
+
+gemini = GeminiProvider(GEMINI_MODEL)
+openrouter = OpenRouterProvider(OPENROUTER_MODEL)
+ollama = OllamaProvider(OLLAMA_MODEL, OLLAMA_HOST)
+
+_available = {provider.name: provider for provider in (gemini, openrouter, ollama)}
+router = ProviderRouter([_available[name] for name in LLM_PROVIDERS if name in _available])
@@ -2,33 +2,68 @@ import uvicorn
 # Load environment variables from .env at startup
 from dotenv import load_dotenv
 
+import hashlib
+import json
+import math
+import os
 import sys
-import tempfile
 from collections import OrderedDict
-from contextlib import contextmanager
-from typing import IO, Dict, Iterable, Iterator, Mapping, Optional, Tuple, Union
+from contextlib import asynccontextmanager, contextmanager
+from typing import IO, AsyncIterator, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple, Union
 
 
 # FastAPI and related imports
-from fastapi import FastAPI, HTTPException, Depends, File, Form, UploadFile
+from fastapi import FastAPI, HTTPException, Depends, File, Form, Query, Request, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import RedirectResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
-from auth import get_current_user, create_user, authenticate_user
+from auth import get_current_user, create_user, authenticate_user, profile_cache, parse_roster, bulk_create_users
 from auth import router as auth_router
-from ai_ollama import get_project_suggestions, improve_idea, chat_with_ollama, get_relevant_websites
+from ai_ollama import get_project_suggestions, improve_idea, chat_with_ollama, get_relevant_websites, llm_cache, llm_flights
+from ai_ollama import stream_chat_with_ollama, stream_project_suggestions, stream_relevant_websites, chat_ttft
+from llm_providers import router as llm_router
+from bulk_upload import BULK_UPLOAD_MAX_BYTES, read_bulk_form, bulk_upload_projects
 
 # AI endpoints
-from search import search_projects
-from utils.db import get_supabase_client
+from search import (search_projects_page, project_index, vector_index, MAX_SEARCH_LIMIT,
+                    start_search_index, stop_search_index, duplicate_index, duplicate_clusters,
+                    content_index, DUPLICATE_DETECTION)
+from jobs import job_queue, enqueue_post_processing
+from utils.job_queue import JOB_STATUSES
+from utils.supabase_client import get_supabase_client, init_clients, close_clients, client_stats
+from utils.executor import run_blocking, shutdown_executor, executor_stats
+from utils.http_session import close_http_session
+from utils.storage import ObjectNotFound, StorageError, get_object_store
+from utils.pagination import decode_cursor, encode_cursor, fingerprint
+from utils.admission import AdmissionControl, Overloaded, Ticket
+from utils.body_limit import BodySizeLimitMiddleware
+from utils import metrics
 
 class WebsiteQuery(BaseModel):
     query: str
+    stream: bool = False  # NDJSON: one website per line as soon as it is generated
 
 load_dotenv()
 
-app = FastAPI(title="Project Marketplace API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    init_clients()
+    await start_search_index()
+    await job_queue.start()
+    yield
+    await job_queue.stop()
+    await stop_search_index()
+    await close_http_session()
+    llm_cache.close()
+    job_queue.close()
+    close_clients()
+    shutdown_executor()
+    metrics.close_tracing()
+
+app = FastAPI(title="Project Marketplace API", version="1.0.0", lifespan=lifespan)
 
 # CORS middleware for development
 app.add_middleware(
@@ -39,6 +74,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Refused before Starlette spools the body; the allowance covers the other form fields
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+UPLOAD_FORM_ALLOWANCE = 1024 * 1024
+app.add_middleware(BodySizeLimitMiddleware, limits={
+    "/api/files/upload": MAX_UPLOAD_BYTES + UPLOAD_FORM_ALLOWANCE,
+    "/api/files/bulk-upload": BULK_UPLOAD_MAX_BYTES,
+})
+
 app.include_router(auth_router)
 
 security = HTTPBearer()
@@ -57,11 +102,23 @@ class UserLogin(BaseModel):
 class SearchQuery(BaseModel):
     query: str
 
+class ProjectSearchQuery(SearchQuery):
+    mode: Optional[str] = None  # "index" (default), "database", "semantic", "hybrid" or "content"
+    semantic_weight: Optional[float] = Field(default=None, ge=0, le=1)  # hybrid: vector share of the score
+    limit: int = Field(default=50, ge=1, le=MAX_SEARCH_LIMIT)
+    cursor: Optional[str] = None  # next_cursor from the previous page
+    fields: Optional[List[str]] = None  # columns to return, ["*"] for all
+    stream: bool = False  # NDJSON: one result per line, then {"next_cursor": ...}
+
+class SuggestionQuery(SearchQuery):
+    stream: bool = False  # NDJSON: one suggestion per line as soon as it is generated
+
 class IdeaImprovement(BaseModel):
     idea: str
 
 class ChatMessage(BaseModel):
     message: str
+    stream: bool = False  # text/event-stream of {"token": ...} events, then a "done" event
 
 # Auth endpoints
 @app.post("/api/auth/register")
@@ -72,6 +129,31 @@ async def register(user: UserCreate):
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.post("/api/auth/bulk-register")
+async def bulk_register(request: Request, current_user = Depends(get_current_user)):
+    """Onboard a class from a CSV or JSON roster (request body, or a multipart "file" field).
+
+    Streams NDJSON: one {"row", "email", "status", ...} line per user, then {"summary": ...}.
+    Rows without a password are sent an invite email instead.
+    """
+    if current_user.get("role") != "teacher":
+        raise HTTPException(status_code=403, detail="Only teachers can import students")
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/"):
+        form = await request.form()
+        roster = form.get("file")
+        if roster is None or not hasattr(roster, "read"):
+            raise HTTPException(status_code=400, detail="Multipart roster must be sent as the 'file' field")
+        content = await roster.read()
+        content_type = roster.content_type or ("application/json" if roster.filename.endswith(".json") else "text/csv")
+    else:
+        content = await request.body()
+    try:
+        users = parse_roster(content, content_type)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(_ndjson_items(bulk_create_users(users)), media_type="application/x-ndjson")
+
 @app.post("/api/auth/login")
 async def login(user: UserLogin):
     try:
@@ -86,24 +168,147 @@ async def logout(credentials: HTTPAuthorizationCredentials = Depends(security)):
 
 # Search endpoints
 @app.post("/api/search/projects")
-async def search_project_ideas(query: SearchQuery, current_user = Depends(get_current_user)):
+async def search_project_ideas(query: ProjectSearchQuery, current_user = Depends(get_current_user)):
     try:
-        results = await search_projects(query.query)
-        return {"results": results}
+        results, next_cursor = await search_projects_page(
+            query.query, limit=query.limit, cursor=query.cursor, fields=query.fields, mode=query.mode,
+            semantic_weight=query.semantic_weight,
+        )
+        if query.stream:
+            return StreamingResponse(_ndjson_results(results, next_cursor), media_type="application/x-ndjson")
+        return {"results": results, "next_cursor": next_cursor}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _ndjson_results(results, next_cursor):
+    # Serialized lazily, in rank order, so the first rows go out before the rest are encoded
+    for project in results:
+        yield json.dumps(project, default=str) + "\n"
+    yield json.dumps({"next_cursor": next_cursor}) + "\n"
+
+@app.get("/api/system/stats")
+async def system_stats(current_user = Depends(get_current_user)):
+    return {
+        "search_index": project_index.stats(),
+        "vector_index": vector_index.stats(),
+        "duplicate_index": duplicate_index.stats(),
+        "content_index": content_index.stats(),
+        "job_queue": job_queue.stats(),
+        "profile_cache": profile_cache.stats(),
+        "supabase_clients": client_stats(),
+        "blocking_io": executor_stats(),
+        "llm_cache": llm_cache.stats(),
+        "llm_single_flight": llm_flights.stats(),
+        "chat_time_to_first_token": chat_ttft.stats(),
+        "llm_providers": llm_router.stats(),
+        "ai_admission": ai_admission.stats(),
+    }
+
+def _collect_metrics():
+    families = metrics.cache_families({
+        "profile": profile_cache.stats(),
+        "llm": llm_cache.stats(),
+    })
+    index = project_index.stats()
+    io = executor_stats()
+    providers = llm_router.stats()["providers"]
+    jobs = job_queue.stats()
+    content = content_index.stats()
+    admission = ai_admission.stats()["concurrency"]
+    families += [
+        ("job_queue_jobs", "gauge", "Background jobs by status",
+         [({"status": status}, jobs[status]) for status in JOB_STATUSES]),
+        ("job_queue_oldest_due_seconds", "gauge", "Age of the oldest job waiting for a worker",
+         [({}, jobs["oldest_due_seconds"])]),
+        ("job_queue_retries", "counter", "Job attempts that failed and were scheduled again", [({}, jobs["retried"])]),
+        ("search_index_rows", "gauge", "Projects held in the in-memory search index", [({}, index["rows"])]),
+        ("vector_index_rows", "gauge", "Projects embedded in the semantic vector index", [({}, len(vector_index))]),
+        ("duplicate_index_rows", "gauge", "Projects signed in the near-duplicate index", [({}, len(duplicate_index))]),
+        ("content_index_rows", "gauge", "Projects in the full-text content index", [({}, content["documents"])]),
+        ("content_index_segments", "gauge", "On-disk segments of the content index", [({}, content["segments"])]),
+        ("ai_admission_active", "gauge", "AI requests holding a concurrency slot", [({}, admission["active"])]),
+        ("ai_admission_queued", "gauge", "AI requests waiting for a concurrency slot", [({}, admission["queued"])]),
+        ("blocking_io_queued", "gauge", "Blocking calls waiting for an I/O thread", [({}, io["queued"])]),
+        ("blocking_io_running", "gauge", "Blocking calls running on an I/O thread", [({}, io["running"])]),
+        ("llm_single_flight_coalesced", "counter", "AI requests answered by another caller's in-flight call",
+         [({}, llm_flights.stats()["coalesced"])]),
+        ("llm_provider_active", "gauge", "Requests in flight per LLM provider",
+         [({"provider": name}, stats["active"]) for name, stats in providers.items()]),
+    ]
+    return families
+
+metrics.registry.add_collector(_collect_metrics)
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus scrape endpoint"""
+    return Response(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
 # AI endpoints
+# Every AI request may start an upstream LLM call. Each user gets AI_RATE_PER_MINUTE of them
+# (bursts of up to AI_RATE_BURST); at most AI_MAX_CONCURRENCY run at once and AI_QUEUE_SIZE more
+# wait up to AI_QUEUE_TIMEOUT seconds for a slot. Anything beyond that gets 429 with Retry-After
+ai_admission = AdmissionControl(
+    "ai",
+    rate=float(os.getenv("AI_RATE_PER_MINUTE", "30")) / 60,
+    burst=float(os.getenv("AI_RATE_BURST", "10")),
+    limit=int(os.getenv("AI_MAX_CONCURRENCY", "32")),
+    queue_size=int(os.getenv("AI_QUEUE_SIZE", "64")),
+    max_wait=float(os.getenv("AI_QUEUE_TIMEOUT", "10")),
+)
+
+async def admit_ai_request(current_user = Depends(get_current_user)) -> AsyncIterator[Ticket]:
+    """Authenticate, then take a rate-limit token and a concurrency slot for the request.
+
+    The slot is given back when the request is done, including when the body fails
+    validation and the handler never runs.
+    """
+    try:
+        ticket = await ai_admission.admit(current_user.get("id"))
+    except Overloaded as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after))})
+    try:
+        yield ticket
+    finally:
+        ticket.release()
+
+def _admitted_stream(ticket: Ticket, items, **kwargs) -> StreamingResponse:
+    # Dependency teardown can run before a streamed body finishes, so the body takes the
+    # slot over and holds it until the last chunk is sent; the background task covers
+    # responses whose body never starts
+    ticket = ticket.transfer()
+
+    async def body():
+        try:
+            async for item in items:
+                yield item
+        finally:
+            ticket.release()
+    return StreamingResponse(body(), background=BackgroundTask(ticket.release), **kwargs)
+
 @app.post("/api/ai/suggestions")
-async def get_suggestions(query: SearchQuery, current_user = Depends(get_current_user)):
+async def get_suggestions(query: SuggestionQuery, ticket: Ticket = Depends(admit_ai_request)):
+    if query.stream:
+        return _admitted_stream(ticket, _ndjson_items(stream_project_suggestions(query.query)),
+                                media_type="application/x-ndjson")
     try:
         suggestions = await get_project_suggestions(query.query)
         return {"suggestions": suggestions}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _ndjson_items(items):
+    # A failure after the first lines can no longer change the status code, so it is reported in-band
+    try:
+        async for item in items:
+            yield json.dumps(item, default=str) + "\n"
+    except Exception as e:
+        yield json.dumps({"error": str(e)}) + "\n"
+
 @app.post("/api/ai/improve")
-async def improve_project_idea(idea: IdeaImprovement, current_user = Depends(get_current_user)):
+async def improve_project_idea(idea: IdeaImprovement, ticket: Ticket = Depends(admit_ai_request)):
     try:
         improvement = await improve_idea(idea.idea)
         return {"improvement": improvement}
@@ -111,16 +316,43 @@ async def improve_project_idea(idea: IdeaImprovement, current_user = Depends(get
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/ai/chat")
-async def chat(message: ChatMessage, current_user = Depends(get_current_user)):
+async def chat(message: ChatMessage, request: Request, ticket: Ticket = Depends(admit_ai_request)):
+    if message.stream:
+        return _admitted_stream(
+            ticket,
+            _sse_chat(message.message, request),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
     try:
         response = await chat_with_ollama(message.message)
         return {"response": response}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _sse_chat(message: str, request: Request):
+    # Each token is yielded only after the previous one was sent, so a slow client
+    # slows the upstream read instead of buffering the reply here
+    tokens = stream_chat_with_ollama(message)
+    try:
+        async for token in tokens:
+            if await request.is_disconnected():
+                break
+            yield f"data: {json.dumps({'token': token})}\n\n"
+        else:
+            yield "event: done\ndata: {}\n\n"
+    except Exception as e:
+        yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+    finally:
+        # Closes the upstream response when the client went away mid-stream
+        await tokens.aclose()
+
 # Relevant Websites endpoint
 @app.post("/api/ai/websites")
-async def relevant_websites(query: WebsiteQuery, current_user = Depends(get_current_user)):
+async def relevant_websites(query: WebsiteQuery, ticket: Ticket = Depends(admit_ai_request)):
+    if query.stream:
+        return _admitted_stream(ticket, _ndjson_items(stream_relevant_websites(query.query)),
+                                media_type="application/x-ndjson")
     try:
         websites = await get_relevant_websites(query.query)
         return websites
@@ -128,6 +360,19 @@ async def relevant_websites(query: WebsiteQuery, current_user = Depends(get_curr
         raise HTTPException(status_code=500, detail=str(e))
 
 # File endpoints
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+def _hash_upload(fileobj) -> Tuple[int, str]:
+    """Size and sha256 of a received upload, read in fixed-size chunks; leaves it rewound"""
+    digest = hashlib.sha256()
+    size = 0
+    fileobj.seek(0)
+    for chunk in iter(lambda: fileobj.read(UPLOAD_CHUNK_BYTES), b""):
+        size += len(chunk)
+        digest.update(chunk)
+    fileobj.seek(0)
+    return size, digest.hexdigest()
+
 @app.post("/api/files/upload")
 async def upload_project_file(
     file: UploadFile = File(...),
@@ -143,43 +388,37 @@ async def upload_project_file(
         if current_user.get('role') != 'teacher':
             raise HTTPException(status_code=403, detail="Only teachers can upload files")
 
-        # Upload file to Supabase Storage
-        import os
-        from supabase import create_client
-        import os
-        # Use service role key to bypass RLS
-        supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_SERVICE_ROLE_KEY"))
         import uuid
         file_extension = os.path.splitext(file.filename)[1]
         unique_filename = f"{uuid.uuid4()}{file_extension}"
-        file_content = await file.read()
         bucket_name = os.getenv("SUPABASE_BUCKET_NAME", "project-files")
-        file_size = len(file_content) if file_content else 0
-        storage_response = supabase.storage.from_(bucket_name).upload(
-            unique_filename,
-            file_content,
-            file_options={"content-type": file.content_type}
-        )
-        # Supabase Python client returns UploadResponse with path/full_path on success
-        upload_success = False
-        upload_path = getattr(storage_response, 'path', None)
-        upload_full_path = getattr(storage_response, 'full_path', None)
-        if upload_path or upload_full_path:
-            upload_success = True
-        if not upload_success:
+        # Use service role key to bypass RLS
+        supabase = get_supabase_client()
+
+        # Starlette has already spooled the part (oversized bodies were refused by
+        # BodySizeLimitMiddleware); hash it and hand that same file to the object store
+        file_size, content_sha256 = await run_blocking(_hash_upload, file.file)
+        if file_size > MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail=f"File exceeds the {MAX_UPLOAD_BYTES} byte upload limit")
+        try:
+            stored = await run_blocking(
+                get_object_store(bucket_name).upload_file,
+                unique_filename,
+                file.file,
+                file.content_type
+            )
+        except StorageError as e:
             # Debug info for troubleshooting
             debug_info = {
                 "bucket": bucket_name,
                 "filename": unique_filename,
                 "file_size": file_size,
                 "content_type": file.content_type,
-                "supabase_response": str(storage_response)
+                "supabase_error": str(e)
             }
-            error_message = getattr(storage_response, 'error', None)
-            if error_message:
-                debug_info["supabase_error"] = error_message
-                raise HTTPException(status_code=500, detail=f"File upload failed: {error_message}. Debug: {debug_info}")
-            raise HTTPException(status_code=500, detail=f"File upload failed (no error message from Supabase). Debug: {debug_info}")
+            raise HTTPException(status_code=500, detail=f"File upload failed: {e}. Debug: {debug_info}")
+        upload_path = stored["path"]
+        upload_full_path = stored["full_path"]
 
         # Insert metadata into project_data table
         project_row = {
@@ -188,75 +427,214 @@ async def upload_project_file(
             "project_title": title,
             "abstract": abstract,
             "file_url": unique_filename,
+            "file_size": file_size,
+            "content_sha256": content_sha256,
             "uploaded_by": current_user['id']
         }
-        db_response = supabase.table("project_data").insert(project_row).execute()
+        db_response = await run_blocking(supabase.table("project_data").insert(project_row).execute)
         db_result = getattr(db_response, 'data', None)
         if db_result and isinstance(db_result, list) and len(db_result) > 0:
+            # Validation, text extraction, indexing and the duplicate check run in the background;
+            # GET /api/jobs/{id} reports their outcome
+            job = await enqueue_post_processing([db_result[0]], current_user['id'], bucket_name)
             return {
                 "message": "File uploaded successfully",
                 "project": db_result[0],
+                "job": job,
                 "storage": {
                     "path": upload_path,
-                    "full_path": upload_full_path
+                    "full_path": upload_full_path,
+                    "size": file_size,
+                    "sha256": content_sha256
                 }
             }
         else:
             raise HTTPException(status_code=500, detail="Database insert failed")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/files/bulk-upload")
+async def bulk_upload_project_files(request: Request, current_user = Depends(get_current_user)):
+    """Upload a batch of projects: several "files" fields plus a "manifest" (CSV or JSON with
+    file, title, abstract, student_name and student_id per project), or one zip "archive"
+    holding the files and a manifest.json/manifest.csv.
+
+    Streams NDJSON: one {"row", "file", "status", ...} line per manifest entry, then {"summary": ...}.
+    """
+    if current_user.get("role") != "teacher":
+        raise HTTPException(status_code=403, detail="Only teachers can upload files")
+    form = await request.form()
+    try:
+        entries, sources = await read_bulk_form(form)
+    except ValueError as e:
+        await form.close()
+        raise HTTPException(status_code=400, detail=str(e))
+    results = bulk_upload_projects(entries, sources, current_user["id"], MAX_UPLOAD_BYTES)
+    return StreamingResponse(_ndjson_items(_closing_form(results, form)), media_type="application/x-ndjson")
+
+async def _closing_form(items, form):
+    # The spooled files are read until the last item is stored
+    try:
+        async for item in items:
+            yield item
+    finally:
+        await form.close()
+
+SUBMISSION_FIELDS = ("id", "created_at", "project_title", "abstract", "student_name", "student_id", "file_url", "uploaded_by")
+MAX_SUBMISSIONS_LIMIT = 500
+
+def _quoted(value) -> str:
+    # PostgREST logic-tree values containing ':' or '+' (timestamps) must be quoted
+    return '"' + str(value).replace('"', '\\"') + '"'
+
 @app.get("/api/files/submissions")
-async def get_submissions(current_user = Depends(get_current_user)):
+async def get_submissions(
+    limit: int = Query(50, ge=1, le=MAX_SUBMISSIONS_LIMIT),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated columns, default SUBMISSION_FIELDS"),
+    uploaded_by: Optional[str] = None,
+    student_id: Optional[str] = None,
+    created_from: Optional[str] = Query(None, description="ISO timestamp, inclusive"),
+    created_to: Optional[str] = Query(None, description="ISO timestamp, exclusive"),
+    count: Optional[str] = Query(None, pattern="^(exact|estimated|planned)$"),
+    current_user = Depends(get_current_user)
+):
     try:
         # Check if user is examiner
         if current_user.get('role') != 'examiner':
             raise HTTPException(status_code=403, detail="Only examiners can view submissions")
 
-        # Fetch all project submissions from project_data
-        from supabase import create_client
-        import os
-        supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_SERVICE_ROLE_KEY"))
-        response = supabase.table("project_data").select("*").execute()
+        columns = [c.strip() for c in fields.split(",") if c.strip()] if fields else list(SUBMISSION_FIELDS)
+        if any(not c.replace("_", "").isalnum() for c in columns):
+            raise HTTPException(status_code=400, detail="Invalid fields")
+        # The keyset columns are always fetched so the next cursor can be built
+        for key in ("created_at", "id"):
+            if key not in columns:
+                columns.append(key)
+
+        filters_key = fingerprint(uploaded_by, student_id, created_from, created_to)
+        after = None
+        if cursor:
+            try:
+                after = decode_cursor(cursor)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            if after.get("f") != filters_key:
+                raise HTTPException(status_code=400, detail="Cursor does not belong to these filters")
+
+        # Newest first, keyset-paginated on (created_at, id) so deep pages cost the same as the first
+        supabase = get_supabase_client()
+        query = supabase.table("project_data").select(",".join(columns), count=count)
+        if uploaded_by:
+            query = query.eq("uploaded_by", uploaded_by)
+        if student_id:
+            query = query.eq("student_id", student_id)
+        if created_from:
+            query = query.gte("created_at", created_from)
+        if created_to:
+            query = query.lt("created_at", created_to)
+        if after:
+            ts, row_id = _quoted(after["created_at"]), _quoted(after["id"])
+            query.params = query.params.add("or", f"(created_at.lt.{ts},and(created_at.eq.{ts},id.lt.{row_id}))")
+        # One order= parameter: postgrest-py's order() adds a parameter per call and PostgREST
+        # reads only one, which would drop the id tie-break the cursor relies on
+        query.params = query.params.add("order", "created_at.desc,id.desc")
+        query = query.limit(limit + 1)
+
+        response = await run_blocking(query.execute)
         data = getattr(response, 'data', None)
-        if data and isinstance(data, list):
-            return {"files": data}
-        else:
-            return {"files": []}
+        rows = data if data and isinstance(data, list) else []
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = encode_cursor({"created_at": last["created_at"], "id": last["id"], "f": filters_key})
+        result = {"files": rows, "next_cursor": next_cursor}
+        if count:
+            result["total"] = getattr(response, 'count', None)
+        return result
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/files/download/{file_key}")
-async def download_project_file(file_key: str, current_user = Depends(get_current_user)):
-    import os
-    from supabase import create_client
-    from fastapi.responses import StreamingResponse
-    import io
+@app.get("/api/files/duplicates")
+async def get_duplicate_projects(
+    min_similarity: Optional[float] = Query(None, ge=0, le=1, description="Estimated Jaccard similarity, default DUPLICATE_THRESHOLD"),
+    limit: int = Query(50, ge=1, le=MAX_SUBMISSIONS_LIMIT),
+    current_user = Depends(get_current_user)
+):
+    """Clusters of likely duplicate projects by title, abstract and file text, largest first"""
+    if current_user.get("role") != "examiner":
+        raise HTTPException(status_code=403, detail="Only examiners can view duplicates")
+    if not DUPLICATE_DETECTION:
+        raise HTTPException(status_code=404, detail="Duplicate detection is disabled (DUPLICATE_DETECTION=false)")
+    clusters = await duplicate_clusters(min_similarity, limit)
+    return {"clusters": clusters, "indexed_projects": len(duplicate_index)}
+
+@app.get("/api/jobs")
+async def list_jobs(
+    status: Optional[str] = Query(None, pattern="^(queued|running|succeeded|failed)$"),
+    limit: int = Query(50, ge=1, le=MAX_SUBMISSIONS_LIMIT),
+    current_user = Depends(get_current_user)
+):
+    """Recent background jobs, newest first; examiners see everyone's, others their own"""
+    owner = None if current_user.get("role") == "examiner" else current_user["id"]
+    return {"jobs": await job_queue.recent(owner=owner, status=status, limit=limit), "queue": job_queue.stats()}
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str, current_user = Depends(get_current_user)):
+    job = await job_queue.get(job_id)
+    if job is None or (current_user.get("role") != "examiner" and job["owner"] != current_user["id"]):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+# Files at least this large are served by redirecting to a short-lived signed URL (0 disables)
+DOWNLOAD_REDIRECT_BYTES = int(os.getenv("DOWNLOAD_REDIRECT_BYTES", str(25 * 1024 * 1024)))
+SIGNED_URL_TTL_SECONDS = int(os.getenv("SIGNED_URL_TTL_SECONDS", "60"))
 
+@app.get("/api/files/download/{file_key}")
+async def download_project_file(file_key: str, request: Request, redirect: Optional[bool] = None,
+                                current_user = Depends(get_current_user)):
     if current_user.get("role") != "examiner":
         raise HTTPException(status_code=403, detail="Only examiners can download files")
 
-    supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_SERVICE_ROLE_KEY"))
+    supabase = get_supabase_client()
     bucket_name = os.getenv("SUPABASE_BUCKET_NAME", "project-files")
 
     # Try to find the file in the database by file_url
-    response = supabase.table("project_data").select("*").eq("file_url", file_key).execute()
+    response = await run_blocking(supabase.table("project_data").select("file_url, file_size").eq("file_url", file_key).execute)
     data = response.data
 
     if not data or not isinstance(data, list) or len(data) == 0:
         raise HTTPException(status_code=404, detail="File not found in database")
 
     file_name = data[0]["file_url"]
+    file_size = data[0].get("file_size") or 0
+    store = get_object_store(bucket_name)
 
-    # Download file content from Supabase Storage
-    file_response = supabase.storage.from_(bucket_name).download(file_name)
+    # Large files (or redirect=true) are fetched straight from storage by the client
+    if redirect or (redirect is None and DOWNLOAD_REDIRECT_BYTES and file_size >= DOWNLOAD_REDIRECT_BYTES):
+        signed_url = await run_blocking(store.signed_url, file_name, SIGNED_URL_TTL_SECONDS)
+        if signed_url:
+            return RedirectResponse(signed_url, status_code=307)
 
-    if hasattr(file_response, 'error') and file_response.error:
-        raise HTTPException(status_code=500, detail=f"Failed to download file from bucket: {file_response.error}")
+    # Otherwise pass the storage body through chunk by chunk, honouring Range/If-None-Match
+    forwarded = {name: request.headers[name] for name in ("Range", "If-None-Match") if name in request.headers}
+    try:
+        stream = await store.open_stream(file_name, forwarded)
+    except ObjectNotFound:
+        raise HTTPException(status_code=404, detail="File not found in bucket")
+    except StorageError as e:
+        raise HTTPException(status_code=500, detail=f"Failed to download file from bucket: {e}")
+
+    headers = {**stream.headers, "Content-Disposition": f"attachment; filename={file_name}"}
+    if stream.status in (304, 416):
+        stream.close()
+        return Response(status_code=stream.status, headers=headers)
+    return StreamingResponse(stream.chunks, status_code=stream.status, media_type="application/octet-stream", headers=headers)
 
-    # Return as a StreamingResponse
-    return StreamingResponse(io.BytesIO(file_response), media_type="application/octet-stream", headers={
-        "Content-Disposition": f"attachment; filename={file_name}"
-    })
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=5000)
@@ -0,0 +1,25 @@
+-- Optional: run this SQL in the Supabase SQL editor and set PROFILE_SYNC=trigger to have
+-- Postgres create the profiles row in the same transaction as the auth user, instead of the
+-- API inserting it afterwards. Name and role come from the signup's user metadata.
+create or replace function public.handle_new_user()
+returns trigger
+language plpgsql
+security definer set search_path = public
+as $$
+begin
+    insert into public.profiles (id, name, email, role)
+    values (
+        new.id,
+        coalesce(new.raw_user_meta_data ->> 'name', split_part(new.email, '@', 1)),
+        new.email,
+        coalesce(new.raw_user_meta_data ->> 'role', 'student')
+    )
+    on conflict (id) do nothing;
+    return new;
+end;
+$$;
+
+drop trigger if exists on_auth_user_created on auth.users;
+create trigger on_auth_user_created
+    after insert on auth.users
+    for each row execute procedure public.handle_new_user();
@@ -6,3 +6,11 @@ alter table project_data add column if not exists abstract text;
 alter table project_data add column if not exists file_url text;
 alter table project_data add column if not exists uploaded_by uuid references auth.users(id);
 alter table project_data add column if not exists created_at timestamp with time zone default now();
+alter table project_data add column if not exists file_size bigint;
+alter table project_data add column if not exists content_sha256 text;
+
+-- Indexes for keyset pagination and filters on /api/files/submissions, and the download lookup
+create index if not exists project_data_created_at_id_idx on project_data (created_at desc, id desc);
+create index if not exists project_data_uploaded_by_created_at_idx on project_data (uploaded_by, created_at desc, id desc);
+create index if not exists project_data_student_id_created_at_idx on project_data (student_id, created_at desc, id desc);
+create index if not exists project_data_file_url_idx on project_data (file_url);
@@ -0,0 +1,33 @@
+-- Run this SQL in the Supabase SQL editor to enable database-side search candidates (SEARCH_MODE=database)
+create extension if not exists pg_trgm;
+
+create index if not exists project_data_title_trgm_idx
+    on project_data using gin (lower(coalesce(project_title, '')) gin_trgm_ops);
+create index if not exists project_data_abstract_trgm_idx
+    on project_data using gin (lower(coalesce(abstract, '')) gin_trgm_ops);
+
+-- Returns at most max_candidates rows whose title is trigram-similar to the query,
+-- or whose abstract contains a trigram-similar phrase. search.py re-ranks them with RapidFuzz.
+create or replace function search_project_candidates(
+    query text,
+    max_candidates integer default 200,
+    min_similarity real default 0.3
+)
+returns setof project_data
+language plpgsql
+as $$
+begin
+    perform set_config('pg_trgm.similarity_threshold', min_similarity::text, true);
+    perform set_config('pg_trgm.word_similarity_threshold', min_similarity::text, true);
+    return query
+        select p.*
+        from project_data p
+        where lower(coalesce(p.project_title, '')) % lower(query)
+           or lower(query) <% lower(coalesce(p.abstract, ''))
+        order by greatest(
+            similarity(lower(coalesce(p.project_title, '')), lower(query)),
+            word_similarity(lower(query), lower(coalesce(p.abstract, '')))
+        ) desc
+        limit max_candidates;
+end;
+$$;
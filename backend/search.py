@@ -1,34 +1,400 @@
-from rapidfuzz import fuzz
+import asyncio
+import io
+import logging
+import os
 from utils.supabase_client import get_supabase_client
-from typing import List, Dict
+from utils import metrics
+from utils.executor import run_blocking
+from utils.search_index import ProjectSearchIndex, rank_rows, row_key
+from utils.vector_index import VectorIndex
+from utils.minhash import MinHashLSH
+from utils.inverted_index import ContentIndex
+from utils.storage import get_object_store
+from utils.text_extract import extract_text
+from utils.pagination import decode_cursor, encode_cursor, fingerprint, project_fields
+from typing import List, Dict, Optional, Sequence, Tuple
 
-async def search_projects(query: str, threshold: int = 60) -> List[Dict]:
-    """Search projects using RapidFuzz with token_sort_ratio"""
-    supabase = get_supabase_client()
-    
-    # Get all projects from database
-    projects_response = supabase.table("project_data").select("*").execute()
-    projects = projects_response.data
-    
-    # Perform fuzzy search
-    matching_projects = []
-    
-    for project in projects:
-        # Calculate similarity score using correct columns
-        title_score = fuzz.token_sort_ratio(query.lower(), project.get('project_title', '').lower())
-        abstract_score = fuzz.token_sort_ratio(query.lower(), project.get('abstract', '').lower())
+SEARCH_INDEX_REFRESH_SECONDS = float(os.getenv("SEARCH_INDEX_REFRESH_SECONDS", "60"))
 
-        # Use the higher score
-        max_score = max(title_score, abstract_score)
+# "index": score the in-memory index; "database": let Postgres pick trigram candidates
+# (see project_search.sql) and re-rank only those; "semantic": nearest neighbours in the
+# vector index; "hybrid": those neighbours re-ranked by a blend of vector and fuzzy scores;
+# "content": BM25 over the text of the uploaded files, with highlighted snippets
+SEARCH_MODES = ("index", "database", "semantic", "hybrid", "content")
+SEARCH_MODE = os.getenv("SEARCH_MODE", "index")
+SEARCH_DB_CANDIDATES = int(os.getenv("SEARCH_DB_CANDIDATES", "200"))
+SEARCH_DB_MIN_SIMILARITY = float(os.getenv("SEARCH_DB_MIN_SIMILARITY", "0.3"))
 
-        if max_score >= threshold:
-            project['similarity_score'] = max_score
-            matching_projects.append(project)
-    
-    # Sort by similarity score (descending)
-    matching_projects.sort(key=lambda x: x['similarity_score'], reverse=True)
-    
-    return matching_projects
+SEMANTIC_SEARCH = os.getenv("SEMANTIC_SEARCH", "true").lower() == "true"
+SEMANTIC_CANDIDATES = int(os.getenv("SEMANTIC_CANDIDATES", "200"))
+SEMANTIC_WEIGHT = float(os.getenv("SEMANTIC_WEIGHT", "0.5"))  # vector share of the hybrid score
+SEMANTIC_MIN_SCORE = float(os.getenv("SEMANTIC_MIN_SCORE", "30"))
+
+# Near-duplicate detection: MinHash signatures of title, abstract and file text, looked up
+# through LSH buckets. DUPLICATE_THRESHOLD is the estimated Jaccard similarity reported
+# as a likely duplicate; DUPLICATE_BACKFILL_FILES downloads the files of projects the
+# index has not seen yet (otherwise those are indexed by title and abstract only)
+DUPLICATE_DETECTION = os.getenv("DUPLICATE_DETECTION", "true").lower() == "true"
+DUPLICATE_THRESHOLD = float(os.getenv("DUPLICATE_THRESHOLD", "0.6"))
+DUPLICATE_BACKFILL_FILES = os.getenv("DUPLICATE_BACKFILL_FILES", "true").lower() == "true"
+DUPLICATE_FIELDS = ("id", "project_title", "student_name", "student_id", "file_url", "uploaded_by", "created_at")
+
+# Content search: title, abstract and extracted file text in an on-disk inverted index
+# (segments under CONTENT_INDEX_DIR, merged as uploads add more). CONTENT_BACKFILL_FILES
+# downloads the files of projects the index has not seen yet
+CONTENT_SEARCH = os.getenv("CONTENT_SEARCH", "true").lower() == "true"
+CONTENT_BACKFILL_FILES = os.getenv("CONTENT_BACKFILL_FILES", "true").lower() == "true"
+CONTENT_BACKFILL_BATCH = int(os.getenv("CONTENT_BACKFILL_BATCH", "200"))
+
+# Columns returned by default; file_url, uploaded_by and student_id are left out unless asked for.
+# snippet is only set in content mode
+DEFAULT_SEARCH_FIELDS = ("id", "project_title", "abstract", "student_name", "created_at", "similarity_score", "snippet")
+MAX_SEARCH_LIMIT = 200
+MAX_CONTENT_RESULTS = 1000  # content-mode matches ranked when no limit is given
+
+project_index = ProjectSearchIndex()
+vector_index = VectorIndex(
+    os.getenv("SEMANTIC_INDEX_DIR", "vector_index"),
+    embedder=os.getenv("SEMANTIC_EMBEDDER", "tfidf"),
+    model=os.getenv("SEMANTIC_MODEL", "all-MiniLM-L6-v2"),
+    dims=int(os.getenv("SEMANTIC_DIMS", "128")),
+    nprobe=int(os.getenv("SEMANTIC_NPROBE", "32")),
+)
+duplicate_index = MinHashLSH(
+    os.getenv("DUPLICATE_INDEX_DIR", "duplicate_index"),
+    num_perm=int(os.getenv("DUPLICATE_NUM_PERM", "128")),
+    bands=int(os.getenv("DUPLICATE_BANDS", "16")),
+)
+content_index = ContentIndex(
+    os.getenv("CONTENT_INDEX_DIR", "content_index"),
+    max_segments=int(os.getenv("CONTENT_MAX_SEGMENTS", "8")),
+    merge_factor=int(os.getenv("CONTENT_MERGE_FACTOR", "4")),
+    stored_chars=int(os.getenv("CONTENT_SNIPPET_SOURCE_CHARS", "50000")),
+)
+_refresh_task: Optional[asyncio.Task] = None
+_vector_task: Optional[asyncio.Task] = None
+_document_task: Optional[asyncio.Task] = None
+
+async def load_project_index() -> int:
+    """Load the whole project_data table into the in-memory index"""
+    with metrics.trace("search.load_index"):
+        return await run_blocking(project_index.load, get_supabase_client())
+
+def _sync_vector_index() -> int:
+    rows, _, _ = project_index.entries()
+    rows = [row for row in rows if row_key(row) is not None]
+    return vector_index.sync(rows, [row_key(row) for row in rows])
+
+async def sync_vector_index():
+    """Build, reopen or top up the vector index from the project index"""
+    try:
+        with metrics.trace("search.sync_vectors"):
+            embedded = await run_blocking(_sync_vector_index)
+        if embedded:
+            logging.info(f"Vector index embedded {embedded} projects")
+    except Exception as e:
+        logging.exception(f"Vector index sync failed: {e}")
+
+def _start_vector_sync():
+    global _vector_task
+    if SEMANTIC_SEARCH and (_vector_task is None or _vector_task.done()):
+        _vector_task = asyncio.create_task(sync_vector_index())
+
+def duplicate_document(row: Dict, file_text: Optional[str] = None) -> str:
+    """Text a project's MinHash signature and content search entry are computed from"""
+    return f"{row.get('project_title') or ''}\n{row.get('abstract') or ''}\n{file_text or ''}"
+
+def _stored_text(row: Dict) -> str:
+    file_url = row.get("file_url")
+    if not file_url:
+        return ""
+    try:
+        data = get_object_store().download(file_url)
+    except Exception as e:
+        logging.info(f"No file text for project {row_key(row)}: {e}")
+        return ""
+    return extract_text(io.BytesIO(data), file_url)
+
+def _sync_document_indexes() -> Tuple[int, int]:
+    """Add the projects the duplicate and content indexes have not seen yet, downloading
+    each file at most once for both. Returns (signed, content-indexed) counts."""
+    rows, _, _ = project_index.entries()
+    signed, keys, texts, indexed = 0, [], [], 0
+    for row in rows:
+        key = row_key(row)
+        if key is None:
+            continue
+        sign = DUPLICATE_DETECTION and key not in duplicate_index
+        index = CONTENT_SEARCH and key not in content_index
+        if not (sign or index):
+            continue
+        fetch = (sign and DUPLICATE_BACKFILL_FILES) or (index and CONTENT_BACKFILL_FILES)
+        document = duplicate_document(row, _stored_text(row) if fetch else None)
+        if sign:
+            signature = duplicate_index.signature(document)
+            if signature is not None:
+                duplicate_index.add(key, signature)
+                signed += 1
+        if index:
+            keys.append(key)
+            texts.append(document)
+            if len(keys) >= CONTENT_BACKFILL_BATCH:
+                indexed += content_index.add(keys, texts)
+                keys, texts = [], []
+    indexed += content_index.add(keys, texts)
+    if DUPLICATE_DETECTION:
+        duplicate_index.save()
+    return signed, indexed
+
+async def sync_document_indexes():
+    """Top up the duplicate and content indexes from the project index"""
+    try:
+        with metrics.trace("search.sync_documents"):
+            signed, indexed = await run_blocking(_sync_document_indexes)
+        if signed:
+            logging.info(f"Duplicate index signed {signed} projects")
+        if indexed:
+            logging.info(f"Content index added {indexed} projects")
+    except Exception as e:
+        logging.exception(f"Document index sync failed: {e}")
+
+def _start_document_sync():
+    global _document_task
+    if (DUPLICATE_DETECTION or CONTENT_SEARCH) and (_document_task is None or _document_task.done()):
+        _document_task = asyncio.create_task(sync_document_indexes())
+
+def _check_duplicates(rows: List[Dict], file_texts: Sequence[Optional[str]]) -> List[List[Dict]]:
+    found = []
+    for row, file_text in zip(rows, file_texts):
+        key = row_key(row)
+        signature = duplicate_index.signature(duplicate_document(row, file_text))
+        if key is None or signature is None:
+            found.append([])
+            continue
+        matches = []
+        for other, similarity in duplicate_index.query(signature, DUPLICATE_THRESHOLD, exclude=key):
+            project = project_index.get(other) or {"id": other}
+            matches.append({**project_fields(project, DUPLICATE_FIELDS), "similarity": round(similarity, 3)})
+        duplicate_index.add(key, signature)
+        found.append(matches)
+    return found
+
+async def index_project(row: Dict, file_text: Optional[str] = None) -> List[Dict]:
+    """Make a freshly inserted project searchable in every mode without a database round trip.
+
+    Returns the earlier projects it likely duplicates (see index_projects).
+    """
+    return (await index_projects([row], [file_text]))[0]
+
+async def index_projects(rows: List[Dict], file_texts: Optional[Sequence[Optional[str]]] = None) -> List[List[Dict]]:
+    """index_project() for a batch of inserted rows, embedded in one call.
+
+    Returns, per row, the indexed projects whose estimated similarity to its title,
+    abstract and file text is at least DUPLICATE_THRESHOLD, best first.
+    """
+    project_index.add_many(rows)
+    file_texts = file_texts or [None] * len(rows)
+    keyed = [row for row in rows if row_key(row) is not None]
+    if vector_index.ready and keyed:
+        await run_blocking(vector_index.add, keyed, [row_key(row) for row in keyed])
+    if CONTENT_SEARCH and keyed:
+        documents = [duplicate_document(row, text) for row, text in zip(rows, file_texts) if row_key(row) is not None]
+        with metrics.trace("search.index_content", rows=len(keyed)):
+            await run_blocking(content_index.add, [row_key(row) for row in keyed], documents)
+    if not DUPLICATE_DETECTION:
+        return [[] for _ in rows]
+    with metrics.trace("search.check_duplicates", rows=len(rows)):
+        return await run_blocking(_check_duplicates, rows, file_texts)
+
+async def duplicate_clusters(threshold: Optional[float] = None, limit: int = 50) -> List[Dict]:
+    """Groups of likely duplicate projects, largest first, each {"similarity", "projects"}"""
+    with metrics.trace("search.duplicate_clusters", rows=len(duplicate_index)):
+        clusters = await run_blocking(duplicate_index.clusters,
+                                      DUPLICATE_THRESHOLD if threshold is None else threshold)
+    return [
+        {
+            "similarity": cluster["similarity"],
+            "projects": [project_fields(project_index.get(key) or {"id": key}, DUPLICATE_FIELDS)
+                         for key in cluster["keys"]],
+        }
+        for cluster in clusters[:limit]
+    ]
+
+async def _refresh_project_index_forever(interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            added = await run_blocking(project_index.refresh, get_supabase_client())
+            if added:
+                logging.info(f"Search index picked up {added} new projects")
+            if added or not vector_index.ready:
+                _start_vector_sync()
+            if added:
+                _start_document_sync()
+            elif duplicate_index.dirty:
+                await run_blocking(duplicate_index.save)
+        except Exception as e:
+            logging.exception(f"Search index refresh failed: {e}")
+
+async def start_search_index():
+    """Load the index and start the periodic delta refresh (called from the app lifespan)"""
+    global _refresh_task
+    try:
+        count = await load_project_index()
+        logging.info(f"Search index loaded {count} projects")
+    except Exception as e:
+        # Searches retry the load lazily; don't keep the API from starting
+        logging.exception(f"Search index initial load failed: {e}")
+    # Built in the background: until it is ready, semantic searches fall back to fuzzy ranking
+    _start_vector_sync()
+    if DUPLICATE_DETECTION:
+        if await run_blocking(duplicate_index.open):
+            logging.info(f"Duplicate index reopened with {len(duplicate_index)} projects")
+    if CONTENT_SEARCH:
+        count = await run_blocking(content_index.open)
+        if count:
+            logging.info(f"Content index reopened with {count} projects")
+    _start_document_sync()
+    if SEARCH_INDEX_REFRESH_SECONDS > 0:
+        _refresh_task = asyncio.create_task(_refresh_project_index_forever(SEARCH_INDEX_REFRESH_SECONDS))
+
+async def stop_search_index():
+    global _refresh_task, _vector_task, _document_task
+    for task in (_refresh_task, _vector_task, _document_task):
+        if task:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+    _refresh_task = _vector_task = _document_task = None
+    if DUPLICATE_DETECTION:
+        await run_blocking(duplicate_index.save)
+
+def semantic_matches(query: str, weight: float = 1.0, limit: Optional[int] = None) -> List[Tuple[float, Dict]]:
+    """Rank the vector index's nearest neighbours by weight * cosine + (1 - weight) * fuzzy score.
+
+    Both parts are on a 0-100 scale. Only the ANN candidates are scored, so the cost
+    does not grow with the corpus the way a full fuzzy scan does.
+    """
+    hits = vector_index.search(query, max(SEMANTIC_CANDIDATES, limit or 0))
+    rows, similarities = [], []
+    for key, similarity in hits:
+        row = project_index.get(key)
+        if row is not None:
+            rows.append(row)
+            similarities.append(similarity * 100)
+    fuzzy = {}
+    if weight < 1 and rows:
+        fuzzy = {id(row): score for score, row in rank_rows(query, rows, threshold=0)}
+    scored = [
+        (weight * similarity + (1 - weight) * fuzzy.get(id(row), 0), row)
+        for similarity, row in zip(similarities, rows)
+    ]
+    matches = sorted((match for match in scored if match[0] >= SEMANTIC_MIN_SCORE), key=lambda match: -match[0])
+    return matches[:limit] if limit is not None else matches
+
+def content_matches(query: str, limit: Optional[int] = None) -> List[Tuple[float, Dict]]:
+    """Projects whose title, abstract or file text contain the query terms, by BM25 score"""
+    matches = []
+    for key, score in content_index.search(query, limit or MAX_CONTENT_RESULTS):
+        row = project_index.get(key)
+        if row is not None:
+            matches.append((round(score, 3), row))
+    return matches
+
+def add_snippets(query: str, results: List[Dict]) -> List[Dict]:
+    """Content-mode results with a highlighted "snippet" of the text that matched"""
+    return [{**project, "snippet": content_index.snippet(row_key(project), query)} for project in results]
+
+def served_mode(mode: Optional[str]) -> str:
+    """The mode a search in `mode` is answered with: semantic and hybrid fall back to
+    "index" until the vector index is ready. Raises ValueError for unknown or disabled modes."""
+    mode = mode or SEARCH_MODE
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode '{mode}', expected one of {', '.join(SEARCH_MODES)}")
+    if mode in ("semantic", "hybrid") and not vector_index.ready:
+        if not SEMANTIC_SEARCH:
+            raise ValueError("Semantic search is disabled (SEMANTIC_SEARCH=false)")
+        _start_vector_sync()
+        return "index"
+    if mode == "content" and not CONTENT_SEARCH:
+        raise ValueError("Content search is disabled (CONTENT_SEARCH=false)")
+    return mode
+
+async def search_projects(query: str, threshold: int = 60, limit: Optional[int] = None,
+                          mode: Optional[str] = None, semantic_weight: Optional[float] = None) -> List[Dict]:
+    """Search projects using RapidFuzz token_sort_ratio, or embeddings in the semantic modes.
+
+    threshold applies to fuzzy scores; semantic and hybrid scores are cut at
+    SEMANTIC_MIN_SCORE instead, and content scores (BM25, unbounded) are not cut.
+    """
+    mode = served_mode(mode)
+    if mode == "content":
+        with metrics.trace("search.rank", mode=mode, rows=len(content_index)):
+            matches = await run_blocking(content_matches, query, limit)
+    elif mode in ("semantic", "hybrid"):
+        weight = 1.0 if mode == "semantic" else SEMANTIC_WEIGHT if semantic_weight is None else semantic_weight
+        with metrics.trace("search.rank", mode=mode, rows=len(vector_index)):
+            matches = await run_blocking(semantic_matches, query, weight, limit)
+    elif mode == "database":
+        candidates = await fetch_search_candidates(query)
+        with metrics.trace("search.rank", mode=mode, rows=len(candidates)):
+            matches = rank_rows(query, candidates, threshold, limit)
+    else:
+        if not project_index.loaded:
+            await load_project_index()
+        # Title and abstract are scored in one batched pass; the higher score wins
+        with metrics.trace("search.rank", mode=mode, rows=len(project_index)):
+            matches = project_index.top_matches(query, threshold, limit)
+    return [{**project, 'similarity_score': score} for score, project in matches]
+
+async def search_projects_page(query: str, limit: int = 50, cursor: Optional[str] = None,
+                               fields: Optional[Sequence[str]] = None, mode: Optional[str] = None,
+                               threshold: int = 60, semantic_weight: Optional[float] = None) -> Tuple[List[Dict], Optional[str]]:
+    """One page of ranked results plus the cursor for the next page (None on the last page)"""
+    requested = mode or SEARCH_MODE
+    offset = 0
+    if cursor:
+        state = decode_cursor(cursor)
+        # Later pages keep the ordering of the first one: a search that fell back to "index"
+        # stays there even once the vector index is ready
+        mode = state.get("mode")
+        if mode not in (requested, "index"):
+            raise ValueError("Cursor does not belong to this search")
+        mode = served_mode(mode)
+        if state.get("q") != fingerprint(query, requested, mode, threshold, semantic_weight):
+            raise ValueError("Cursor does not belong to this search")
+        offset = int(state.get("offset", 0))
+    else:
+        mode = served_mode(requested)
+    request_key = fingerprint(query, requested, mode, threshold, semantic_weight)
+
+    # Only rank as deep as this page (plus one row to know whether another page exists)
+    results = await search_projects(query, threshold, limit=offset + limit + 1, mode=mode,
+                                    semantic_weight=semantic_weight)
+    page = results[offset:offset + limit]
+    if mode == "content":
+        # Only the rows on this page need their text read back
+        with metrics.trace("search.snippets", rows=len(page)):
+            page = await run_blocking(add_snippets, query, page)
+    next_cursor = None
+    if len(results) > offset + limit:
+        next_cursor = encode_cursor({"q": request_key, "mode": mode, "offset": offset + limit})
+    fields = DEFAULT_SEARCH_FIELDS if fields is None else fields
+    return [project_fields(project, fields) for project in page], next_cursor
+
+async def fetch_search_candidates(query: str, max_candidates: int = SEARCH_DB_CANDIDATES) -> List[Dict]:
+    """Top trigram-similar projects from Postgres, so only max_candidates rows cross the network"""
+    supabase = get_supabase_client()
+    response = await run_blocking(
+        lambda: supabase.rpc("search_project_candidates", {
+            "query": query,
+            "max_candidates": max_candidates,
+            "min_similarity": SEARCH_DB_MIN_SIMILARITY,
+        }).execute()
+    )
+    return response.data or []
 
 async def add_sample_projects():
     """Add sample projects to database for testing"""
@@ -73,7 +439,7 @@ async def add_sample_projects():
     ]
     
     try:
-        supabase.table("projects").insert(sample_projects).execute()
+        await run_blocking(supabase.table("projects").insert(sample_projects).execute)
         print("Sample projects added successfully")
     except Exception as e:
         print(f"Error adding sample projects: {e}")
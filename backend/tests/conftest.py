@@ -0,0 +1,45 @@
+import io
+import os
+import sys
+
+import pytest
+
+# Tests import the backend modules the way main.py does (from the backend directory)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeBucket:
+    """Accepts the same file arguments as storage3's upload()"""
+
+    def __init__(self):
+        self.objects = {}
+
+    def upload(self, path, file, file_options=None):
+        if isinstance(file, (io.BufferedReader, io.FileIO)):
+            body = file.read()
+        elif isinstance(file, bytes):
+            body = file
+        else:
+            with open(file, "rb") as f:
+                body = f.read()
+        self.objects[path] = (body, file_options["content-type"])
+        return type("UploadResponse", (), {"path": path, "full_path": f"bucket/{path}"})()
+
+
+class FakeClient:
+    def __init__(self, bucket):
+        self.storage = self
+        self.bucket = bucket
+
+    def from_(self, name):
+        return self.bucket
+
+
+@pytest.fixture
+def supabase_bucket(monkeypatch):
+    """Stands in for the Supabase Storage bucket behind SupabaseObjectStore"""
+    from utils import storage
+
+    bucket = FakeBucket()
+    monkeypatch.setattr(storage, "get_supabase_client", lambda: FakeClient(bucket))
+    return bucket
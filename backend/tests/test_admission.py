@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+
+from utils.admission import AdmissionControl, ConcurrencyLimiter, Overloaded, RateLimiter
+
+
+def test_rate_limiter_allows_burst_then_limits():
+    limiter = RateLimiter(rate=1, burst=3)
+    assert [limiter.acquire("user") for _ in range(3)] == [0, 0, 0]
+    wait = limiter.acquire("user")
+    assert 0 < wait <= 1
+    assert limiter.acquire("someone-else") == 0
+
+
+def test_release_hands_slot_to_oldest_waiter():
+    async def scenario():
+        limiter = ConcurrencyLimiter("test", limit=1, queue_size=4, max_wait=5)
+        held = await limiter.acquire()
+        order = []
+
+        async def wait(name):
+            acquired = await limiter.acquire()
+            order.append(name)
+            limiter.release(acquired)
+
+        waiters = [asyncio.create_task(wait(name)) for name in ("first", "second")]
+        await asyncio.sleep(0.01)
+        assert limiter.stats()["queued"] == 2
+        limiter.release(held)
+        await asyncio.gather(*waiters)
+        return order, limiter.stats()
+
+    order, stats = asyncio.run(scenario())
+    assert order == ["first", "second"]
+    assert stats["active"] == 0 and stats["queued"] == 0
+
+
+def test_full_queue_is_rejected_with_retry_after():
+    async def scenario():
+        limiter = ConcurrencyLimiter("test", limit=1, queue_size=1, max_wait=5)
+        held = await limiter.acquire()
+        queued = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0.01)
+        with pytest.raises(Overloaded) as rejected:
+            await limiter.acquire()
+        limiter.release(held)
+        limiter.release(await queued)
+        return rejected.value, limiter.stats()
+
+    rejected, stats = asyncio.run(scenario())
+    assert rejected.reason == "queue_full" and rejected.retry_after >= 1
+    assert stats["active"] == 0
+
+
+def test_queue_timeout_gives_up():
+    async def scenario():
+        limiter = ConcurrencyLimiter("test", limit=1, queue_size=1, max_wait=0.05)
+        held = await limiter.acquire()
+        with pytest.raises(Overloaded) as rejected:
+            await limiter.acquire()
+        limiter.release(held)
+        return rejected.value, limiter.stats()
+
+    rejected, stats = asyncio.run(scenario())
+    assert rejected.reason == "queue_timeout"
+    assert stats["active"] == 0 and stats["queued"] == 0 and stats["timed_out"] == 1
+
+
+def test_cancelled_waiter_leaves_queue_without_leaking_a_slot():
+    async def scenario():
+        limiter = ConcurrencyLimiter("test", limit=1, queue_size=2, max_wait=5)
+        held = await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        queued = limiter.stats()["queued"]
+        limiter.release(held)
+        return queued, limiter.stats()
+
+    queued, stats = asyncio.run(scenario())
+    assert queued == 0
+    assert stats["active"] == 0
+
+
+def test_ticket_release_is_idempotent_and_transfer_moves_the_slot():
+    async def scenario():
+        control = AdmissionControl("test", rate=0, burst=1, limit=1, queue_size=0, max_wait=1)
+        ticket = await control.admit("user")
+        moved = ticket.transfer()
+        ticket.release()
+        active_after_original = control.stats()["concurrency"]["active"]
+        moved.release()
+        moved.release()
+        return active_after_original, control.stats()["concurrency"]["active"]
+
+    assert asyncio.run(scenario()) == (1, 0)
+
+
+def test_invalid_ai_request_body_releases_its_slot():
+    pytest.importorskip("fastapi")
+    pytest.importorskip("supabase")
+    pytest.importorskip("dotenv")
+    from fastapi.testclient import TestClient
+
+    import main
+
+    main.app.dependency_overrides[main.get_current_user] = lambda: {"id": "student-1", "role": "student"}
+    try:
+        client = TestClient(main.app)
+        for _ in range(3):
+            response = client.post("/api/ai/suggestions", json={"not_a_query": 1})
+            assert response.status_code == 422
+        assert main.ai_admission.stats()["concurrency"]["active"] == 0
+    finally:
+        main.app.dependency_overrides.clear()
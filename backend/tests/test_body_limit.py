@@ -0,0 +1,57 @@
+import asyncio
+
+from utils.body_limit import BodySizeLimitMiddleware
+
+
+async def _echo_length(scope, receive, send):
+    # Reads the whole body like a form parser; a disconnect ends it with a 400
+    size = 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            await send({"type": "http.response.start", "status": 400, "headers": []})
+            await send({"type": "http.response.body", "body": b"disconnected"})
+            return
+        size += len(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": str(size).encode()})
+
+
+def _call(app, path, chunks, content_length=None):
+    headers = [] if content_length is None else [(b"content-length", str(content_length).encode())]
+    scope = {"type": "http", "path": path, "headers": headers}
+    incoming = [{"type": "http.request", "body": chunk, "more_body": i < len(chunks) - 1}
+                for i, chunk in enumerate(chunks)]
+    read, sent = [], []
+
+    async def receive():
+        message = incoming.pop(0)
+        read.append(message)
+        return message
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    return sent[0]["status"], b"".join(m.get("body", b"") for m in sent[1:]), len(read)
+
+
+def test_declared_length_over_limit_is_refused_without_reading():
+    app = BodySizeLimitMiddleware(_echo_length, {"/upload": 10})
+    status, _, read = _call(app, "/upload", [b"x" * 20], content_length=20)
+    assert status == 413 and read == 0
+
+
+def test_chunked_body_is_cut_off_once_past_the_limit():
+    app = BodySizeLimitMiddleware(_echo_length, {"/upload": 10})
+    status, body, read = _call(app, "/upload", [b"x" * 6, b"x" * 6, b"x" * 6])
+    assert status == 413 and b"10 byte limit" in body
+    assert read == 2
+
+
+def test_bodies_within_the_limit_and_other_paths_pass_through():
+    app = BodySizeLimitMiddleware(_echo_length, {"/upload": 10})
+    assert _call(app, "/upload", [b"x" * 4, b"x" * 6])[:2] == (200, b"10")
+    assert _call(app, "/other", [b"x" * 50], content_length=50)[:2] == (200, b"50")
@@ -0,0 +1,47 @@
+import asyncio
+
+from utils.bulk import run_bounded
+
+
+def _failed(index, e):
+    return {"row": index, "status": "failed", "error": str(e)}
+
+
+def test_every_item_yields_a_result_even_when_work_raises():
+    async def work(index):
+        await asyncio.sleep(0.001 * (index % 3))
+        if index % 4 == 0:
+            raise RuntimeError(f"boom {index}")
+        return {"row": index, "status": "created"}
+
+    async def scenario():
+        return [result async for result, _ in run_bounded(10, work, 3, _failed)]
+
+    results = asyncio.run(asyncio.wait_for(scenario(), 5))
+    assert sorted(result["row"] for result in results) == list(range(10))
+    assert {result["row"] for result in results if result["status"] == "failed"} == {0, 4, 8}
+
+
+def test_closing_early_cancels_the_workers():
+    started, cancelled = [], []
+
+    async def work(index):
+        started.append(index)
+        try:
+            if index:
+                await asyncio.sleep(10)
+            return {"row": index}
+        except asyncio.CancelledError:
+            cancelled.append(index)
+            raise
+
+    async def scenario():
+        results = run_bounded(5, work, 3, _failed)
+        first, _ = await results.__anext__()
+        await results.aclose()
+        return first
+
+    assert asyncio.run(asyncio.wait_for(scenario(), 5)) == {"row": 0}
+    # Only the bounded number of workers ever started, and everything still running was cancelled
+    assert len(started) <= 4
+    assert sorted(cancelled) == sorted(index for index in started if index)
@@ -0,0 +1,59 @@
+import hashlib
+import io
+import tempfile
+import zipfile
+
+import pytest
+
+pytest.importorskip("aiohttp")
+pytest.importorskip("supabase")
+pytest.importorskip("rapidfuzz")
+
+import bulk_upload
+from utils.storage import SupabaseObjectStore
+
+
+def _spooled(body, max_size=1024):
+    spooled = tempfile.SpooledTemporaryFile(max_size=max_size)
+    spooled.write(body)
+    spooled.seek(0)
+    return spooled
+
+
+class FakeUpload:
+    def __init__(self, filename, body):
+        self.filename = filename
+        self.file = _spooled(body)
+        self.size = len(body)
+        self.content_type = "application/pdf"
+
+
+def test_zip_members_are_stored_on_the_supabase_backend(supabase_bucket):
+    bodies = {"reports/a.pdf": b"first report " * 50, "b.txt": b"second"}
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, body in bodies.items():
+            zf.writestr(name, body)
+    _, sources = bulk_upload.read_archive(archive)
+    store = SupabaseObjectStore("bucket")
+
+    for name, body in bodies.items():
+        size, sha256, stored = bulk_upload._store(store, name, sources[name], max_bytes=10000)
+        assert (size, sha256) == (len(body), hashlib.sha256(body).hexdigest())
+        assert stored["path"] == name and supabase_bucket.objects[name][0] == body
+
+
+def test_form_parts_are_stored_on_the_supabase_backend(supabase_bucket):
+    body = b"%PDF-1.4 " * 300
+    source = bulk_upload._upload_source(FakeUpload("c.pdf", body))
+
+    size, _, stored = bulk_upload._store(SupabaseObjectStore("bucket"), "c.pdf", source, max_bytes=10000)
+
+    assert size == len(body) and supabase_bucket.objects["c.pdf"] == (body, "application/pdf")
+
+
+def test_oversized_member_is_refused_before_upload(supabase_bucket):
+    source = bulk_upload._upload_source(FakeUpload("big.pdf", b"x" * 5000))
+    with pytest.raises(ValueError):
+        bulk_upload._store(SupabaseObjectStore("bucket"), "big.pdf", source, max_bytes=1000)
+    assert supabase_bucket.objects == {}
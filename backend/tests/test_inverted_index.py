@@ -0,0 +1,102 @@
+import os
+import random
+import threading
+
+from utils.inverted_index import ContentIndex
+
+WORDS = "neural network graph database blockchain voting secure classifier image mobile sensor arduino".split()
+
+
+def _texts(count, seed):
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(50)) for _ in range(count)]
+
+
+def test_merges_keep_every_live_document_searchable(tmp_path):
+    index = ContentIndex(str(tmp_path), max_segments=3, merge_factor=2)
+    for batch in range(8):
+        index.add(list(range(batch * 10, batch * 10 + 10)), _texts(10, batch))
+    index.add([7], ["Quantum teleportation of entangled photons"])
+
+    stats = index.stats()
+    assert stats["merges"] > 0 and stats["segments"] <= 3
+    assert len(index) == 80 and sum(stats["segment_documents"]) >= 80
+    assert index.search("quantum teleportation", 5)[0][0] == 7
+    # The replaced copy of 7 no longer matches its old words on its own
+    assert all(key != 7 for key, _ in index.search(" ".join(WORDS), 100))
+    assert len([name for name in os.listdir(tmp_path) if name.startswith("seg-")]) == stats["segments"]
+
+
+def test_reopen_finds_the_same_documents(tmp_path):
+    index = ContentIndex(str(tmp_path), max_segments=2, merge_factor=2)
+    for batch in range(5):
+        index.add([f"p{batch}-{i}" for i in range(5)], _texts(5, batch))
+    index.add(["p0-0"], ["replacement text about warehouse robots"])
+    before = index.search("warehouse robots", 3)
+
+    reopened = ContentIndex(str(tmp_path))
+    assert reopened.open() == 25
+    assert reopened.search("warehouse robots", 3) == before
+    assert before[0][0] == "p0-0"
+
+
+def test_running_totals_follow_adds_replacements_and_merges(tmp_path):
+    index = ContentIndex(str(tmp_path), max_segments=2, merge_factor=2)
+    texts = {}
+    rng = random.Random(3)
+    for batch in range(6):
+        keys = rng.sample(range(30), 8)  # overlapping batches replace earlier copies
+        batch_texts = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 40))) for _ in keys]
+        index.add(keys, batch_texts)
+        texts.update(zip(keys, batch_texts))
+        assert len(index) == len(texts)
+        assert index._total_length == sum(len(text.split()) for text in texts.values())
+    assert index.merges > 0
+
+    reopened = ContentIndex(str(tmp_path))
+    reopened.open()
+    assert reopened._total_length == index._total_length
+    assert reopened.search("sensor arduino", 10) == index.search("sensor arduino", 10)
+
+
+def test_bm25_prefers_documents_with_more_matches(tmp_path):
+    index = ContentIndex(str(tmp_path))
+    index.add([1, 2, 3], ["solar panel wind power", "solar solar panel power", "wind turbine blade power"])
+    ranked = [key for key, _ in index.search("solar", 10)]
+    assert ranked == [2, 1]
+
+
+def test_snippet_highlights_terms_and_escapes_html(tmp_path):
+    index = ContentIndex(str(tmp_path))
+    index.add([1], ["Intro text. The <b>robot</b> arm & a gripper pick parcels in the warehouse."])
+    snippet = index.snippet(1, "robot warehouse")
+    assert "<mark>robot</mark>" in snippet and "<mark>warehouse</mark>" in snippet
+    assert "&lt;b&gt;" in snippet and "&amp;" in snippet
+    assert index.snippet(99, "robot") is None
+
+
+def test_snippets_survive_concurrent_merges(tmp_path):
+    index = ContentIndex(str(tmp_path), max_segments=2, merge_factor=2)
+    index.add(list(range(20)), _texts(20, 0))
+    errors, done = [], threading.Event()
+
+    def read():
+        while not done.is_set():
+            try:
+                for key in range(20):
+                    index.snippet(key, "graph database")
+                index.search("sensor network", 10)
+            except Exception as e:  # pragma: no cover - reported below
+                errors.append(e)
+                return
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for reader in readers:
+        reader.start()
+    for batch in range(1, 30):
+        index.add([batch % 20], _texts(1, batch))
+    done.set()
+    for reader in readers:
+        reader.join()
+    assert not errors
+    assert index.stats()["merges"] > 0 and len(index) == 20
@@ -0,0 +1,114 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+from utils.job_queue import JobQueue
+
+
+async def _wait_for(queue, job_id, statuses=("succeeded", "failed"), timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = await queue.get(job_id)
+        if job["status"] in statuses:
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"job {job_id} still {job['status']}")
+
+
+def test_failed_attempt_is_retried_until_it_succeeds():
+    calls = []
+
+    async def flaky(payload):
+        calls.append(payload)
+        if len(calls) == 1:
+            raise RuntimeError("temporary")
+        return {"doubled": payload["n"] * 2}
+
+    async def scenario():
+        queue = JobQueue(workers=1, max_attempts=3, backoff=0.01)
+        queue.register("flaky", flaky)
+        await queue.start()
+        try:
+            job = await queue.enqueue("flaky", {"n": 21})
+            return queue, await _wait_for(queue, job["id"])
+        finally:
+            await queue.stop()
+
+    queue, job = asyncio.run(scenario())
+    assert job["status"] == "succeeded" and job["result"] == {"doubled": 42}
+    assert job["attempts"] == 2 and job["error"] is None
+    assert queue.retried == 1 and queue.completed == 1 and len(calls) == 2
+
+
+def test_job_fails_after_max_attempts():
+    calls = []
+
+    async def broken(payload):
+        calls.append(payload)
+        raise RuntimeError("always")
+
+    async def scenario():
+        queue = JobQueue(workers=2, max_attempts=3, backoff=0.01)
+        queue.register("broken", broken)
+        await queue.start()
+        try:
+            job = await queue.enqueue("broken", {})
+            return queue, await _wait_for(queue, job["id"])
+        finally:
+            await queue.stop()
+
+    queue, job = asyncio.run(scenario())
+    assert job["status"] == "failed" and job["error"] == "always"
+    assert job["attempts"] == 3 and len(calls) == 3 and queue.retried == 2
+
+
+def test_interrupted_job_runs_again_after_restart(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+
+    async def done(payload):
+        return payload["n"]
+
+    async def first_process():
+        queue = JobQueue(path=path, workers=1)
+        queue.register("work", done)
+        job = await queue.enqueue("work", {"n": 7})
+        queue.close()
+        return job["id"]
+
+    job_id = asyncio.run(first_process())
+    # As if the process died while the job was running
+    with sqlite3.connect(path) as db:
+        db.execute("update jobs set status = 'running', attempts = 1 where id = ?", (job_id,))
+
+    async def second_process():
+        queue = JobQueue(path=path, workers=1)
+        queue.register("work", done)
+        await queue.start()
+        try:
+            return await _wait_for(queue, job_id)
+        finally:
+            await queue.stop()
+            queue.close()
+
+    job = asyncio.run(second_process())
+    assert job["status"] == "succeeded" and job["result"] == 7 and job["attempts"] == 2
+
+
+def test_recent_filters_by_owner_and_unknown_kinds_are_refused():
+    async def noop(payload):
+        return None
+
+    async def scenario():
+        queue = JobQueue(workers=1)
+        queue.register("noop", noop)
+        for owner in ("alice", "bob", "alice"):
+            await queue.enqueue("noop", {}, owner=owner)
+        with pytest.raises(ValueError):
+            await queue.enqueue("missing", {})
+        return await queue.recent(owner="alice"), await queue.recent(status="queued")
+
+    mine, queued = asyncio.run(scenario())
+    assert len(mine) == 2 and all(job["owner"] == "alice" for job in mine)
+    assert len(queued) == 3
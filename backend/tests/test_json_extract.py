@@ -0,0 +1,50 @@
+import json
+
+from utils.json_extract import JSONStreamExtractor, extract_items
+
+
+def _streamed(text, size, validate=None):
+    extractor = JSONStreamExtractor(validate)
+    items = []
+    for start in range(0, len(text), size):
+        items.extend(extractor.feed(text[start:start + size]))
+    return items, extractor
+
+
+def test_fenced_block_after_prose():
+    text = 'Sure! Here are the ideas:\n```json\n[{"title": "A"}, {"title": "B"}]\n```\nHope that helps.'
+    assert extract_items(text) == [{"title": "A"}, {"title": "B"}]
+
+
+def test_brackets_in_surrounding_prose_are_skipped():
+    text = 'Step [1] of the plan (see [notes]) gives:\n[{"title": "Real", "tags": ["x"]}]\nand {not json}.'
+    validate = lambda item: item if isinstance(item, dict) and "title" in item else None
+    extractor = JSONStreamExtractor(validate)
+    assert extractor.feed(text) == [{"title": "Real", "tags": ["x"]}]
+    assert extractor.done and extractor.errors == 1  # "[notes]" is not valid JSON
+
+
+def test_escaped_quotes_split_across_chunks():
+    items = [{"title": 'He said "hi" \\ bye', "description": "a [bracket] and {brace}"},
+             {"title": "Second"}]
+    text = "Result: " + json.dumps(items)
+    for size in (1, 2, 3, 7):
+        assert _streamed(text, size)[0] == items
+
+
+def test_nested_lists_of_objects_stream_one_item_at_a_time():
+    items = [{"title": f"Idea {i}", "key_features": [{"name": "f", "steps": [1, 2]}, {"name": "g"}]}
+             for i in range(3)]
+    text = json.dumps(items)
+    extractor = JSONStreamExtractor()
+    first_close = text.index("}]}") + 3  # end of the first top-level element
+    assert extractor.feed(text[:first_close]) == []
+    assert extractor.feed(text[first_close:first_close + 1]) == [items[0]]
+    assert extractor.feed(text[first_close + 1:]) == items[1:]
+
+
+def test_object_wrapping_a_list_yields_the_list_elements():
+    text = '{"ideas": [{"title": "A"}, {"title": "B"}], "note": "done"}'
+    validate = lambda item: item if "title" in item else None
+    assert _streamed(text, 5, validate)[0] == [{"title": "A"}, {"title": "B"}]
+    assert extract_items('{"title": "Only"}', validate) == [{"title": "Only"}]
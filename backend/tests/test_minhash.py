@@ -0,0 +1,76 @@
+import random
+
+from utils.minhash import MinHashLSH, shingles
+
+VOCABULARY = [f"word{i}" for i in range(2000)]
+
+
+def _text(seed, words=300):
+    rng = random.Random(seed)
+    return " ".join(rng.choice(VOCABULARY) for _ in range(words))
+
+
+def _edited(text, fraction, seed):
+    rng = random.Random(seed)
+    words = text.split()
+    for i in rng.sample(range(len(words)), int(len(words) * fraction)):
+        words[i] = rng.choice(VOCABULARY)
+    return " ".join(words)
+
+
+def test_shingles_are_order_sensitive_word_grams():
+    assert len(shingles("a b c d")) == 2
+    assert len(shingles("a b")) == 2  # shorter than a shingle: the words themselves
+    assert not len(shingles(""))
+    assert set(shingles("x y z")) != set(shingles("z y x"))
+
+
+def test_near_duplicates_are_found_and_unrelated_texts_are_not(tmp_path):
+    index = MinHashLSH(str(tmp_path))
+    originals = {f"p{i}": _text(i) for i in range(50)}
+    for key, text in originals.items():
+        index.add(key, index.signature(text))
+
+    copy = index.signature(_edited(originals["p7"], 0.02, seed=1))
+    matches = index.query(copy, threshold=0.6)
+    assert matches[0][0] == "p7" and matches[0][1] >= 0.6
+    assert all(key == "p7" for key, _ in matches)
+    assert index.query(index.signature(_text(999)), threshold=0.3) == []
+    assert index.query(index.signature(originals["p3"]), threshold=0.6, exclude="p3") == []
+
+
+def test_clusters_group_copies_together(tmp_path):
+    index = MinHashLSH(str(tmp_path))
+    base_a, base_b = _text(1), _text(2)
+    documents = {"a": base_a, "a-copy": _edited(base_a, 0.02, 5), "a-copy2": _edited(base_a, 0.03, 6),
+                 "b": base_b, "b-copy": _edited(base_b, 0.02, 7), "alone": _text(3)}
+    for key, text in documents.items():
+        index.add(key, index.signature(text))
+
+    clusters = index.clusters(threshold=0.6)
+    assert [sorted(cluster["keys"]) for cluster in clusters] == [["a", "a-copy", "a-copy2"], ["b", "b-copy"]]
+    assert all(cluster["similarity"] >= 0.6 for cluster in clusters)
+
+
+def test_readding_a_key_replaces_its_buckets(tmp_path):
+    index = MinHashLSH(str(tmp_path))
+    first, second = _text(10), _text(11)
+    index.add("x", index.signature(first))
+    index.add("x", index.signature(second))
+    assert len(index) == 1
+    assert index.query(index.signature(first), threshold=0.5) == []
+    assert index.query(index.signature(second), threshold=0.5)[0][0] == "x"
+
+
+def test_save_and_open_round_trip(tmp_path):
+    index = MinHashLSH(str(tmp_path))
+    for i in range(20):
+        index.add(i, index.signature(_text(i)))
+    assert index.dirty
+    index.save()
+    assert not index.dirty
+
+    reopened = MinHashLSH(str(tmp_path))
+    assert reopened.open() and len(reopened) == 20
+    assert reopened.query(reopened.signature(_text(4)), threshold=0.9)[0] == (4, 1.0)
+    assert not MinHashLSH(str(tmp_path), num_perm=64, bands=8).open()
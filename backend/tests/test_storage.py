@@ -0,0 +1,29 @@
+import tempfile
+
+import pytest
+
+pytest.importorskip("aiohttp")
+pytest.importorskip("supabase")
+
+from utils import storage
+
+
+@pytest.mark.parametrize("max_size", [1024, 16])  # kept in memory / rolled over to disk
+def test_supabase_upload_accepts_a_spooled_file(supabase_bucket, max_size):
+    body = b"project report " * 10
+    spooled = tempfile.SpooledTemporaryFile(max_size=max_size)
+    spooled.write(body)
+    spooled.seek(0)
+
+    stored = storage.SupabaseObjectStore("bucket").upload_file("a.pdf", spooled, None)
+
+    assert stored == {"path": "a.pdf", "full_path": "bucket/a.pdf"}
+    assert supabase_bucket.objects["a.pdf"] == (body, "application/octet-stream")
+
+
+def test_supabase_upload_streams_an_open_file_as_is(supabase_bucket, tmp_path):
+    path = tmp_path / "b.txt"
+    path.write_bytes(b"hello")
+    with open(path, "rb") as f:
+        assert storage.SupabaseObjectStore("bucket").upload_file("b.txt", f, "text/plain")["path"] == "b.txt"
+    assert supabase_bucket.objects["b.txt"] == (b"hello", "text/plain")
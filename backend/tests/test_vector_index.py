@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from utils import vector_index as vector_module
+from utils.vector_index import VectorIndex
+
+TOPICS = {
+    "vision": "image classifier convolutional network camera pixels",
+    "ledger": "blockchain ledger smart contract voting tokens",
+    "garden": "soil moisture sensor irrigation arduino garden",
+    "market": "ecommerce shopping cart payment checkout store",
+}
+
+
+def _rows(count):
+    rng = np.random.default_rng(3)
+    names = sorted(TOPICS)
+    rows = []
+    for i in range(count):
+        topic = names[i % len(names)]
+        words = TOPICS[topic].split()
+        abstract = " ".join(rng.choice(words, size=12))
+        rows.append({"id": i, "project_title": f"{topic} project {i}", "abstract": abstract, "topic": topic})
+    return rows
+
+
+@pytest.fixture
+def clustered(monkeypatch):
+    # Small corpora are normally scanned as one list; force a real IVF split
+    monkeypatch.setattr(vector_module, "EXACT_SCAN_ROWS", 50)
+
+
+def test_ivf_search_finds_the_topic_and_matches_exact_scan(tmp_path, clustered):
+    rows = _rows(400)
+    index = VectorIndex(str(tmp_path), dims=16, nprobe=4)
+    assert index.build(rows, [row["id"] for row in rows]) == 400
+    assert index.stats()["lists"] > 1
+
+    by_id = {row["id"]: row for row in rows}
+    hits = index.search("blockchain voting ledger", k=20)
+    assert hits and all(by_id[key]["topic"] == "ledger" for key, _ in hits[:10])
+    exact = index.search("blockchain voting ledger", k=20, nprobe=len(index._centroids))
+    assert [key for key, _ in hits[:5]] == [key for key, _ in exact[:5]]
+
+
+def test_added_rows_are_searchable_and_replace_older_embeddings(tmp_path, clustered):
+    rows = _rows(200)
+    index = VectorIndex(str(tmp_path), dims=16)
+    index.build(rows, [row["id"] for row in rows])
+
+    extra = {"id": 1000, "project_title": "irrigation garden", "abstract": "soil moisture sensor arduino"}
+    assert index.add([extra], [1000]) == 1
+    garden = lambda: dict(index.search("soil moisture irrigation", k=500))
+    market = lambda: dict(index.search("ecommerce checkout payment", k=500))
+    assert garden()[1000] > market().get(1000, 0) + 0.3
+
+    moved = {**extra, "project_title": "payment store", "abstract": "ecommerce checkout cart"}
+    index.add([moved], [1000])
+    assert len(index) == 201
+    assert market()[1000] > garden().get(1000, 0) + 0.3
+
+
+def test_reopen_serves_the_published_build(tmp_path, clustered):
+    rows = _rows(300)
+    index = VectorIndex(str(tmp_path), dims=16)
+    index.build(rows, [row["id"] for row in rows])
+    before = index.search("image classifier camera", k=10)
+
+    reopened = VectorIndex(str(tmp_path), dims=16)
+    assert reopened.open()
+    assert [key for key, _ in reopened.search("image classifier camera", k=10)] == [key for key, _ in before]
+    # Another embedder configuration must not reuse the build
+    assert not VectorIndex(str(tmp_path), dims=32).open()
+
+
+def test_sync_only_embeds_unseen_rows(tmp_path):
+    rows = _rows(100)
+    index = VectorIndex(str(tmp_path), dims=16)
+    assert index.sync(rows, [row["id"] for row in rows]) == 100
+    more = rows + [{"id": 500, "project_title": "market", "abstract": "store payment"}]
+    assert index.sync(more, [row["id"] for row in more]) == 1
+    assert index.stats()["tail_rows"] == 1
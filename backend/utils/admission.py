@@ -0,0 +1,195 @@
+# utils/admission.py
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Hashable, Optional, Tuple
+
+from utils import metrics
+
+admission_wait = metrics.registry.register(metrics.Histogram(
+    "admission_wait_seconds", "Time admitted requests waited for a concurrency slot", ("pool",)))
+admission_rejected = metrics.registry.register(metrics.Counter(
+    "admission_rejected", "Requests turned away before any work was started", ("pool", "reason")))
+
+
+class Overloaded(Exception):
+    """Raised instead of admitting a request; retry_after is a hint in seconds."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"Too many requests ({reason}), retry in {math.ceil(retry_after)}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    """Token buckets per key: `rate` requests per second on average, bursts of up to `burst`.
+
+    Buckets are refilled lazily when a key is seen. Only the most recently used
+    max_keys buckets are kept; an evicted key starts again with a full bucket.
+    """
+
+    def __init__(self, rate: float, burst: float, max_keys: int = 100000):
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[Hashable, Tuple[float, float]]" = OrderedDict()
+        self.allowed = 0
+        self.limited = 0
+
+    def acquire(self, key: Hashable, cost: float = 1.0) -> float:
+        """Take cost tokens from key's bucket. Returns 0 when allowed, otherwise the seconds
+        until enough tokens will be there (and takes nothing)."""
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        wait = 0.0
+        if tokens >= cost:
+            tokens -= cost
+            self.allowed += 1
+        else:
+            wait = (cost - tokens) / self.rate if self.rate > 0 else math.inf
+            self.limited += 1
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+    def stats(self) -> Dict:
+        return {"rate_per_second": self.rate, "burst": self.burst, "keys": len(self._buckets),
+                "allowed": self.allowed, "limited": self.limited}
+
+
+class ConcurrencyLimiter:
+    """At most `limit` requests run at once; up to `queue_size` more wait for a slot in FIFO order.
+
+    Requests beyond that are refused straight away rather than queued, and so are
+    requests whose expected wait (queue length over the observed service rate) is
+    longer than max_wait: waiting would only make them slow, not successful. A
+    request that does get queued gives up after max_wait. This bounds how long an
+    admitted request can spend waiting however much traffic arrives.
+    """
+
+    def __init__(self, name: str, limit: int, queue_size: int, max_wait: float):
+        self.name = name
+        self.limit = max(1, limit)
+        self.queue_size = queue_size
+        self.max_wait = max_wait
+        self._active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._service_time: Optional[float] = None  # moving average of slot hold times
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def _expected_wait(self, position: int) -> float:
+        return (self._service_time or 0.0) * (position + 1) / self.limit
+
+    def _reject(self, reason: str, retry_after: float) -> Overloaded:
+        self.rejected += 1
+        admission_rejected.inc(pool=self.name, reason=reason)
+        return Overloaded(reason, max(1.0, retry_after))
+
+    async def acquire(self) -> float:
+        """Wait for a slot; returns the time it took. Raises Overloaded instead of queueing too long."""
+        if self._active < self.limit and not self._waiters:
+            self._active += 1
+            self.admitted += 1
+            admission_wait.observe(0.0, pool=self.name)
+            return time.monotonic()
+        expected = self._expected_wait(len(self._waiters))
+        if len(self._waiters) >= self.queue_size:
+            raise self._reject("queue_full", expected)
+        if expected > self.max_wait:
+            raise self._reject("expected_wait", expected)
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            handed_over = waiter.done() and not waiter.cancelled()
+            if not handed_over:
+                waiter.cancel()
+                self._waiters.remove(waiter)
+            if isinstance(e, asyncio.CancelledError):
+                if handed_over:
+                    self.release(None)  # the client left just as its turn came; pass the slot on
+                raise
+            if not handed_over:
+                self.timed_out += 1
+                raise self._reject("queue_timeout", self._expected_wait(len(self._waiters)))
+        self.admitted += 1
+        admission_wait.observe(time.monotonic() - started, pool=self.name)
+        return time.monotonic()
+
+    def release(self, acquired_at: Optional[float]) -> None:
+        """Give back a slot taken at acquired_at (the value acquire() returned)"""
+        if acquired_at is not None:
+            held = time.monotonic() - acquired_at
+            self._service_time = held if self._service_time is None else 0.9 * self._service_time + 0.1 * held
+        # Hand the slot straight to the oldest waiter, so a newcomer cannot overtake the queue
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._active -= 1
+
+    def stats(self) -> Dict:
+        return {
+            "active": self._active,
+            "limit": self.limit,
+            "queued": len(self._waiters),
+            "queue_size": self.queue_size,
+            "max_wait_seconds": self.max_wait,
+            "service_seconds": round(self._service_time, 3) if self._service_time is not None else None,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
+
+
+class AdmissionControl:
+    """Per-user rate limit in front of a shared concurrency limit.
+
+    admit(user) returns a Ticket holding a slot, to be released once the response
+    is complete (after the last streamed chunk for streaming responses).
+    """
+
+    def __init__(self, name: str, rate: float, burst: float, limit: int, queue_size: int, max_wait: float):
+        self.rate_limiter = RateLimiter(rate, burst) if rate > 0 else None
+        self.concurrency = ConcurrencyLimiter(name, limit, queue_size, max_wait)
+
+    async def admit(self, user: Hashable) -> "Ticket":
+        if self.rate_limiter is not None:
+            wait = self.rate_limiter.acquire(user)
+            if wait:
+                admission_rejected.inc(pool=self.concurrency.name, reason="rate_limited")
+                raise Overloaded("rate_limited", max(1.0, wait))
+        return Ticket(self.concurrency, await self.concurrency.acquire())
+
+    def stats(self) -> Dict:
+        return {
+            "rate_limit": self.rate_limiter.stats() if self.rate_limiter is not None else None,
+            "concurrency": self.concurrency.stats(),
+        }
+
+
+class Ticket:
+    """A held concurrency slot; release() is idempotent"""
+
+    def __init__(self, limiter: ConcurrencyLimiter, acquired_at: float):
+        self._limiter = limiter
+        self._acquired_at: Optional[float] = acquired_at
+
+    def transfer(self) -> "Ticket":
+        """Move the slot to a new ticket (e.g. one owned by a streaming body); releasing this one is then a no-op"""
+        ticket = Ticket(self._limiter, self._acquired_at)
+        self._acquired_at = None
+        return ticket
+
+    def release(self) -> None:
+        if self._acquired_at is not None:
+            acquired_at, self._acquired_at = self._acquired_at, None
+            self._limiter.release(acquired_at)
@@ -0,0 +1,63 @@
+# utils/body_limit.py
+import json
+from typing import Dict
+
+
+class BodySizeLimitMiddleware:
+    """ASGI middleware answering 413 for request bodies over a per-path byte limit.
+
+    Starlette reads a whole multipart body into its spooled files before a handler
+    runs, so a limit checked in the handler only applies once the upload is already
+    on disk. Here a declared Content-Length over the limit is refused before any of
+    the body is read, and a chunked body is cut off as soon as it passes the limit.
+    """
+
+    def __init__(self, app, limits: Dict[str, int]):
+        self.app = app
+        self.limits = limits
+
+    async def _reject(self, send, limit: int) -> None:
+        body = json.dumps({"detail": f"Request body exceeds the {limit} byte limit"}).encode()
+        await send({"type": "http.response.start", "status": 413,
+                    "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]})
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope.get("path")) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+        declared = dict(scope.get("headers") or []).get(b"content-length")
+        if declared is not None and declared.isdigit() and int(declared) > limit:
+            await self._reject(send, limit)
+            return
+        received = 0
+        exceeded = replaced = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Reads as a client disconnect, so body parsing stops here
+                    exceeded = True
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def limited_send(message):
+            nonlocal replaced
+            if not exceeded:
+                await send(message)
+            elif not replaced:
+                # Whatever the app answers to the cut-off body becomes the 413
+                replaced = True
+                await self._reject(send, limit)
+
+        try:
+            await self.app(scope, limited_receive, limited_send)
+        except Exception:
+            if not exceeded:
+                raise
+        if exceeded and not replaced:
+            await self._reject(send, limit)
@@ -0,0 +1,40 @@
+# utils/bulk.py
+import asyncio
+import logging
+from typing import AsyncIterator, Awaitable, Callable, Dict, Tuple
+
+
+async def run_bounded(count: int, work: Callable[[int], Awaitable[Dict]], concurrency: int,
+                      failed: Callable[[int, Exception], Dict]) -> AsyncIterator[Tuple[Dict, bool]]:
+    """Run work(0) .. work(count - 1) on at most `concurrency` worker tasks, yielding
+    (result, idle) in completion order; idle is True when no other result is waiting.
+
+    Every index produces exactly one result: an exception from work(i) becomes
+    failed(i, exception), so a worker never dies with the consumer still waiting on it.
+    The workers are cancelled and awaited when the consumer stops early (e.g. the
+    client of a streaming response went away).
+    """
+    results: asyncio.Queue = asyncio.Queue()
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index
+        while next_index < count:
+            index = next_index
+            next_index += 1
+            try:
+                result = await work(index)
+            except Exception as e:
+                logging.exception(f"Bulk item {index} failed: {e}")
+                result = failed(index, e)
+            await results.put(result)
+
+    workers = [asyncio.create_task(worker()) for _ in range(min(concurrency, count))]
+    try:
+        for _ in range(count):
+            result = await results.get()
+            yield result, results.empty()
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
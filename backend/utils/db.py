@@ -1,10 +1,8 @@
-from supabase import create_client, Client
-import os
+from supabase import Client
+from utils.supabase_client import get_anon_client
 
 def get_supabase_client() -> Client:
-    url = os.getenv("SUPABASE_URL")
-    key = os.getenv("SUPABASE_ANON_KEY")
-    return create_client(url, key)
+    return get_anon_client()
 
 async def initialize_database():
     """Initialize database tables"""
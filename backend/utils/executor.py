@@ -0,0 +1,61 @@
+# utils/executor.py
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+# supabase-py is synchronous; its calls run here instead of on the event loop.
+# The pool size bounds how many database/storage calls are in flight at once.
+BLOCKING_IO_WORKERS = int(os.getenv("BLOCKING_IO_WORKERS", "32"))
+
+_executor: Optional[ThreadPoolExecutor] = None
+_lock = threading.Lock()
+_stats = {"submitted": 0, "completed": 0, "running": 0}
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=BLOCKING_IO_WORKERS, thread_name_prefix="blocking-io")
+    return _executor
+
+
+def _tracked(func: Callable) -> Any:
+    with _lock:
+        _stats["running"] += 1
+    try:
+        return func()
+    finally:
+        with _lock:
+            _stats["running"] -= 1
+            _stats["completed"] += 1
+
+
+async def run_blocking(func: Callable, *args, **kwargs) -> Any:
+    """Run a blocking call (e.g. `query.execute`) on the I/O pool and await its result.
+
+    The call sees the caller's context variables, so spans it records nest under the caller's.
+    """
+    _stats["submitted"] += 1
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_get_executor(), _tracked, functools.partial(context.run, func, *args, **kwargs))
+
+
+def shutdown_executor():
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def executor_stats():
+    stats = dict(_stats)
+    stats["queued"] = stats["submitted"] - stats["completed"] - stats["running"]
+    return {"max_workers": BLOCKING_IO_WORKERS, **stats}
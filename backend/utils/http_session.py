@@ -0,0 +1,163 @@
+# utils/http_session.py
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+import aiohttp
+
+from utils import metrics
+
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "60"))
+HTTP_TOTAL_TIMEOUT = float(os.getenv("HTTP_TOTAL_TIMEOUT", "90"))
+HTTP_LIMIT_PER_HOST = int(os.getenv("HTTP_LIMIT_PER_HOST", "20"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+HTTP_BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", "0.5"))
+HTTP_BACKOFF_MAX = float(os.getenv("HTTP_BACKOFF_MAX", "8"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_session: Optional[aiohttp.ClientSession] = None
+
+
+def get_http_session() -> aiohttp.ClientSession:
+    """Application-wide aiohttp session: keep-alive connections, per-host limits, DNS cache"""
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(limit_per_host=HTTP_LIMIT_PER_HOST, ttl_dns_cache=300)
+        timeout = aiohttp.ClientTimeout(
+            total=HTTP_TOTAL_TIMEOUT,
+            sock_connect=HTTP_CONNECT_TIMEOUT,
+            sock_read=HTTP_READ_TIMEOUT,
+        )
+        _session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+    return _session
+
+
+async def close_http_session():
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+def _observe(url: str, started: float, status) -> None:
+    host = url.split("://", 1)[-1].split("/", 1)[0]
+    metrics.outbound_request_duration.observe(time.perf_counter() - started, host=host, status=str(status))
+
+
+def _backoff_delay(attempt: int, retry_after: Optional[str] = None) -> float:
+    if retry_after:
+        try:
+            return min(float(retry_after), HTTP_BACKOFF_MAX)
+        except ValueError:
+            pass
+    # Full jitter: spread retries from many callers instead of retrying in lockstep
+    return random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * 2 ** attempt))
+
+
+async def post_json(url: str, payload: Dict, headers: Optional[Dict] = None,
+                    max_retries: int = HTTP_MAX_RETRIES) -> Tuple[int, Any]:
+    """POST a JSON body and return (status, decoded body).
+
+    429/5xx responses, connection errors and timeouts are retried with jittered
+    exponential backoff; the last response (or exception) is returned (or raised).
+    A body that is not JSON is returned as {"error": {"message": <text>}}.
+    """
+    session = get_http_session()
+    for attempt in range(max_retries + 1):
+        started = time.perf_counter()
+        try:
+            async with session.post(url, headers=headers, json=payload) as resp:
+                _observe(url, started, resp.status)
+                if resp.status in RETRY_STATUSES and attempt < max_retries:
+                    delay = _backoff_delay(attempt, resp.headers.get("Retry-After"))
+                    logging.warning(f"POST {resp.url.host} returned {resp.status}, retrying in {delay:.2f}s")
+                    await asyncio.sleep(delay)
+                    continue
+                try:
+                    data = await resp.json(content_type=None)
+                except ValueError:
+                    data = {"error": {"message": (await resp.text())[:500]}}
+                return resp.status, data
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            _observe(url, started, type(e).__name__)
+            if attempt >= max_retries:
+                raise
+            delay = _backoff_delay(attempt)
+            logging.warning(f"POST {url.split('?')[0]} failed ({e!r}), retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+
+class UpstreamError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(f"upstream returned {status}: {message}")
+        self.status = status
+
+
+async def _open_stream(url: str, payload: Dict, headers: Optional[Dict],
+                       max_retries: int) -> aiohttp.ClientResponse:
+    """POST for a streamed body. Retries (as in post_json) only happen before the first
+    byte is received. The total timeout is lifted; the read timeout still bounds each
+    gap between chunks."""
+    session = get_http_session()
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=HTTP_CONNECT_TIMEOUT, sock_read=HTTP_READ_TIMEOUT)
+    for attempt in range(max_retries + 1):
+        started = time.perf_counter()
+        try:
+            resp = await session.post(url, headers=headers, json=payload, timeout=timeout)
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            _observe(url, started, type(e).__name__)
+            if attempt >= max_retries:
+                raise
+            delay = _backoff_delay(attempt)
+            logging.warning(f"POST {url.split('?')[0]} failed ({e!r}), retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+            continue
+        _observe(url, started, resp.status)
+        if resp.status in RETRY_STATUSES and attempt < max_retries:
+            delay = _backoff_delay(attempt, resp.headers.get("Retry-After"))
+            resp.release()
+            logging.warning(f"POST {resp.url.host} returned {resp.status}, retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+            continue
+        if resp.status != 200:
+            message = (await resp.text())[:500]
+            resp.release()
+            raise UpstreamError(resp.status, message)
+        return resp
+
+
+async def stream_sse(url: str, payload: Dict, headers: Optional[Dict] = None,
+                     max_retries: int = HTTP_MAX_RETRIES) -> AsyncIterator[str]:
+    """POST a JSON body and yield the data field of each server-sent event.
+    Closing the generator closes the upstream response."""
+    resp = await _open_stream(url, payload, headers, max_retries)
+    async with resp:
+        data_lines = []
+        async for raw_line in resp.content:
+            line = raw_line.decode("utf-8").rstrip("\r\n")
+            if not line:
+                if data_lines:
+                    yield "\n".join(data_lines)
+                    data_lines = []
+            elif line.startswith("data:"):
+                data_lines.append(line[5:].lstrip(" "))
+            # comments (":") and event/id/retry fields are not needed by callers
+        if data_lines:
+            yield "\n".join(data_lines)
+
+
+async def stream_ndjson(url: str, payload: Dict, headers: Optional[Dict] = None,
+                        max_retries: int = HTTP_MAX_RETRIES) -> AsyncIterator[Any]:
+    """POST a JSON body and yield each decoded line of a newline-delimited JSON response."""
+    resp = await _open_stream(url, payload, headers, max_retries)
+    async with resp:
+        async for raw_line in resp.content:
+            line = raw_line.strip()
+            if line:
+                yield json.loads(line)
@@ -0,0 +1,348 @@
+# utils/inverted_index.py
+import html
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import zlib
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils.vector_index import tokenize
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+SNIPPET_CHARS = 240  # length of the window a snippet is cut from
+MAX_SNIPPET_MATCHES = 1000  # term occurrences considered when placing the window
+
+_EMPTY = np.empty(0, dtype=np.uint32)
+_EMPTY_BYTES = np.empty(0, dtype=np.uint8)
+
+
+class Segment:
+    """One immutable slice of the index, memory-mapped from its directory.
+
+    Postings are stored term by term as contiguous runs of doc ids and term
+    frequencies (postings.npy / freqs.npy, located through term_offsets.npy);
+    document texts are kept zlib-compressed in text.bin for snippets. Only the
+    term dictionary and the live-document mask are held in memory.
+
+    Nothing is closed explicitly: the maps stay readable after a merge deletes the
+    segment's files and are released once the last search holding the segment is done.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.name = os.path.basename(path)
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        self.generation = meta["generation"]
+        self.replaces = meta.get("replaces", [])
+        with open(os.path.join(path, "keys.json")) as f:
+            self.keys: List[Any] = json.load(f)
+        with open(os.path.join(path, "terms.txt"), encoding="utf-8") as f:
+            self.terms = {term: i for i, term in enumerate(f.read().split("\n")) if term}
+        load = lambda name: np.load(os.path.join(path, name), mmap_mode="r", allow_pickle=False)
+        self.term_offsets = load("term_offsets.npy")
+        self.postings = load("postings.npy")
+        self.freqs = load("freqs.npy")
+        self.lengths = load("lengths.npy")
+        self.text_offsets = load("text_offsets.npy")
+        text_path = os.path.join(path, "text.bin")
+        # np.memmap refuses empty files (a segment of empty documents)
+        self._text = np.memmap(text_path, dtype=np.uint8, mode="r") if os.path.getsize(text_path) else _EMPTY_BYTES
+        self.live = np.ones(len(self.keys), dtype=bool)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def postings_for(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """(doc ids, term frequencies) of term in this segment, live or not"""
+        i = self.terms.get(term)
+        if i is None:
+            return _EMPTY, _EMPTY
+        start, end = int(self.term_offsets[i]), int(self.term_offsets[i + 1])
+        return self.postings[start:end], self.freqs[start:end]
+
+    def compressed_text(self, doc: int) -> bytes:
+        start, end = int(self.text_offsets[doc]), int(self.text_offsets[doc + 1])
+        return self._text[start:end].tobytes()
+
+    def text(self, doc: int) -> str:
+        return zlib.decompress(self.compressed_text(doc)).decode("utf-8")
+
+
+def _write_segment(path: str, keys: Sequence[Any], lengths: np.ndarray,
+                   postings: Dict[str, Tuple[np.ndarray, np.ndarray]], texts: Sequence[bytes],
+                   generation: int, replaces: Sequence[str] = ()) -> None:
+    """Write a segment into a temporary directory and rename it into place"""
+    tmp = path + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    terms = sorted(postings)
+    term_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    np.cumsum([len(postings[term][0]) for term in terms], out=term_offsets[1:])
+    doc_ids = np.concatenate([postings[term][0] for term in terms]) if terms else _EMPTY
+    freqs = np.concatenate([postings[term][1] for term in terms]) if terms else _EMPTY
+    text_offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+    np.cumsum([len(text) for text in texts], out=text_offsets[1:])
+    np.save(os.path.join(tmp, "postings.npy"), doc_ids.astype(np.uint32, copy=False))
+    np.save(os.path.join(tmp, "freqs.npy"), freqs.astype(np.uint32, copy=False))
+    np.save(os.path.join(tmp, "term_offsets.npy"), term_offsets)
+    np.save(os.path.join(tmp, "lengths.npy"), lengths.astype(np.uint32, copy=False))
+    np.save(os.path.join(tmp, "text_offsets.npy"), text_offsets)
+    with open(os.path.join(tmp, "text.bin"), "wb") as f:
+        for text in texts:
+            f.write(text)
+    with open(os.path.join(tmp, "terms.txt"), "w", encoding="utf-8") as f:
+        f.write("\n".join(terms))
+    with open(os.path.join(tmp, "keys.json"), "w") as f:
+        json.dump(list(keys), f, default=str)
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump({"generation": generation, "docs": len(keys), "terms": len(terms),
+                   "replaces": list(replaces), "created_at": time.time()}, f)
+    os.replace(tmp, path)
+
+
+class ContentIndex:
+    """BM25 full-text index of project contents, kept as immutable segments on disk.
+
+    Every add() writes one new segment, so indexing an upload never rewrites what
+    is already there. When more than max_segments exist, the merge_factor smallest
+    are merged by concatenating their posting lists, leaving out documents that a
+    newer segment has replaced. A search reads only the posting lists of its query
+    terms from each segment and scores them with vectorized BM25 (idf and average
+    document length taken over all segments), so its cost follows the number of
+    matching postings rather than the size of the corpus: the live document count
+    and total length are running totals, and scores are summed per matched doc id
+    rather than in arrays the size of each segment.
+
+    Only the first stored_chars characters of each document are kept for snippets;
+    every term of the document is indexed.
+    """
+
+    def __init__(self, directory: str, max_segments: int = 8, merge_factor: int = 4, stored_chars: int = 50000):
+        self.directory = directory
+        self.max_segments = max_segments
+        self.merge_factor = max(2, merge_factor)
+        self.stored_chars = stored_chars
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._segments: List[Segment] = []
+        self._locations: Dict[Any, Tuple[Segment, int]] = {}
+        self._total_length = 0  # of the live documents
+        self._next = 1
+        self.merges = 0
+
+    def __len__(self) -> int:
+        return len(self._locations)
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self._locations
+
+    def open(self) -> int:
+        """Load the segments on disk, finishing any interrupted merge. Returns the number of documents."""
+        os.makedirs(self.directory, exist_ok=True)
+        segments = []
+        for name in sorted(os.listdir(self.directory)):
+            path = os.path.join(self.directory, name)
+            if name.endswith(".tmp"):
+                shutil.rmtree(path, ignore_errors=True)
+            elif name.startswith("seg-"):
+                try:
+                    segments.append(Segment(path))
+                except (OSError, ValueError, KeyError) as e:
+                    logging.warning(f"Content index segment {name} not loaded: {e}")
+        replaced = {name for segment in segments for name in segment.replaces}
+        for segment in segments:
+            if segment.name in replaced:
+                shutil.rmtree(segment.path, ignore_errors=True)
+        with self._write_lock:
+            self._install([segment for segment in segments if segment.name not in replaced])
+            self._next = max([int(segment.name[4:]) for segment in self._segments] + [0]) + 1
+        return len(self._locations)
+
+    def _install(self, segments: List[Segment]) -> None:
+        # Later generations replace earlier copies of a key
+        segments = sorted(segments, key=lambda segment: (segment.generation, segment.name))
+        locations: Dict[Any, Tuple[Segment, int]] = {}
+        for segment in segments:
+            for doc, key in enumerate(segment.keys):
+                previous = locations.get(key)
+                if previous is not None:
+                    previous[0].live[previous[1]] = False
+                locations[key] = (segment, doc)
+        total_length = sum(int(np.asarray(segment.lengths)[segment.live].sum()) for segment in segments)
+        with self._lock:
+            self._segments, self._locations, self._total_length = segments, locations, total_length
+
+    def _new_path(self) -> Tuple[str, int]:
+        number = self._next
+        self._next += 1
+        return os.path.join(self.directory, f"seg-{number:08d}"), number
+
+    def add(self, keys: Sequence[Any], texts: Sequence[Optional[str]]) -> int:
+        """Index (or re-index) documents as one new segment, merging segments when there are too many"""
+        if not keys:
+            return 0
+        counts = [Counter(tokenize(text)) for text in texts]
+        lengths = np.array([sum(count.values()) for count in counts], dtype=np.uint32)
+        grouped: Dict[str, Tuple[List[int], List[int]]] = {}
+        for doc, count in enumerate(counts):
+            for term, frequency in count.items():
+                doc_ids, freqs = grouped.setdefault(term, ([], []))
+                doc_ids.append(doc)
+                freqs.append(frequency)
+        postings = {term: (np.array(doc_ids, dtype=np.uint32), np.array(freqs, dtype=np.uint32))
+                    for term, (doc_ids, freqs) in grouped.items()}
+        stored = [zlib.compress((text or "")[:self.stored_chars].encode("utf-8"), 6) for text in texts]
+        with self._write_lock:
+            os.makedirs(self.directory, exist_ok=True)
+            path, number = self._new_path()
+            _write_segment(path, keys, lengths, postings, stored, generation=number)
+            segment = Segment(path)
+            with self._lock:
+                segments = self._segments + [segment]
+                locations = dict(self._locations)
+                total_length = self._total_length
+            total_length += int(lengths.sum(dtype=np.int64))
+            for doc, key in enumerate(segment.keys):
+                previous = locations.get(key)
+                if previous is not None:
+                    previous[0].live[previous[1]] = False
+                    total_length -= int(previous[0].lengths[previous[1]])
+                locations[key] = (segment, doc)
+            with self._lock:
+                self._segments, self._locations, self._total_length = segments, locations, total_length
+            if len(segments) > self.max_segments:
+                self._merge(sorted(segments, key=len)[:self.merge_factor])
+        return len(keys)
+
+    def _merge(self, merging: List[Segment]) -> None:
+        merging = sorted(merging, key=lambda segment: (segment.generation, segment.name))
+        keys, lengths, stored, remaps = [], [], [], []
+        for segment in merging:
+            live = np.flatnonzero(segment.live)
+            remap = np.full(len(segment), -1, dtype=np.int64)
+            remap[live] = np.arange(len(keys), len(keys) + len(live))
+            remaps.append(remap)
+            keys.extend(segment.keys[doc] for doc in live)
+            lengths.append(np.asarray(segment.lengths)[live])
+            stored.extend(segment.compressed_text(int(doc)) for doc in live)
+        postings = {}
+        for term in sorted(set().union(*(segment.terms for segment in merging))):
+            doc_ids, freqs = [], []
+            for segment, remap in zip(merging, remaps):
+                ids, tf = segment.postings_for(term)
+                if ids.size:
+                    mapped = remap[ids]
+                    keep = mapped >= 0
+                    doc_ids.append(mapped[keep])
+                    freqs.append(tf[keep])
+            if doc_ids and sum(len(ids) for ids in doc_ids):
+                postings[term] = (np.concatenate(doc_ids), np.concatenate(freqs))
+        path, _ = self._new_path()
+        _write_segment(path, keys, np.concatenate(lengths), postings, stored,
+                       generation=merging[-1].generation, replaces=[segment.name for segment in merging])
+        merged = Segment(path)
+        with self._lock:
+            remaining = [segment for segment in self._segments if segment not in merging]
+        self._install(remaining + [merged])
+        # Searches that already picked up the old segments keep reading their maps of the
+        # deleted files; the memory is released when they drop the segments
+        for segment in merging:
+            shutil.rmtree(segment.path, ignore_errors=True)
+        self.merges += 1
+
+    def search(self, query: str, k: int = 50) -> List[Tuple[Any, float]]:
+        """Top-k (key, BM25 score) pairs, best first; documents need at least one query term."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        with self._lock:
+            segments, docs, total_length = self._segments, len(self._locations), self._total_length
+        if not terms or not docs:
+            return []
+        average_length = max(total_length / docs, 1.0)
+        postings = [[segment.postings_for(term) for term in terms] for segment in segments]
+        # Replaced documents still count towards document frequency until their segment is merged
+        frequencies = [sum(int(found[i][0].size) for found in postings) for i in range(len(terms))]
+        idf = [float(np.log(1 + (docs - df + 0.5) / (df + 0.5))) for df in frequencies]
+
+        found: List[Tuple[float, Any]] = []
+        for segment, segment_postings in zip(segments, postings):
+            matched, contributions = [], []
+            for weight, (doc_ids, tf) in zip(idf, segment_postings):
+                if not doc_ids.size:
+                    continue
+                tf = tf.astype(np.float64)
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * segment.lengths[doc_ids] / average_length)
+                matched.append(doc_ids)
+                contributions.append(weight * tf * (BM25_K1 + 1) / (tf + norm))
+            if not matched:
+                continue
+            # Sum each matched document's term scores over the postings alone
+            hits, positions = np.unique(np.concatenate(matched), return_inverse=True)
+            scores = np.bincount(positions, weights=np.concatenate(contributions), minlength=len(hits))
+            live = segment.live[hits]
+            hits, scores = hits[live], scores[live]
+            if len(hits) > k:
+                best = np.argpartition(-scores, k)[:k]
+                hits, scores = hits[best], scores[best]
+            found.extend((float(score), segment.keys[doc]) for doc, score in zip(hits, scores))
+        found.sort(key=lambda hit: -hit[0])
+        return [(key, score) for score, key in found[:k]]
+
+    def snippet(self, key: Any, query: str, chars: int = SNIPPET_CHARS) -> Optional[str]:
+        """The part of a document with the most distinct query terms, HTML-escaped and with
+        the terms wrapped in <mark>; None for documents not in the index."""
+        with self._lock:
+            location = self._locations.get(key)
+        if location is None:
+            return None
+        text = location[0].text(location[1])
+        terms = sorted(set(tokenize(query)), key=len, reverse=True)
+        if not terms:
+            return html.escape(text[:chars])
+        pattern = re.compile(r"(?<![a-z0-9])(?:" + "|".join(map(re.escape, terms)) + r")(?![a-z0-9])", re.I)
+        matches = [match for match, _ in zip(pattern.finditer(text), range(MAX_SNIPPET_MATCHES))]
+        start = 0
+        if matches:
+            best, right = -1, 0
+            for left, first in enumerate(matches):
+                right = max(right, left)
+                while right + 1 < len(matches) and matches[right + 1].end() - first.start() <= chars:
+                    right += 1
+                distinct = len({match.group().lower() for match in matches[left:right + 1]})
+                if distinct > best:
+                    best, start = distinct, first.start()
+            # Some context before the first term, starting on a word boundary
+            start = max(0, start - chars // 5)
+            while 0 < start < len(text) and not text[start - 1].isspace():
+                start -= 1
+        end = min(len(text), start + chars)
+        while end < len(text) and not text[end].isspace() and end - start < chars + 30:
+            end += 1
+        window = text[start:end]
+        parts, cursor = [], 0
+        for match in pattern.finditer(window):
+            parts.append(html.escape(window[cursor:match.start()]))
+            parts.append(f"<mark>{html.escape(match.group())}</mark>")
+            cursor = match.end()
+        parts.append(html.escape(window[cursor:]))
+        snippet = " ".join("".join(parts).split())
+        return ("… " if start > 0 else "") + snippet + (" …" if end < len(text) else "")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            segments = self._segments
+        return {
+            "documents": len(self._locations),
+            "segments": len(segments),
+            "segment_documents": [len(segment) for segment in segments],
+            "merges": self.merges,
+            "directory": self.directory,
+        }
@@ -0,0 +1,220 @@
+# utils/job_queue.py
+import asyncio
+import json
+import logging
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from utils import metrics
+from utils.executor import run_blocking
+
+JOB_STATUSES = ("queued", "running", "succeeded", "failed")
+
+job_duration = metrics.registry.register(metrics.Histogram(
+    "job_duration_seconds", "Background job attempts, by kind and outcome", ("kind", "outcome")))
+job_wait = metrics.registry.register(metrics.Histogram(
+    "job_queue_wait_seconds", "Time from a job becoming due to a worker picking it up", ("kind",)))
+
+_COLUMNS = "id, kind, owner, status, attempts, created_at, run_at, started_at, finished_at, result, error"
+
+
+class JobQueue:
+    """Background jobs kept in SQLite and run by worker tasks on the event loop.
+
+    enqueue() only writes a row, so request handlers return immediately. Workers
+    claim due jobs oldest first; a handler that raises is retried with jittered
+    exponential backoff until max_attempts, then marked failed. With a file path
+    the queue survives restarts: jobs that were running when the process stopped
+    are queued again by start(). Finished jobs are kept for keep_seconds so their
+    status can still be looked up.
+    """
+
+    def __init__(self, path: Optional[str] = None, workers: int = 4, max_attempts: int = 5,
+                 backoff: float = 1.0, backoff_max: float = 60.0, keep_seconds: float = 86400.0):
+        self.path = path or ":memory:"
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.keep_seconds = keep_seconds
+        self._handlers: Dict[str, Callable[[Dict], Awaitable[Any]]] = {}
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        if self.path != ":memory:":
+            self._db.execute("pragma journal_mode=wal")
+            self._db.execute("pragma synchronous=normal")
+        self._db.execute(
+            "create table if not exists jobs (id text primary key, kind text not null, owner text, payload text not null, "
+            "status text not null, attempts integer not null default 0, created_at real not null, run_at real not null, "
+            "started_at real, finished_at real, result text, error text)"
+        )
+        self._db.execute("create index if not exists jobs_due on jobs (status, run_at)")
+        self._db.commit()
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self.completed = 0
+        self.retried = 0
+
+    def register(self, kind: str, handler: Callable[[Dict], Awaitable[Any]]) -> None:
+        """Run handler(payload) for jobs of this kind; its JSON-serializable return value is the job result."""
+        self._handlers[kind] = handler
+
+    def _execute(self, sql: str, params=()) -> List[tuple]:
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+            self._db.commit()
+        return rows
+
+    @staticmethod
+    def _record(row: tuple) -> Dict:
+        job = dict(zip([column.strip() for column in _COLUMNS.split(",")], row))
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    async def enqueue(self, kind: str, payload: Dict, owner: Optional[str] = None) -> Dict:
+        """Queue a job and return its record ({"id", "status", ...})."""
+        if kind not in self._handlers:
+            raise ValueError(f"No handler registered for job kind '{kind}'")
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        await run_blocking(
+            self._execute,
+            "insert into jobs (id, kind, owner, payload, status, created_at, run_at) values (?, ?, ?, ?, 'queued', ?, ?)",
+            (job_id, kind, owner, json.dumps(payload, default=str), now, now),
+        )
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return {"id": job_id, "kind": kind, "status": "queued"}
+
+    async def get(self, job_id: str) -> Optional[Dict]:
+        rows = await run_blocking(self._execute, f"select {_COLUMNS} from jobs where id = ?", (job_id,))
+        return self._record(rows[0]) if rows else None
+
+    async def recent(self, owner: Optional[str] = None, status: Optional[str] = None, limit: int = 50) -> List[Dict]:
+        """Most recent jobs first, optionally only one owner's or one status"""
+        clauses, params = [], []
+        if owner is not None:
+            clauses.append("owner = ?")
+            params.append(owner)
+        if status is not None:
+            clauses.append("status = ?")
+            params.append(status)
+        where = f"where {' and '.join(clauses)}" if clauses else ""
+        rows = await run_blocking(self._execute, f"select {_COLUMNS} from jobs {where} order by created_at desc limit ?",
+                                  (*params, limit))
+        return [self._record(row) for row in rows]
+
+    def _claim(self) -> Optional[tuple]:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "select id, kind, payload, attempts, run_at from jobs where status = 'queued' and run_at <= ? "
+                "order by run_at limit 1", (now,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute("update jobs set status = 'running', attempts = attempts + 1, started_at = ? where id = ?",
+                             (now, row[0]))
+            self._db.commit()
+        return row
+
+    def _next_due(self) -> Optional[float]:
+        with self._lock:
+            row = self._db.execute("select min(run_at) from jobs where status = 'queued'").fetchone()
+        return row[0] if row else None
+
+    async def _run(self, job_id: str, kind: str, payload: Dict, attempt: int) -> None:
+        started = time.perf_counter()
+        handler = self._handlers.get(kind)
+        try:
+            if handler is None:
+                raise LookupError(f"No handler registered for job kind '{kind}'")
+            with metrics.trace(f"job.{kind}", job_id=job_id, attempt=attempt):
+                result = await handler(payload)
+        except asyncio.CancelledError:
+            # Shutting down: the attempt does not count and the job runs again on the next start
+            await run_blocking(self._execute, "update jobs set status = 'queued', attempts = attempts - 1 where id = ?",
+                               (job_id,))
+            raise
+        except Exception as e:
+            job_duration.observe(time.perf_counter() - started, kind=kind, outcome="error")
+            if attempt < self.max_attempts and handler is not None:
+                delay = random.uniform(0.5, 1.0) * min(self.backoff_max, self.backoff * 2 ** (attempt - 1))
+                logging.warning(f"Job {job_id} ({kind}) failed ({e}); retry {attempt}/{self.max_attempts - 1} in {delay:.1f}s")
+                self.retried += 1
+                await run_blocking(self._execute, "update jobs set status = 'queued', run_at = ?, error = ? where id = ?",
+                                   (time.time() + delay, str(e), job_id))
+            else:
+                logging.error(f"Job {job_id} ({kind}) failed after {attempt} attempts: {e}")
+                await run_blocking(self._execute,
+                                   "update jobs set status = 'failed', finished_at = ?, error = ? where id = ?",
+                                   (time.time(), str(e), job_id))
+            return
+        job_duration.observe(time.perf_counter() - started, kind=kind, outcome="success")
+        self.completed += 1
+        await run_blocking(self._execute,
+                           "update jobs set status = 'succeeded', finished_at = ?, result = ?, error = null where id = ?",
+                           (time.time(), json.dumps(result, default=str), job_id))
+
+    async def _worker(self) -> None:
+        while True:
+            # Cleared before looking, so an enqueue() after an empty look still wakes us
+            self._wakeup.clear()
+            claimed = await run_blocking(self._claim)
+            if claimed is None:
+                next_due = await run_blocking(self._next_due)
+                timeout = 1.0 if next_due is None else min(1.0, max(0.0, next_due - time.time()))
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            job_id, kind, payload, attempts, run_at = claimed
+            job_wait.observe(max(0.0, time.time() - run_at), kind=kind)
+            try:
+                await self._run(job_id, kind, json.loads(payload), attempts + 1)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.exception(f"Job {job_id} could not be recorded: {e}")
+
+    async def start(self) -> None:
+        """Requeue jobs interrupted by a restart, drop old finished ones and start the workers"""
+        await run_blocking(self._execute, "update jobs set status = 'queued' where status = 'running'")
+        await run_blocking(self._execute, "delete from jobs where status in ('succeeded', 'failed') and finished_at < ?",
+                           (time.time() - self.keep_seconds,))
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def stats(self) -> Dict:
+        now = time.time()
+        with self._lock:
+            counts = dict(self._db.execute("select status, count(*) from jobs group by status").fetchall())
+            oldest = self._db.execute("select min(run_at) from jobs where status = 'queued' and run_at <= ?",
+                                      (now,)).fetchone()[0]
+        return {
+            **{status: counts.get(status, 0) for status in JOB_STATUSES},
+            "oldest_due_seconds": round(now - oldest, 3) if oldest else 0,
+            "workers": len(self._tasks),
+            "completed": self.completed,
+            "retried": self.retried,
+            "persistent": self.path != ":memory:",
+        }
@@ -0,0 +1,137 @@
+# utils/json_extract.py
+import json
+import re
+from typing import Any, Callable, List, Optional
+
+# Characters that change the scanner's state outside and inside JSON strings
+_STRUCTURAL = re.compile(r'[\[\]{}",]')
+_IN_STRING = re.compile(r'[\\"]')
+_OPENER = re.compile(r'[\[{]')
+
+
+class JSONStreamExtractor:
+    """Pulls the first JSON array or object out of model output that arrives in pieces.
+
+    Prose and markdown fences around the JSON are skipped. Each element of a
+    top-level array is decoded as soon as its closing delimiter arrives, so
+    callers can act on the first items while the rest are still being generated;
+    a top-level object is one item once it closes, or, if `validate` rejects it,
+    the elements of the first list inside it (e.g. {"ideas": [...]}).
+
+    `validate` maps a decoded item to the value to return, or None to drop it.
+    If a container closes without producing a single item (e.g. "[1]" in prose
+    before the real answer), scanning resumes after it.
+
+    Scanning only ever moves forward and jumps between structural characters,
+    so the cost is linear in the length of the text.
+    """
+
+    def __init__(self, validate: Optional[Callable[[Any], Any]] = None):
+        self.validate = validate
+        self.done = False
+        self.errors = 0
+        self._buf = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._start = 0
+        self._elem_start = 0
+        self._kind = ""
+        self._emitted = 0
+
+    @property
+    def text(self) -> str:
+        return self._buf
+
+    def feed(self, chunk: str) -> List[Any]:
+        """Add the next piece of text and return the items completed by it"""
+        self._buf += chunk
+        items = []
+        buf = self._buf
+        while not self.done:
+            if self._depth == 0:
+                m = _OPENER.search(buf, self._pos)
+                if m is None:
+                    self._pos = len(buf)
+                    break
+                self._depth = 1
+                self._kind = m.group()
+                self._start = m.start()
+                self._elem_start = self._pos = m.end()
+                self._emitted = 0
+                continue
+            if self._in_string:
+                m = _IN_STRING.search(buf, self._pos)
+                if m is None:
+                    self._pos = len(buf)
+                    break
+                if m.group() == "\\":
+                    if m.end() >= len(buf):
+                        self._pos = m.start()  # the escaped character has not arrived yet
+                        break
+                    self._pos = m.end() + 1
+                else:
+                    self._in_string = False
+                    self._pos = m.end()
+                continue
+            m = _STRUCTURAL.search(buf, self._pos)
+            if m is None:
+                self._pos = len(buf)
+                break
+            char, index = m.group(), m.start()
+            self._pos = m.end()
+            if char == '"':
+                self._in_string = True
+            elif char in "[{":
+                self._depth += 1
+            elif char in "]}":
+                self._depth -= 1
+                if self._depth == 0:
+                    if self._kind == "[":
+                        self._emit_element(buf[self._elem_start:index], items)
+                    else:
+                        self._emit_object(buf[self._start:index + 1], items)
+                    if self._emitted:
+                        self.done = True
+            elif self._depth == 1 and self._kind == "[":
+                self._emit_element(buf[self._elem_start:index], items)
+                self._elem_start = self._pos
+        return items
+
+    def _decode(self, text: str) -> Any:
+        try:
+            return json.loads(text)
+        except ValueError:
+            self.errors += 1
+            return None
+
+    def _accept(self, value: Any, items: List[Any]) -> bool:
+        if self.validate is not None:
+            value = self.validate(value)
+        if value is None:
+            return False
+        items.append(value)
+        self._emitted += 1
+        return True
+
+    def _emit_element(self, text: str, items: List[Any]) -> None:
+        text = text.strip()
+        if text:  # "[]" and trailing commas leave nothing to decode
+            value = self._decode(text)
+            if value is not None:
+                self._accept(value, items)
+
+    def _emit_object(self, text: str, items: List[Any]) -> None:
+        value = self._decode(text)
+        if value is None or self._accept(value, items):
+            return
+        for nested in value.values():
+            if isinstance(nested, list):
+                for element in nested:
+                    self._accept(element, items)
+                return
+
+
+def extract_items(text: str, validate: Optional[Callable[[Any], Any]] = None) -> List[Any]:
+    """The items of the first JSON array/object in text (see JSONStreamExtractor)"""
+    return JSONStreamExtractor(validate).feed(text)
@@ -0,0 +1,43 @@
+# utils/latency.py
+import threading
+from collections import deque
+from typing import Dict, List, Optional
+
+
+def _pick(samples: List[float], p: float) -> float:
+    """Nearest-rank percentile of sorted samples."""
+    return samples[min(len(samples) - 1, max(0, int(round(p / 100 * len(samples))) - 1))]
+
+
+class LatencyWindow:
+    """Most recent latency samples (seconds) with percentile summaries."""
+
+    def __init__(self, maxlen: int = 1000):
+        self._samples = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+
+    def _sorted(self) -> List[float]:
+        with self._lock:
+            return sorted(self._samples)
+
+    def percentile(self, p: float) -> Optional[float]:
+        samples = self._sorted()
+        return _pick(samples, p) if samples else None
+
+    def stats(self) -> Dict:
+        samples = self._sorted()
+        if not samples:
+            return {"count": self.count}
+        return {
+            "count": self.count,
+            "mean": sum(samples) / len(samples),
+            "p50": _pick(samples, 50),
+            "p95": _pick(samples, 95),
+            "p99": _pick(samples, 99),
+        }
@@ -0,0 +1,90 @@
+# utils/llm_cache.py
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Optional
+
+from utils.ttl_cache import TTLCache
+
+
+def normalize_prompt(text: Optional[str]) -> str:
+    """Case- and whitespace-insensitive form of a prompt, used only for cache keys"""
+    return " ".join((text or "").lower().split())
+
+
+class LLMCache:
+    """Parsed LLM results keyed on (normalized prompt, system prompt, model).
+
+    An in-memory LRU/TTL tier answers repeat queries; an optional SQLite file
+    keeps entries across restarts and refills the memory tier on a hit.
+    """
+
+    def __init__(self, maxsize: int = 1000, ttl: float = 86400.0, path: Optional[str] = None):
+        self.ttl = ttl
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.disk_hits = 0
+        self._db = None
+        self._lock = threading.Lock()
+        if path:
+            try:
+                self._db = sqlite3.connect(path, check_same_thread=False)
+                self._db.execute(
+                    "create table if not exists llm_cache (key text primary key, value text not null, expires_at real not null)"
+                )
+                self._db.execute("delete from llm_cache where expires_at < ?", (time.time(),))
+                self._db.commit()
+            except sqlite3.Error as e:
+                logging.exception(f"LLM cache disk tier disabled: {e}")
+                self._db = None
+
+    @staticmethod
+    def key(prompt: str, system_prompt: Optional[str], model: str) -> str:
+        raw = json.dumps([normalize_prompt(prompt), normalize_prompt(system_prompt), model])
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get(self, key: str) -> Any:
+        value = self.memory.get(key)
+        if value is not None or self._db is None:
+            return value
+        with self._lock:
+            row = self._db.execute(
+                "select value, expires_at from llm_cache where key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        value = json.loads(row[0])
+        self.disk_hits += 1
+        self.memory.set(key, value, ttl=row[1] - time.time())
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        self.memory.set(key, value)
+        if self._db is None:
+            return
+        try:
+            with self._lock:
+                self._db.execute(
+                    "insert or replace into llm_cache (key, value, expires_at) values (?, ?, ?)",
+                    (key, json.dumps(value), time.time() + self.ttl),
+                )
+                self._db.commit()
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            logging.warning(f"LLM cache write failed: {e}")
+
+    def close(self) -> None:
+        if self._db is not None:
+            with self._lock:
+                self._db.close()
+            self._db = None
+
+    def stats(self):
+        stats = self.memory.stats()
+        stats["disk_hits"] = self.disk_hits
+        stats["disk_enabled"] = self._db is not None
+        # A disk hit was first counted as a memory miss
+        stats["misses"] -= self.disk_hits
+        stats["hits"] += self.disk_hits
+        return stats
@@ -0,0 +1,338 @@
+# utils/metrics.py
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Bytes
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Append finished spans as JSON lines to this file (unset disables span export)
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH")
+
+# One sample family for a collector: (name, type, help, [(labels, value), ...])
+Family = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(pairs: Sequence[Tuple[str, str]]) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in sorted(values):
+            lines.extend(self._lines(list(zip(self.labelnames, key)), value))
+        return lines
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _lines(self, pairs, value) -> List[str]:
+        return [f"{self.name}_total{_labels(pairs)} {_number(value)}"]
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # per-bucket counts (not cumulative), sum, count
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def _lines(self, pairs, state) -> List[str]:
+        counts, total, count = state
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            lines.append(f"{self.name}_bucket{_labels(pairs + [('le', _number(float(bound)))])} {cumulative}")
+        lines.append(f"{self.name}_bucket{_labels(pairs + [('le', '+Inf')])} {count}")
+        lines.append(f"{self.name}_sum{_labels(pairs)} {_number(total)}")
+        lines.append(f"{self.name}_count{_labels(pairs)} {count}")
+        return lines
+
+
+class Registry:
+    """Metrics owned by this process plus collectors that read existing stats at scrape time."""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], List[Family]]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], List[Family]]) -> None:
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                families = collector()
+            except Exception as e:
+                logging.warning(f"Metrics collector failed: {e!r}")
+                continue
+            for name, kind, help, samples in families:
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    sample = f"{name}_total" if kind == "counter" else name
+                    lines.append(f"{sample}{_labels(sorted(labels.items()))} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "Time to serve a request, response body included",
+    ("method", "route", "status")))
+supabase_request_duration = registry.register(Histogram(
+    "supabase_request_duration_seconds", "Supabase REST/Storage/Auth calls until response headers",
+    ("service", "table", "operation", "status")))
+llm_request_duration = registry.register(Histogram(
+    "llm_request_duration_seconds", "LLM provider calls; streamed calls until the last chunk",
+    ("provider", "kind", "outcome")))
+llm_request_bytes = registry.register(Histogram(
+    "llm_request_bytes", "Prompt plus system prompt size sent to an LLM provider", ("provider",), SIZE_BUCKETS))
+llm_response_bytes = registry.register(Histogram(
+    "llm_response_bytes", "Text size received from an LLM provider", ("provider",), SIZE_BUCKETS))
+outbound_request_duration = registry.register(Histogram(
+    "http_client_request_duration_seconds", "Outbound aiohttp requests until response headers, per attempt",
+    ("host", "status")))
+operation_duration = registry.register(Histogram(
+    "operation_duration_seconds", "Internal stages timed with metrics.trace()", ("operation",)))
+
+
+def cache_families(caches: Dict[str, Dict]) -> List[Family]:
+    """Families for caches whose stats() report hits/misses (and optionally evictions/size)"""
+    families = [
+        ("cache_hits", "counter", "Cache lookups answered from the cache", []),
+        ("cache_misses", "counter", "Cache lookups that fell through", []),
+        ("cache_evictions", "counter", "Entries evicted to respect the size bound", []),
+        ("cache_entries", "gauge", "Entries currently cached", []),
+    ]
+    for cache, stats in caches.items():
+        labels = {"cache": cache}
+        families[0][3].append((labels, stats.get("hits", 0)))
+        families[1][3].append((labels, stats.get("misses", 0)))
+        if "evictions" in stats:
+            families[2][3].append((labels, stats["evictions"]))
+        if "size" in stats:
+            families[3][3].append((labels, stats["size"]))
+    return families
+
+
+# Tracing: spans nest through a context variable, so the Supabase and LLM spans
+# started while a request is served share its trace id.
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "status")
+
+    def __init__(self, name: str, parent: Optional["Span"], attributes: Dict):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else f"{random.getrandbits(128):032x}"
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent.span_id if parent else None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes
+        self.status = "OK"
+
+    def set_attribute(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "attributes": self.attributes,
+            "status": self.status,
+        }
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class _SpanExporter:
+    def __init__(self, path: str):
+        self._file = open(path, "a", buffering=1, encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(line + "\n")
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+_exporter: Optional[_SpanExporter] = None
+if TRACE_EXPORT_PATH:
+    try:
+        _exporter = _SpanExporter(TRACE_EXPORT_PATH)
+    except OSError as e:
+        logging.exception(f"Span export disabled: {e}")
+
+
+def _finish(span: Span) -> None:
+    span.end_ns = time.time_ns()
+    if _exporter is not None:
+        _exporter.export(span)
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Span]:
+    """A span around the block, child of the current one"""
+    current = Span(name, _current_span.get(), attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.status = "ERROR"
+        current.attributes.setdefault("error", repr(e))
+        raise
+    finally:
+        _current_span.reset(token)
+        _finish(current)
+
+
+@contextmanager
+def trace(operation: str, **attributes) -> Iterator[Span]:
+    """span() that also records the block's duration in operation_duration_seconds"""
+    started = time.perf_counter()
+    try:
+        with span(operation, **attributes) as current:
+            yield current
+    finally:
+        operation_duration.observe(time.perf_counter() - started, operation=operation)
+
+
+def record_span(name: str, start_ns: int, end_ns: int, status: str = "OK", **attributes) -> None:
+    """Export an already finished operation (e.g. timed by client hooks) under the current span"""
+    if _exporter is None:
+        return
+    finished = Span(name, _current_span.get(), attributes)
+    finished.start_ns, finished.end_ns, finished.status = start_ns, end_ns, status
+    _exporter.export(finished)
+
+
+def close_tracing() -> None:
+    global _exporter
+    if _exporter is not None:
+        _exporter.close()
+        _exporter = None
+
+
+_route_paths: Dict[Callable, str] = {}
+
+
+def _route_template(scope) -> str:
+    endpoint = scope.get("endpoint")
+    app = scope.get("app")
+    if endpoint is None or app is None:
+        return "unmatched"  # 404s are not split by path, which is unbounded
+    path = _route_paths.get(endpoint)
+    if path is None:
+        path = next((route.path for route in app.routes if getattr(route, "endpoint", None) is endpoint), "unmatched")
+        _route_paths[endpoint] = path
+    return path
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing each request (streamed bodies included) by route template and status"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        method = scope["method"]
+        started = time.perf_counter()
+        with span(f"{method} {scope['path']}", **{"http.method": method, "http.target": scope["path"]}) as current:
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                route = _route_template(scope)
+                current.name = f"{method} {route}"
+                current.set_attribute("http.route", route)
+                current.set_attribute("http.status_code", status)
+                if status >= 500:
+                    current.status = "ERROR"
+                http_request_duration.observe(time.perf_counter() - started,
+                                              method=method, route=route, status=str(status))
@@ -0,0 +1,230 @@
+# utils/minhash.py
+import json
+import logging
+import os
+import re
+import threading
+import time
+import zlib
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64(0xFFFFFFFF)
+SHINGLE_BLOCK = 4096  # shingles hashed per numpy pass, bounds the (perms, block) scratch matrix
+MAX_BUCKET_MEMBERS = 256  # members of one LSH bucket compared pairwise when clustering
+
+
+def shingles(text: Optional[str], words: int = 3) -> np.ndarray:
+    """Distinct 32-bit hashes of the word `words`-grams of text (the words themselves for shorter texts)."""
+    tokens = _TOKEN.findall((text or "").lower())
+    if len(tokens) < words:
+        grams = tokens
+    else:
+        grams = [" ".join(tokens[i:i + words]) for i in range(len(tokens) - words + 1)]
+    return np.unique(np.fromiter((zlib.crc32(gram.encode()) for gram in grams), dtype=np.uint64, count=len(grams)))
+
+
+class MinHashLSH:
+    """MinHash signatures of project texts with banded locality-sensitive hashing.
+
+    Each document becomes `num_perm` 32-bit minimums over its word shingles; two
+    signatures agree in a position with probability equal to the documents' Jaccard
+    similarity. Signatures are split into `bands` bands and every band is hashed to
+    a bucket, so a lookup only compares against documents sharing at least one bucket:
+    roughly constant work per query however large the corpus is. With 16 bands of 8
+    rows, pairs at Jaccard 0.7 collide with probability ~0.9 and pairs at 0.4 with ~0.01.
+
+    Only the signatures are persisted (num_perm * 4 bytes per document, plus keys);
+    the buckets are rebuilt from them on open().
+    """
+
+    def __init__(self, directory: str, num_perm: int = 128, bands: int = 16, shingle_words: int = 3, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.directory = directory
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        self.shingle_words = shingle_words
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+        # a * x stays below 2**64 for 32-bit shingle hashes
+        self._a = rng.integers(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._lock = threading.Lock()
+        self._signatures = np.empty((0, num_perm), dtype=np.uint32)
+        self._count = 0
+        self._keys: List[Any] = []
+        self._positions: Dict[Any, int] = {}
+        self._buckets: List[Dict[bytes, List[int]]] = [defaultdict(list) for _ in range(bands)]
+        self._dirty = False
+        self._saved_at: Optional[float] = None
+
+    @property
+    def config(self) -> Dict:
+        return {"num_perm": self.num_perm, "bands": self.bands, "shingle_words": self.shingle_words, "seed": self.seed}
+
+    @property
+    def dirty(self) -> bool:
+        return self._dirty
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self._positions
+
+    def signature(self, text: Optional[str]) -> Optional[np.ndarray]:
+        """MinHash signature of text, None if it has no words."""
+        hashes = shingles(text, self.shingle_words)
+        if not len(hashes):
+            return None
+        signature = np.full(self.num_perm, _MAX_HASH, dtype=np.uint64)
+        for start in range(0, len(hashes), SHINGLE_BLOCK):
+            block = hashes[start:start + SHINGLE_BLOCK]
+            permuted = ((self._a[:, None] * block[None, :] + self._b[:, None]) % _PRIME) & _MAX_HASH
+            np.minimum(signature, permuted.min(axis=1), out=signature)
+        return signature.astype(np.uint32)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[band * self.rows_per_band:(band + 1) * self.rows_per_band].tobytes()
+                for band in range(self.bands)]
+
+    def _candidates(self, signature: np.ndarray) -> List[int]:
+        found = set()
+        for buckets, band_key in zip(self._buckets, self._band_keys(signature)):
+            found.update(buckets.get(band_key, ()))
+        return sorted(found)
+
+    def query(self, signature: np.ndarray, threshold: float = 0.5, exclude: Any = None) -> List[Tuple[Any, float]]:
+        """(key, estimated Jaccard similarity) of indexed documents at or above threshold, best first."""
+        with self._lock:
+            candidates = self._candidates(signature)
+            if not candidates:
+                return []
+            estimates = (self._signatures[candidates] == signature).mean(axis=1)
+            keys = [self._keys[i] for i in candidates]
+        matches = [(key, float(estimate)) for key, estimate in zip(keys, estimates)
+                   if estimate >= threshold and key != exclude]
+        return sorted(matches, key=lambda match: -match[1])
+
+    def add(self, key: Any, signature: np.ndarray) -> None:
+        """Index a signature under key; re-adding a key replaces its signature."""
+        with self._lock:
+            position = self._positions.get(key)
+            if position is not None:
+                for buckets, band_key in zip(self._buckets, self._band_keys(self._signatures[position])):
+                    members = buckets.get(band_key)
+                    if members and position in members:
+                        members.remove(position)
+            else:
+                position = self._count
+                if position == len(self._signatures):
+                    grown = np.empty((max(1024, 2 * position), self.num_perm), dtype=np.uint32)
+                    grown[:position] = self._signatures[:position]
+                    self._signatures = grown
+                self._count += 1
+                self._keys.append(key)
+                self._positions[key] = position
+            self._signatures[position] = signature
+            for buckets, band_key in zip(self._buckets, self._band_keys(signature)):
+                buckets[band_key].append(position)
+            self._dirty = True
+
+    def clusters(self, threshold: float = 0.5) -> List[Dict]:
+        """Groups of documents linked by pairs at or above threshold, largest first.
+
+        Only pairs sharing an LSH bucket are compared, so this costs about the number of
+        colliding pairs rather than n squared. Each cluster is {"keys", "similarity"},
+        similarity being the highest pair estimate inside it.
+        """
+        with self._lock:
+            signatures = self._signatures[:self._count]
+            keys = list(self._keys)
+            buckets = [list(members) for band in self._buckets for members in band.values() if len(members) > 1]
+        parent = list(range(len(keys)))
+
+        def find(i: int) -> int:
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        best: Dict[int, float] = {}
+        seen = set()
+        for members in buckets:
+            members = members[:MAX_BUCKET_MEMBERS]
+            block = signatures[members]
+            estimates = (block[:, None, :] == block[None, :, :]).mean(axis=2)
+            for i, j in zip(*np.nonzero(np.triu(estimates >= threshold, k=1))):
+                a, b = members[i], members[j]
+                if (a, b) in seen:
+                    continue
+                seen.add((a, b))
+                root_a, root_b = find(a), find(b)
+                similarity = max(float(estimates[i, j]), best.get(root_a, 0), best.get(root_b, 0))
+                parent[root_b] = root_a
+                best[root_a] = similarity
+        groups: Dict[int, List[Any]] = defaultdict(list)
+        for position in range(len(keys)):
+            groups[find(position)].append(keys[position])
+        found = [{"keys": members, "similarity": round(best[root], 3)}
+                 for root, members in groups.items() if len(members) > 1]
+        return sorted(found, key=lambda cluster: (-len(cluster["keys"]), -cluster["similarity"]))
+
+    def save(self) -> None:
+        """Write signatures and keys atomically; a no-op when nothing changed since the last save."""
+        with self._lock:
+            if not self._dirty:
+                return
+            signatures = self._signatures[:self._count].copy()
+            keys = list(self._keys)
+            self._dirty = False
+        os.makedirs(self.directory, exist_ok=True)
+        for name, write in (
+            ("signatures.npy", lambda f: np.save(f, signatures)),
+            ("keys.json", lambda f: f.write(json.dumps(keys, default=str).encode())),
+            ("meta.json", lambda f: f.write(json.dumps({**self.config, "rows": len(keys)}).encode())),
+        ):
+            path = os.path.join(self.directory, name)
+            with open(path + ".tmp", "wb") as f:
+                write(f)
+            os.replace(path + ".tmp", path)
+        self._saved_at = time.time()
+
+    def open(self) -> bool:
+        """Load the saved signatures. False if there are none or they were made with another config."""
+        try:
+            with open(os.path.join(self.directory, "meta.json")) as f:
+                meta = json.load(f)
+            if {key: meta.get(key) for key in self.config} != self.config:
+                logging.info(f"Duplicate index in {self.directory} has another configuration; rebuilding")
+                return False
+            with open(os.path.join(self.directory, "keys.json")) as f:
+                keys = json.load(f)
+            signatures = np.load(os.path.join(self.directory, "signatures.npy"), allow_pickle=False)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"Duplicate index in {self.directory} not reused: {e}")
+            return False
+        if len(keys) != len(signatures):
+            logging.warning(f"Duplicate index in {self.directory} is inconsistent; rebuilding")
+            return False
+        for key, signature in zip(keys, signatures):
+            self.add(key, signature)
+        self._dirty = False
+        return True
+
+    def stats(self) -> Dict:
+        return {
+            "rows": self._count,
+            **self.config,
+            "directory": self.directory,
+            "unsaved_changes": self._dirty,
+            "saved_at": self._saved_at,
+        }
@@ -0,0 +1,35 @@
+# utils/pagination.py
+import base64
+import hashlib
+import json
+from typing import Dict, Iterable, Optional
+
+
+def encode_cursor(state: Dict) -> str:
+    """Opaque, URL-safe cursor for the given pagination state."""
+    raw = json.dumps(state, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Dict:
+    """Inverse of encode_cursor. Raises ValueError for anything it did not produce."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        state = json.loads(raw)
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(state, dict):
+        raise ValueError("Invalid cursor")
+    return state
+
+
+def fingerprint(*parts) -> str:
+    """Short digest tying a cursor to the request that produced it."""
+    return hashlib.sha1(json.dumps(parts, default=str).encode()).hexdigest()[:12]
+
+
+def project_fields(row: Dict, fields: Optional[Iterable[str]]) -> Dict:
+    """Keep only the requested columns of a row; None or "*" keeps everything."""
+    if fields is None or "*" in fields:
+        return row
+    return {field: row[field] for field in fields if field in row}
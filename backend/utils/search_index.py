@@ -0,0 +1,192 @@
+# utils/search_index.py
+import heapq
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from rapidfuzz import fuzz, process
+
+PAGE_SIZE = 1000  # PostgREST caps responses at 1000 rows by default
+
+
+def normalize(text: Optional[str]) -> str:
+    """Lowercase and token-sort, so fuzz.ratio on two normalized strings equals
+    fuzz.token_sort_ratio on the originals."""
+    return " ".join(sorted((text or "").lower().split()))
+
+
+def _entry_size(row: Dict, title: str, abstract: str) -> int:
+    """Rough number of bytes held for one indexed project."""
+    size = sys.getsizeof(row) + sys.getsizeof(title) + sys.getsizeof(abstract)
+    for key, value in row.items():
+        size += sys.getsizeof(key) + sys.getsizeof(value)
+    return size
+
+
+def row_key(row: Dict) -> Any:
+    return row.get("id") or row.get("file_url")
+
+
+def rank(query: str, rows: List[Dict], titles: List[str], abstracts: List[str],
+         threshold: float = 60, limit: Optional[int] = None) -> List[Tuple[float, Dict]]:
+    """Score a normalized corpus in one batched call and return (score, row) pairs.
+
+    A project scores the better of its title and abstract token_sort_ratio.
+    Results are ordered by score, ties keeping corpus order; with a limit only
+    the best `limit` are selected via a heap instead of sorting every match.
+    """
+    if not rows:
+        return []
+    query = normalize(query)
+    title_scores = process.cdist([query], titles, scorer=fuzz.ratio, score_cutoff=threshold,
+                                 dtype=np.float64, workers=-1)[0]
+    abstract_scores = process.cdist([query], abstracts, scorer=fuzz.ratio, score_cutoff=threshold,
+                                    dtype=np.float64, workers=-1)[0]
+    scores = np.maximum(title_scores, abstract_scores)
+    candidates = np.flatnonzero(scores >= threshold)
+    if limit is not None and limit < len(candidates):
+        candidates = heapq.nlargest(limit, candidates, key=lambda i: (scores[i], -i))
+    else:
+        candidates = sorted(candidates, key=lambda i: (-scores[i], i))
+    return [(float(scores[i]), rows[i]) for i in candidates]
+
+
+def rank_rows(query: str, rows: List[Dict], threshold: float = 60, limit: Optional[int] = None) -> List[Tuple[float, Dict]]:
+    """rank() for rows that are not in an index, e.g. database candidates."""
+    titles = [normalize(row.get("project_title")) for row in rows]
+    abstracts = [normalize(row.get("abstract")) for row in rows]
+    return rank(query, rows, titles, abstracts, threshold, limit)
+
+
+class ProjectSearchIndex:
+    """Process-resident copy of project_data titles/abstracts for fuzzy search.
+
+    The index is loaded once, then kept current either by add() from the upload
+    endpoint or by refresh(), which only fetches rows created since the newest
+    created_at already seen.
+    """
+
+    def __init__(self, table: str = "project_data"):
+        self.table = table
+        self._lock = threading.Lock()
+        # Parallel lists, replaced rather than mutated so entries() snapshots stay valid
+        self._rows: List[Dict] = []
+        self._titles: List[str] = []
+        self._abstracts: List[str] = []
+        self._positions: Dict[Any, int] = {}
+        self._bytes = 0
+        self._watermark: Optional[str] = None
+        self._loaded_at: Optional[float] = None
+        self._refreshed_at: Optional[float] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded_at is not None
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _fetch(self, supabase, since: Optional[str] = None) -> List[Dict]:
+        rows = []
+        start = 0
+        while True:
+            query = supabase.table(self.table).select("*")
+            if since:
+                # gte rather than gt: rows sharing the watermark timestamp are de-duplicated by id
+                query = query.gte("created_at", since)
+            # One order= parameter (chained order() calls send one each and PostgREST reads only
+            # one, leaving ties unordered across pages); limit/offset rather than range():
+            # postgrest-py 0.13 treats range()'s end as exclusive
+            query.params = query.params.add("order", "created_at,id")
+            response = query.limit(PAGE_SIZE).offset(start).execute()
+            page = response.data or []
+            rows.extend(page)
+            if len(page) < PAGE_SIZE:
+                return rows
+            start += PAGE_SIZE
+
+    def load(self, supabase) -> int:
+        """Replace the index contents with a full read of the table."""
+        rows = self._fetch(supabase)
+        with self._lock:
+            self._rows, self._titles, self._abstracts = [], [], []
+            self._positions, self._bytes, self._watermark = {}, 0, None
+            self._put_many(rows)
+            self._loaded_at = self._refreshed_at = time.time()
+        return len(rows)
+
+    def refresh(self, supabase) -> int:
+        """Fetch rows created since the last watermark. Returns the number of new rows."""
+        if not self.loaded:
+            return self.load(supabase)
+        rows = self._fetch(supabase, since=self._watermark)
+        with self._lock:
+            added = self._put_many(rows)
+            self._refreshed_at = time.time()
+        return added
+
+    def add(self, row: Dict) -> None:
+        """Index a freshly inserted row without going back to the database."""
+        self.add_many([row])
+
+    def add_many(self, rows: List[Dict]) -> None:
+        """add() for a batch, copying the corpus lists once rather than once per row."""
+        with self._lock:
+            self._put_many(rows)
+
+    def _put_many(self, new_rows: List[Dict]) -> int:
+        # Copy-on-write: a search still iterating the previous lists is unaffected
+        rows, titles, abstracts = list(self._rows), list(self._titles), list(self._abstracts)
+        added = 0
+        for row in new_rows:
+            row = dict(row)
+            title = normalize(row.get("project_title"))
+            abstract = normalize(row.get("abstract"))
+            key = row_key(row)
+            position = self._positions.get(key) if key is not None else None
+            if position is None:
+                if key is not None:
+                    self._positions[key] = len(rows)
+                rows.append(row)
+                titles.append(title)
+                abstracts.append(abstract)
+                added += 1
+            else:
+                self._bytes -= _entry_size(rows[position], titles[position], abstracts[position])
+                rows[position], titles[position], abstracts[position] = row, title, abstract
+            self._bytes += _entry_size(row, title, abstract)
+            created_at = row.get("created_at")
+            if created_at and (self._watermark is None or created_at > self._watermark):
+                self._watermark = created_at
+        self._rows, self._titles, self._abstracts = rows, titles, abstracts
+        return added
+
+    def entries(self) -> Tuple[List[Dict], List[str], List[str]]:
+        """Consistent snapshot of (rows, normalized titles, normalized abstracts)."""
+        with self._lock:
+            return self._rows, self._titles, self._abstracts
+
+    def get(self, key: Any) -> Optional[Dict]:
+        """The indexed row with this id (or file_url), if any."""
+        with self._lock:
+            position = self._positions.get(key)
+            return self._rows[position] if position is not None else None
+
+    def top_matches(self, query: str, threshold: float = 60, limit: Optional[int] = None) -> List[Tuple[float, Dict]]:
+        """Rank the whole indexed corpus against query, see rank()."""
+        rows, titles, abstracts = self.entries()
+        return rank(query, rows, titles, abstracts, threshold, limit)
+
+    def stats(self) -> Dict:
+        now = time.time()
+        return {
+            "loaded": self.loaded,
+            "rows": len(self._rows),
+            "memory_bytes": self._bytes,
+            "watermark": self._watermark,
+            "loaded_at": self._loaded_at,
+            "refreshed_at": self._refreshed_at,
+            "staleness_seconds": round(now - self._refreshed_at, 3) if self._refreshed_at else None,
+        }
@@ -0,0 +1,244 @@
+# utils/storage.py
+import io
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from email.utils import formatdate
+from typing import AsyncIterator, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote
+
+import aiohttp
+
+from utils.executor import run_blocking
+from utils.http_session import HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, get_http_session
+from utils.supabase_client import get_supabase_client
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "supabase")  # "supabase" or "local"
+LOCAL_STORAGE_DIR = os.getenv("LOCAL_STORAGE_DIR", "storage")
+COPY_CHUNK_BYTES = 1024 * 1024
+
+
+# Response headers relayed to the client on streamed downloads
+PASSTHROUGH_HEADERS = ("Content-Length", "Content-Range", "Accept-Ranges", "ETag", "Last-Modified")
+
+
+class StorageError(Exception):
+    pass
+
+
+class ObjectNotFound(StorageError):
+    pass
+
+
+class ObjectStream:
+    """An object body being read: status (200/206/304/416), headers to relay, and chunks.
+
+    close() must be called if chunks is not consumed to the end.
+    """
+
+    def __init__(self, status: int, headers: Dict[str, str], chunks: AsyncIterator[bytes],
+                 close: Optional[Callable[[], None]] = None):
+        self.status = status
+        self.headers = headers
+        self.chunks = chunks
+        self._close = close
+
+    def close(self) -> None:
+        if self._close:
+            self._close()
+
+
+@contextmanager
+def disk_reader(fileobj: BinaryIO) -> Iterator[BinaryIO]:
+    """fileobj as a BufferedReader over a file on disk, copying it to a named temporary file
+    unless it already is one.
+
+    storage3's upload() only streams a BufferedReader or FileIO (or takes bytes); any other
+    object, such as a SpooledTemporaryFile or a zip member, is passed to open() and fails.
+    """
+    if isinstance(fileobj, (io.BufferedReader, io.FileIO)):
+        yield fileobj
+        return
+    with tempfile.NamedTemporaryFile(prefix="upload-") as tmp:
+        shutil.copyfileobj(fileobj, tmp, COPY_CHUNK_BYTES)
+        tmp.flush()
+        with open(tmp.name, "rb") as reader:
+            yield reader
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Inclusive (start, end) for a single "bytes=" range, None to send everything.
+
+    Raises ValueError when the range cannot be satisfied; multi-range requests
+    are answered with the whole object.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start, _, end = header[6:].strip().partition("-")
+    try:
+        if start == "":
+            length = int(end)
+            if length <= 0:
+                raise ValueError("empty suffix range")
+            return max(0, size - length), size - 1
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    except ValueError:
+        raise ValueError(f"Unsatisfiable range {header}")
+    if start >= size or start > end:
+        raise ValueError(f"Unsatisfiable range {header}")
+    return start, end
+
+
+class SupabaseObjectStore:
+    """Objects in a Supabase Storage bucket."""
+
+    def __init__(self, bucket: str):
+        self.bucket = bucket
+
+    def upload_file(self, key: str, fileobj: BinaryIO, content_type: Optional[str]) -> Dict:
+        """Upload from an open binary file; httpx sends it in chunks rather than as one buffer."""
+        with disk_reader(fileobj) as reader:
+            response = get_supabase_client().storage.from_(self.bucket).upload(
+                key,
+                reader,
+                file_options={"content-type": content_type or "application/octet-stream"}
+            )
+        # Depending on the storage3 version this is an UploadResponse (path/full_path)
+        # or the raw httpx response
+        path = getattr(response, 'path', None)
+        full_path = getattr(response, 'full_path', None)
+        if not (path or full_path) and getattr(response, 'status_code', None) == 200:
+            path, full_path = key, f"{self.bucket}/{key}"
+        if not (path or full_path):
+            raise StorageError(getattr(response, 'error', None) or str(response))
+        return {"path": path, "full_path": full_path}
+
+    def download(self, key: str) -> bytes:
+        return get_supabase_client().storage.from_(self.bucket).download(key)
+
+    def remove(self, keys: List[str]) -> None:
+        get_supabase_client().storage.from_(self.bucket).remove(keys)
+
+    async def open_stream(self, key: str, request_headers: Dict[str, str]) -> ObjectStream:
+        """GET the object from the Storage API, forwarding Range/If-None-Match and passing the body through."""
+        service_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+        url = f"{os.getenv('SUPABASE_URL')}/storage/v1/object/{self.bucket}/{quote(key)}"
+        headers = {**request_headers, "apikey": service_key, "Authorization": f"Bearer {service_key}"}
+        # No total timeout: large bodies may take a while, but each read must make progress
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=HTTP_CONNECT_TIMEOUT, sock_read=HTTP_READ_TIMEOUT)
+        resp = await get_http_session().get(url, headers=headers, timeout=timeout)
+        if resp.status >= 400 and resp.status != 416:
+            message = (await resp.text())[:500]
+            resp.release()
+            if resp.status in (400, 404):
+                raise ObjectNotFound(message)
+            raise StorageError(f"Storage returned {resp.status}: {message}")
+
+        async def chunks():
+            try:
+                async for chunk in resp.content.iter_chunked(COPY_CHUNK_BYTES):
+                    yield chunk
+            finally:
+                resp.release()
+
+        headers = {name: resp.headers[name] for name in PASSTHROUGH_HEADERS if name in resp.headers}
+        return ObjectStream(resp.status, headers, chunks(), resp.release)
+
+    def signed_url(self, key: str, expires_in: int) -> Optional[str]:
+        data = get_supabase_client().storage.from_(self.bucket).create_signed_url(key, expires_in)
+        return data.get("signedURL") or data.get("signedUrl")
+
+
+class LocalObjectStore:
+    """Objects as files under a local directory; a stand-in for Supabase Storage in development and benchmarks."""
+
+    def __init__(self, bucket: str, root: str = LOCAL_STORAGE_DIR):
+        self.bucket = bucket
+        self.root = os.path.abspath(os.path.join(root, bucket))
+        os.makedirs(self.root, exist_ok=True)
+
+    def path_for(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, key))
+        if os.path.commonpath([path, self.root]) != self.root:
+            raise StorageError(f"Invalid object key: {key}")
+        return path
+
+    def upload_file(self, key: str, fileobj: BinaryIO, content_type: Optional[str]) -> Dict:
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as out:
+            shutil.copyfileobj(fileobj, out, COPY_CHUNK_BYTES)
+        return {"path": key, "full_path": f"{self.bucket}/{key}"}
+
+    def download(self, key: str) -> bytes:
+        try:
+            with open(self.path_for(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            raise ObjectNotFound(f"Object not found: {key}")
+
+    def remove(self, keys: List[str]) -> None:
+        for key in keys:
+            try:
+                os.remove(self.path_for(key))
+            except FileNotFoundError:
+                pass
+
+    async def open_stream(self, key: str, request_headers: Dict[str, str]) -> ObjectStream:
+        path = self.path_for(key)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            raise ObjectNotFound(f"Object not found: {key}")
+        size = st.st_size
+        headers = {
+            "ETag": f'"{size:x}-{st.st_mtime_ns:x}"',
+            "Last-Modified": formatdate(st.st_mtime, usegmt=True),
+            "Accept-Ranges": "bytes",
+        }
+        if_none_match = request_headers.get("If-None-Match")
+        if if_none_match and headers["ETag"] in [tag.strip() for tag in if_none_match.split(",")]:
+            return ObjectStream(304, headers, _no_chunks())
+        try:
+            byte_range = parse_range(request_headers.get("Range"), size)
+        except ValueError:
+            return ObjectStream(416, {**headers, "Content-Range": f"bytes */{size}"}, _no_chunks())
+        status, (start, end) = (206, byte_range) if byte_range else (200, (0, size - 1))
+        if status == 206:
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+        return ObjectStream(status, headers, _read_file(path, start, end - start + 1))
+
+    def signed_url(self, key: str, expires_in: int) -> Optional[str]:
+        return None  # nothing to redirect to; callers stream instead
+
+
+async def _no_chunks():
+    return
+    yield
+
+
+async def _read_file(path: str, offset: int, length: int):
+    with open(path, "rb") as f:
+        f.seek(offset)
+        while length > 0:
+            chunk = await run_blocking(f.read, min(COPY_CHUNK_BYTES, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+_stores = {}
+
+
+def get_object_store(bucket: Optional[str] = None):
+    bucket = bucket or os.getenv("SUPABASE_BUCKET_NAME", "project-files")
+    if bucket not in _stores:
+        if STORAGE_BACKEND == "local":
+            _stores[bucket] = LocalObjectStore(bucket)
+        else:
+            _stores[bucket] = SupabaseObjectStore(bucket)
+    return _stores[bucket]
@@ -1,14 +1,155 @@
 from dotenv import load_dotenv
-from supabase import create_client
+from supabase import create_client, Client
+from supabase.lib.client_options import ClientOptions
+import logging
 import os
+import threading
+import time
 
-load_dotenv()  
+from utils import metrics
 
-def get_supabase_client():
-    url = os.getenv("SUPABASE_URL")
-    key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+load_dotenv()
 
-    if not url or not key:
-        raise RuntimeError("Missing SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY in .env")
+# One long-lived client per key. Each keeps its PostgREST and Storage sub-clients,
+# and with them their keep-alive httpx connection pools, for the life of the process.
+_clients = {}
+_lock = threading.Lock()
+_stats = {}
 
-    return create_client(url, key)
+
+def _new_stats():
+    return {"created": 0, "acquired": 0, "requests": 0, "connections_opened": 0}
+
+
+def _describe(request):
+    """(service, table, operation) for a Supabase API request"""
+    parts = [part for part in request.url.path.split("/") if part]
+    service = parts[0] if parts else ""
+    rest = parts[2:]  # after e.g. "rest", "v1"
+    if service == "rest":
+        if rest[:1] == ["rpc"]:
+            return "postgrest", rest[1] if len(rest) > 1 else "", "rpc"
+        operation = {"GET": "select", "HEAD": "count", "POST": "insert",
+                     "PATCH": "update", "PUT": "upsert", "DELETE": "delete"}.get(request.method, request.method)
+        if request.method == "POST" and "resolution=merge-duplicates" in request.headers.get("prefer", ""):
+            operation = "upsert"
+        return "postgrest", rest[0] if rest else "", operation
+    if service == "storage":
+        # /storage/v1/object/[sign/]<bucket>/<key>
+        if rest[:1] == ["object"]:
+            rest = rest[1:]
+            action = {"POST": "upload", "PUT": "update", "GET": "download",
+                      "HEAD": "info", "DELETE": "delete"}.get(request.method, request.method)
+            if rest[:1] in (["sign"], ["public"], ["authenticated"]):
+                action, rest = rest[0], rest[1:]
+            return "storage", rest[0] if rest else "", action
+        return "storage", "", "/".join(rest[:1])
+    return service, "", "/".join(rest[:1])
+
+
+def _instrument(session, stats=None):
+    """Count requests and new TCP connections so pool reuse shows up in stats, and time
+    each call into supabase_request_duration_seconds"""
+    def trace(event_name, info):
+        if event_name == "connection.connect_tcp.complete":
+            stats["connections_opened"] += 1
+
+    def on_request(request):
+        request.extensions["metrics_start"] = (time.perf_counter(), time.time_ns())
+        if stats is not None:
+            stats["requests"] += 1
+            request.extensions["trace"] = trace
+
+    def on_response(response):
+        started = response.request.extensions.get("metrics_start")
+        if started is None:
+            return
+        service, table, operation = _describe(response.request)
+        metrics.supabase_request_duration.observe(time.perf_counter() - started[0], service=service, table=table,
+                                                  operation=operation, status=str(response.status_code))
+        metrics.record_span(f"supabase {service} {operation} {table}".rstrip(), started[1], time.time_ns(),
+                            status="ERROR" if response.status_code >= 500 else "OK",
+                            **{"http.status_code": response.status_code, "db.table": table})
+
+    session.event_hooks = {"request": [on_request], "response": [on_response]}
+
+
+def _instrument_auth(client: Client, stats=None):
+    http_client = getattr(client.auth, "_http_client", None)
+    if http_client is not None:
+        _instrument(http_client, stats)
+
+
+def _options() -> ClientOptions:
+    # Pooled clients never sign in, so there is no session to persist or refresh.
+    # A fresh ClientOptions also avoids sharing create_client's mutable default headers.
+    return ClientOptions(auto_refresh_token=False, persist_session=False)
+
+
+def _key(kind: str) -> str:
+    return os.getenv("SUPABASE_SERVICE_ROLE_KEY") if kind == "service" else os.getenv("SUPABASE_ANON_KEY")
+
+
+def _get_client(kind: str) -> Client:
+    client = _clients.get(kind)
+    if client is None:
+        with _lock:
+            client = _clients.get(kind)
+            if client is None:
+                url = os.getenv("SUPABASE_URL")
+                key = _key(kind)
+                if not url or not key:
+                    name = "SUPABASE_SERVICE_ROLE_KEY" if kind == "service" else "SUPABASE_ANON_KEY"
+                    raise RuntimeError(f"Missing SUPABASE_URL or {name} in .env")
+                client = create_client(url, key, _options())
+                stats = _stats.setdefault(kind, _new_stats())
+                _instrument(client.postgrest.session, stats)
+                _instrument(client.storage.session, stats)
+                _instrument_auth(client, stats)
+                stats["created"] += 1
+                _clients[kind] = client
+    _stats[kind]["acquired"] += 1
+    return client
+
+
+def get_supabase_client() -> Client:
+    """Shared service-role client (bypasses RLS)"""
+    return _get_client("service")
+
+
+def get_anon_client() -> Client:
+    """Shared anon-key client"""
+    return _get_client("anon")
+
+
+def new_auth_client() -> Client:
+    """Short-lived client for sign_in/sign_up.
+
+    Signing in stores the user's session on the client and switches its database
+    identity to that user, so those calls must never run on a shared client.
+    """
+    client = create_client(os.getenv("SUPABASE_URL"), _key("service"), _options())
+    _instrument_auth(client)
+    return client
+
+
+def init_clients():
+    """Build the shared clients up front (called from the app lifespan)"""
+    for kind in ("service", "anon"):
+        if _key(kind):
+            try:
+                _get_client(kind)
+            except Exception as e:
+                logging.exception(f"Could not create {kind} Supabase client: {e}")
+
+
+def close_clients():
+    with _lock:
+        for client in _clients.values():
+            client.postgrest.session.close()
+            client.storage.session.close()
+        _clients.clear()
+
+
+def client_stats():
+    return {kind: dict(stats) for kind, stats in _stats.items()}
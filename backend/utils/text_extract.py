@@ -0,0 +1,128 @@
+# utils/text_extract.py
+import html
+import importlib.util
+import logging
+import os
+import re
+import zipfile
+import zlib
+from typing import BinaryIO, List
+
+MAX_TEXT_CHARS = int(os.getenv("MAX_TEXT_CHARS", "2000000"))
+
+PLAIN_EXTENSIONS = (".txt", ".md", ".markdown", ".rst", ".csv", ".tex", ".json", ".html", ".htm")
+# Office Open XML / OpenDocument: zip archives whose text sits in these members
+OFFICE_MEMBERS = {
+    ".docx": re.compile(r"word/(document|footnotes|endnotes)\.xml$"),
+    ".pptx": re.compile(r"ppt/slides/slide\d+\.xml$"),
+    ".odt": re.compile(r"content\.xml$"),
+    ".odp": re.compile(r"content\.xml$"),
+}
+SUPPORTED_EXTENSIONS = PLAIN_EXTENSIONS + tuple(OFFICE_MEMBERS) + (".pdf", ".doc")
+
+_BREAKS = re.compile(r"</(?:w:p|a:p|text:p|text:h)>|<w:br/>|<w:tab/>")
+_TAGS = re.compile(r"<[^>]+>")
+_PDF_STREAM = re.compile(rb"<<(.*?)>>\s*stream\r?\n(.*?)\r?\nendstream", re.S)
+_PDF_TEXT = re.compile(rb"\[(.*?)\]\s*TJ|\((.*?)(?<!\\)\)\s*(?:Tj|'|\")", re.S)
+_PDF_ARRAY_ITEM = re.compile(rb"\((.*?)(?<!\\)\)|(-?\d+(?:\.\d+)?)", re.S)
+PDF_WORD_GAP = 200  # TJ offsets (thousandths of an em) wide enough to stand for a space
+_PDF_ESCAPES = {b"n": b"\n", b"r": b"\r", b"t": b"\t", b"b": b"\b", b"f": b"\f"}
+_DOC_RUNS = re.compile(rb"(?:[\x20-\x7e]\x00){4,}|[\x20-\x7e\t\r\n]{4,}")
+_SPACES = re.compile(r"[ \t\r\f\v]+")
+
+
+def extract_text(fileobj: BinaryIO, filename: str, max_chars: int = MAX_TEXT_CHARS) -> str:
+    """Plain text of an uploaded file, chosen by its extension; "" for unsupported or unreadable files.
+
+    Everything is parsed locally. PDFs go through pypdf when it is installed and
+    otherwise through a small parser for the text operators of uncompressed and
+    Flate-compressed content streams.
+    """
+    extension = os.path.splitext(filename or "")[1].lower()
+    try:
+        if extension in PLAIN_EXTENSIONS:
+            text = fileobj.read(max_chars * 4).decode("utf-8", errors="replace")
+            if extension in (".html", ".htm"):
+                text = html.unescape(_TAGS.sub(" ", text))
+        elif extension in OFFICE_MEMBERS:
+            text = _office_text(fileobj, OFFICE_MEMBERS[extension])
+        elif extension == ".pdf":
+            text = _pdf_text(fileobj)
+        elif extension == ".doc":
+            text = _doc_text(fileobj.read())
+        else:
+            return ""
+    except Exception as e:
+        logging.warning(f"Could not extract text from {filename}: {e!r}")
+        return ""
+    return _SPACES.sub(" ", text)[:max_chars].strip()
+
+
+def _office_text(fileobj: BinaryIO, members: re.Pattern) -> str:
+    parts = []
+    with zipfile.ZipFile(fileobj) as archive:
+        for name in sorted(archive.namelist()):
+            if members.match(name):
+                xml = archive.read(name).decode("utf-8", errors="replace")
+                parts.append(html.unescape(_TAGS.sub("", _BREAKS.sub("\n", xml))))
+    return "\n".join(parts)
+
+
+def _pdf_text(fileobj: BinaryIO) -> str:
+    if importlib.util.find_spec("pypdf"):
+        from pypdf import PdfReader
+
+        return "\n".join(page.extract_text() or "" for page in PdfReader(fileobj).pages)
+    return _pdf_streams_text(fileobj.read())
+
+
+def _pdf_unescape(raw: bytes) -> str:
+    out, i = bytearray(), 0
+    while i < len(raw):
+        byte = raw[i:i + 1]
+        if byte != b"\\" or i + 1 == len(raw):
+            out += byte
+            i += 1
+            continue
+        following = raw[i + 1:i + 2]
+        octal = re.match(rb"[0-7]{1,3}", raw[i + 1:i + 4])
+        if octal:
+            out.append(int(octal.group(), 8) & 0xFF)
+            i += 1 + len(octal.group())
+        else:
+            out += _PDF_ESCAPES.get(following, following)
+            i += 2
+    return out.decode("latin-1")
+
+
+def _pdf_streams_text(data: bytes) -> str:
+    lines: List[str] = []
+    for header, body in _PDF_STREAM.findall(data):
+        if b"/FlateDecode" in header:
+            try:
+                body = zlib.decompress(body)
+            except zlib.error:
+                continue
+        elif b"/Filter" in header:
+            continue  # images and other encodings carry no text we can read
+        for array, string in _PDF_TEXT.findall(body):
+            if array:
+                parts = []
+                for part, offset in _PDF_ARRAY_ITEM.findall(array):
+                    if offset:
+                        if -float(offset) >= PDF_WORD_GAP:
+                            parts.append(" ")
+                    else:
+                        parts.append(_pdf_unescape(part))
+                lines.append("".join(parts))
+            else:
+                lines.append(_pdf_unescape(string))
+    return "\n".join(line for line in lines if line.strip())
+
+
+def _doc_text(data: bytes) -> str:
+    """Legacy Word files: runs of printable text, stored either as UTF-16LE or as 8-bit characters."""
+    runs = []
+    for run in _DOC_RUNS.findall(data):
+        runs.append(run.decode("utf-16-le") if b"\x00" in run else run.decode("latin-1"))
+    return "\n".join(runs)
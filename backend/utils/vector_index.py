@@ -0,0 +1,465 @@
+# utils/vector_index.py
+import importlib.util
+import json
+import logging
+import math
+import os
+import re
+import shutil
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+STOP_WORDS = frozenset(
+    "a an and are as at be by can for from has have in into is it its of on or our that the their this "
+    "to using was we which will with".split()
+)
+
+FIT_SAMPLE = 20000  # documents the TF-IDF/SVD model is fitted on
+EMBED_BATCH = 2048
+EXACT_SCAN_ROWS = 4096  # below this one list is scanned in full
+KMEANS_ITERATIONS = 10
+REBUILD_MIN_ROWS = 1000  # appended rows are re-clustered once they pass this and 10% of the index
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return [t for t in _TOKEN.findall((text or "").lower()) if len(t) > 1 and t not in STOP_WORDS]
+
+
+def document(row: Dict) -> str:
+    """Text embedded for a project: its title and abstract."""
+    return f"{row.get('project_title') or ''}\n{row.get('abstract') or ''}"
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return (matrix / norms).astype(np.float32, copy=False)
+
+
+class _Sparse:
+    """Row-normalized TF-IDF rows in CSR form, with the two products randomized SVD needs."""
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray, data: np.ndarray):
+        self.indptr, self.indices, self.data = indptr, indices, data
+        self.rows = len(indptr) - 1
+        self.row_ids = np.repeat(np.arange(self.rows), np.diff(indptr))
+
+    def dot(self, dense: np.ndarray) -> np.ndarray:
+        """self @ dense"""
+        out = np.zeros((self.rows, dense.shape[1]), dtype=np.float64)
+        nonempty = np.flatnonzero(np.diff(self.indptr))
+        if len(nonempty):
+            products = self.data[:, None] * dense[self.indices]
+            out[nonempty] = np.add.reduceat(products, self.indptr[nonempty], axis=0)
+        return out
+
+    def tdot(self, dense: np.ndarray, columns: int) -> np.ndarray:
+        """self.T @ dense"""
+        out = np.zeros((columns, dense.shape[1]), dtype=np.float64)
+        np.add.at(out, self.indices, self.data[:, None] * dense[self.row_ids])
+        return out
+
+
+class TfidfSvdEmbedder:
+    """Latent semantic analysis: TF-IDF over title+abstract terms projected onto the
+    top singular vectors, so projects sharing co-occurring vocabulary ("crop disease"
+    and "plant leaf") land close together even without words in common.
+
+    numpy only; fitted with a randomized SVD on a sample of the corpus.
+    """
+
+    kind = "tfidf"
+
+    def __init__(self, dims: int = 128, max_terms: int = 50000, seed: int = 0):
+        self.dims = dims
+        self.max_terms = max_terms
+        self.seed = seed
+        self.vocabulary: Dict[str, int] = {}
+        self.idf: Optional[np.ndarray] = None
+        self.components: Optional[np.ndarray] = None  # (size, terms); size < dims for tiny corpora
+
+    @property
+    def size(self) -> int:
+        return self.components.shape[0]
+
+    @property
+    def config(self) -> Dict:
+        return {"kind": self.kind, "dims": self.dims}
+
+    def _tfidf(self, texts: Sequence[str]) -> _Sparse:
+        indptr, indices, counts = [0], [], []
+        vocabulary = self.vocabulary
+        for text in texts:
+            terms = Counter(vocabulary[t] for t in tokenize(text) if t in vocabulary)
+            indices.extend(terms.keys())
+            counts.extend(terms.values())
+            indptr.append(len(indices))
+        indptr = np.asarray(indptr, dtype=np.int64)
+        indices = np.asarray(indices, dtype=np.int64)
+        data = (1 + np.log(np.asarray(counts, dtype=np.float64))) * self.idf[indices]
+        matrix = _Sparse(indptr, indices, data)
+        norms = np.sqrt(np.bincount(matrix.row_ids, weights=data ** 2, minlength=matrix.rows))
+        norms[norms == 0] = 1
+        matrix.data = data / norms[matrix.row_ids]
+        return matrix
+
+    def fit(self, texts: Sequence[str]) -> "TfidfSvdEmbedder":
+        rng = np.random.default_rng(self.seed)
+        if len(texts) > FIT_SAMPLE:
+            texts = [texts[i] for i in np.sort(rng.choice(len(texts), FIT_SAMPLE, replace=False))]
+        df = Counter()
+        for text in texts:
+            df.update(set(tokenize(text)))
+        min_df = 2 if len(texts) >= 50 else 1
+        terms = [term for term, count in df.most_common(self.max_terms) if count >= min_df]
+        if not terms:
+            raise ValueError("No indexable terms in the corpus")
+        self.vocabulary = {term: i for i, term in enumerate(terms)}
+        self.idf = np.log((1 + len(texts)) / (1 + np.array([df[t] for t in terms], dtype=np.float64))) + 1
+        self.components = self._randomized_svd(self._tfidf(texts), len(terms), rng)
+        return self
+
+    def _randomized_svd(self, matrix: _Sparse, columns: int, rng, power_iterations: int = 2) -> np.ndarray:
+        # Halko et al.: range finder on X @ random, refined by power iterations, then an exact SVD
+        # of the small projected matrix
+        rank = min(self.dims, matrix.rows, columns)
+        sketch = min(rank + 10, columns)
+        basis, _ = np.linalg.qr(matrix.dot(rng.standard_normal((columns, sketch))))
+        for _ in range(power_iterations):
+            back, _ = np.linalg.qr(matrix.tdot(basis, columns))
+            basis, _ = np.linalg.qr(matrix.dot(back))
+        _, _, vt = np.linalg.svd(matrix.tdot(basis, columns).T, full_matrices=False)
+        return vt[:rank].astype(np.float32)
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """Unit-length float32 vectors; texts with no known terms embed to zeros."""
+        return _normalize_rows(self._tfidf(texts).dot(self.components.T))
+
+    def save(self, path: str) -> None:
+        terms = np.array(sorted(self.vocabulary, key=self.vocabulary.get))
+        np.savez(path, terms=terms, idf=self.idf, components=self.components)
+
+    @classmethod
+    def load(cls, path: str, dims: int) -> "TfidfSvdEmbedder":
+        """dims is the configured dimension, kept so the config still matches on reopen."""
+        embedder = cls(dims=dims)
+        with np.load(path, allow_pickle=False) as state:
+            embedder.vocabulary = {str(term): i for i, term in enumerate(state["terms"])}
+            embedder.idf = state["idf"]
+            embedder.components = state["components"]
+        return embedder
+
+
+class SentenceTransformerEmbedder:
+    """Pretrained sentence-transformers model run locally on the CPU (optional dependency)."""
+
+    kind = "sentence-transformers"
+
+    def __init__(self, model: str):
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model
+        self.model = SentenceTransformer(model, device="cpu")
+        self.size = self.model.get_sentence_embedding_dimension()
+
+    @property
+    def config(self) -> Dict:
+        return {"kind": self.kind, "model": self.model_name}
+
+    def fit(self, texts: Sequence[str]) -> "SentenceTransformerEmbedder":
+        return self
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = self.model.encode(list(texts), batch_size=64, normalize_embeddings=True, convert_to_numpy=True)
+        return vectors.astype(np.float32, copy=False)
+
+    def save(self, path: str) -> None:
+        pass
+
+    @classmethod
+    def load(cls, path: str, model: str) -> "SentenceTransformerEmbedder":
+        return cls(model)
+
+
+def _nearest(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), EMBED_BATCH):
+        block = np.asarray(vectors[start:start + EMBED_BATCH])
+        assignments[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+def _kmeans(vectors: np.ndarray, lists: int, rng) -> np.ndarray:
+    """Spherical k-means centroids, trained on a sample of at most 64 rows per list."""
+    sample_size = min(len(vectors), max(lists * 64, 10000))
+    sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))])
+    centroids = sample[rng.choice(len(sample), lists, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assignments = _nearest(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, sample)
+        empty = np.bincount(assignments, minlength=lists) == 0
+        sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+        centroids = _normalize_rows(sums)
+    return centroids
+
+
+class VectorIndex:
+    """Project embeddings in an on-disk float32 matrix with an inverted-file (IVF) ANN index.
+
+    Rows are k-means clustered into ~sqrt(n) lists and written to vectors.f32 grouped
+    by list, so a query reads the `nprobe` nearest lists as contiguous slices of the
+    memory map: O(sqrt(n)) work per query instead of a scan of the corpus. Rows added
+    after the build sit in a small in-memory tail that is scanned exactly, and are
+    folded in by the next rebuild.
+
+    Each build is written to its own directory and published by rewriting CURRENT,
+    so a restart with an unchanged embedder config reopens the index without
+    re-embedding the corpus.
+    """
+
+    def __init__(self, directory: str, embedder: str = "tfidf", model: str = "all-MiniLM-L6-v2",
+                 dims: int = 128, nprobe: int = 32):
+        self.directory = directory
+        self.embedder_kind = embedder
+        self.model = model
+        self.dims = dims
+        self.nprobe = nprobe
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._embedder = None
+        self._vectors: Optional[np.ndarray] = None
+        self._keys: List[Any] = []
+        self._centroids: Optional[np.ndarray] = None
+        self._offsets: Optional[np.ndarray] = None
+        self._tail_keys: List[Any] = []
+        self._tail: Optional[np.ndarray] = None
+        self._known: set = set()
+        self._generation: Optional[str] = None
+        self._built_at: Optional[float] = None
+        self._build_seconds: Optional[float] = None
+        self.building = False
+
+    @property
+    def ready(self) -> bool:
+        return self._embedder is not None
+
+    def __len__(self) -> int:
+        return len(self._keys) + len(self._tail_keys)
+
+    def _new_embedder(self):
+        if self.embedder_kind == "sentence-transformers":
+            try:
+                return SentenceTransformerEmbedder(self.model)
+            except ImportError:
+                logging.warning("sentence-transformers is not installed; using the TF-IDF/SVD embedder")
+        return TfidfSvdEmbedder(dims=self.dims)
+
+    def _wanted_config(self) -> Dict:
+        if self.embedder_kind == "sentence-transformers" and importlib.util.find_spec("sentence_transformers"):
+            return {"kind": self.embedder_kind, "model": self.model}
+        return {"kind": "tfidf", "dims": self.dims}
+
+    def open(self) -> bool:
+        """Reopen the last published build. False if there is none or its embedder config differs."""
+        try:
+            with open(os.path.join(self.directory, "CURRENT")) as f:
+                generation = f.read().strip()
+            path = os.path.join(self.directory, generation)
+            with open(os.path.join(path, "meta.json")) as f:
+                meta = json.load(f)
+            if meta["embedder"] != self._wanted_config():
+                return False
+            if meta["embedder"]["kind"] == "tfidf":
+                embedder = TfidfSvdEmbedder.load(os.path.join(path, "embedder.npz"), self.dims)
+            else:
+                embedder = SentenceTransformerEmbedder.load(os.path.join(path, "embedder.npz"), self.model)
+            with open(os.path.join(path, "keys.json")) as f:
+                keys = json.load(f)
+            with np.load(os.path.join(path, "ivf.npz"), allow_pickle=False) as ivf:
+                centroids, offsets = ivf["centroids"], ivf["offsets"]
+            vectors = np.memmap(os.path.join(path, "vectors.f32"), dtype=np.float32, mode="r",
+                                shape=(meta["rows"], meta["dims"]))
+        except FileNotFoundError:
+            return False
+        except (ImportError, OSError, ValueError, KeyError) as e:
+            logging.warning(f"Vector index in {self.directory} not reused: {e}")
+            return False
+        self._install(generation, embedder, vectors, keys, centroids, offsets, meta.get("built_at"))
+        self._build_seconds = meta.get("build_seconds")
+        return True
+
+    def build(self, rows: Sequence[Dict], keys: Sequence[Any]) -> int:
+        """Fit the embedder, embed every row and publish a fresh IVF build. Returns rows indexed."""
+        with self._build_lock:
+            return self._rebuild(rows, keys)
+
+    def _rebuild(self, rows: Sequence[Dict], keys: Sequence[Any]) -> int:
+        self.building = True
+        try:
+            return self._build(rows, keys)
+        finally:
+            self.building = False
+
+    def _build(self, rows: Sequence[Dict], keys: Sequence[Any]) -> int:
+        started = time.time()
+        rng = np.random.default_rng(0)
+        embedder = self._new_embedder().fit([document(row) for row in rows])
+        generation = f"gen-{int(started * 1000)}"
+        path = os.path.join(self.directory, generation)
+        os.makedirs(path, exist_ok=True)
+        count, dims = len(rows), embedder.size
+
+        # Embed in batches into a scratch map, then copy out grouped by list
+        scratch_path = os.path.join(path, "unordered.f32")
+        scratch = np.memmap(scratch_path, dtype=np.float32, mode="w+", shape=(count, dims))
+        for start in range(0, count, EMBED_BATCH):
+            batch = rows[start:start + EMBED_BATCH]
+            scratch[start:start + len(batch)] = embedder.embed([document(row) for row in batch])
+
+        lists = 1 if count <= EXACT_SCAN_ROWS else min(4096, int(math.sqrt(count)))
+        if lists == 1:
+            centroids = _normalize_rows(scratch.mean(axis=0, keepdims=True))
+            assignments = np.zeros(count, dtype=np.int64)
+        else:
+            centroids = _kmeans(scratch, lists, rng)
+            assignments = _nearest(scratch, centroids)
+        order = np.argsort(assignments, kind="stable")
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=lists))])
+
+        vectors = np.memmap(os.path.join(path, "vectors.f32"), dtype=np.float32, mode="w+", shape=(count, dims))
+        for start in range(0, count, EMBED_BATCH):
+            vectors[start:start + EMBED_BATCH] = scratch[order[start:start + EMBED_BATCH]]
+        vectors.flush()
+        del scratch
+        os.remove(scratch_path)
+        ordered_keys = [keys[i] for i in order]
+
+        embedder.save(os.path.join(path, "embedder.npz"))
+        np.savez(os.path.join(path, "ivf.npz"), centroids=centroids, offsets=offsets)
+        with open(os.path.join(path, "keys.json"), "w") as f:
+            json.dump(ordered_keys, f)
+        build_seconds = round(time.time() - started, 3)
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({"embedder": embedder.config, "rows": count, "dims": dims, "lists": lists,
+                       "built_at": started, "build_seconds": build_seconds}, f)
+        current = os.path.join(self.directory, "CURRENT")
+        with open(current + ".tmp", "w") as f:
+            f.write(generation)
+        os.replace(current + ".tmp", current)
+
+        vectors = np.memmap(os.path.join(path, "vectors.f32"), dtype=np.float32, mode="r", shape=(count, dims))
+        previous = self._generation
+        self._install(generation, embedder, vectors, ordered_keys, centroids, offsets, started)
+        self._build_seconds = build_seconds
+        if previous and previous != generation:
+            # Open maps of the old files stay valid after the unlink
+            shutil.rmtree(os.path.join(self.directory, previous), ignore_errors=True)
+        return count
+
+    def _install(self, generation, embedder, vectors, keys, centroids, offsets, built_at) -> None:
+        with self._lock:
+            # Rows added while this build ran are kept in the tail
+            built = set(keys)
+            carried = [i for i, key in enumerate(self._tail_keys) if key not in built]
+            tail_keys = [self._tail_keys[i] for i in carried]
+            tail = self._tail[carried] if carried and self._embedder is not None else None
+            if tail is not None and tail.shape[1] != embedder.size:
+                tail, tail_keys = None, []
+            self._generation, self._embedder, self._vectors, self._keys = generation, embedder, vectors, keys
+            self._centroids, self._offsets, self._built_at = centroids, offsets, built_at
+            self._tail_keys, self._tail = tail_keys, tail
+            self._known = built | set(tail_keys)
+
+    def add(self, rows: Sequence[Dict], keys: Sequence[Any]) -> int:
+        """Embed rows into the in-memory tail; a key seen before is re-embedded. No-op until built."""
+        embedder = self._embedder
+        if embedder is None or not rows:
+            return 0
+        vectors = embedder.embed([document(row) for row in rows])
+        with self._lock:
+            if embedder is not self._embedder:
+                return 0
+            positions = {key: i for i, key in enumerate(self._tail_keys)}
+            tail = self._tail if self._tail is not None else np.empty((0, embedder.size), dtype=np.float32)
+            appended_keys, appended = [], []
+            for key, vector in zip(keys, vectors):
+                if key in positions:
+                    tail = tail.copy() if tail is self._tail else tail
+                    tail[positions[key]] = vector
+                else:
+                    positions[key] = len(self._tail_keys) + len(appended_keys)
+                    appended_keys.append(key)
+                    appended.append(vector)
+            if appended:
+                tail = np.vstack([tail, np.asarray(appended)])
+            self._tail_keys = self._tail_keys + appended_keys
+            self._tail = tail
+            self._known.update(keys)
+        return len(rows)
+
+    def sync(self, rows: Sequence[Dict], keys: Sequence[Any]) -> int:
+        """Bring the index up to date with the corpus: reopen or build it, embed rows it has
+        not seen, and rebuild once the tail outgrows the clustered part. Returns rows embedded."""
+        if not rows:
+            return 0
+        with self._build_lock:
+            if not self.ready and not self.open():
+                return self._rebuild(rows, keys)
+            missing = [i for i, key in enumerate(keys) if key not in self._known]
+            if len(self._tail_keys) + len(missing) > max(REBUILD_MIN_ROWS, len(self._keys) // 10):
+                return self._rebuild(rows, keys)
+            return self.add([rows[i] for i in missing], [keys[i] for i in missing])
+
+    def search(self, query: str, k: int = 100, nprobe: Optional[int] = None) -> List[Tuple[Any, float]]:
+        """Approximate top-k (key, cosine similarity) pairs, best first."""
+        with self._lock:
+            embedder, vectors, keys = self._embedder, self._vectors, self._keys
+            centroids, offsets = self._centroids, self._offsets
+            tail, tail_keys = self._tail, self._tail_keys
+        if embedder is None:
+            return []
+        q = embedder.embed([query])[0]
+        if not q.any():
+            return []
+
+        lists = np.arange(len(centroids))
+        nprobe = nprobe or self.nprobe
+        if nprobe < len(centroids):
+            lists = np.argpartition(-(centroids @ q), nprobe)[:nprobe]
+        positions, scores = [], []
+        for i in lists:
+            start, end = int(offsets[i]), int(offsets[i + 1])
+            if end > start:
+                positions.append(np.arange(start, end))
+                scores.append(vectors[start:end] @ q)
+        found = {}
+        if positions:
+            positions, scores = np.concatenate(positions), np.concatenate(scores)
+            best = np.argpartition(-scores, k)[:k] if k < len(scores) else np.arange(len(scores))
+            found = {keys[positions[i]]: float(scores[i]) for i in best}
+        if tail is not None and len(tail):
+            # Tail entries supersede an older embedding of the same key
+            tail_scores = tail @ q
+            best = np.argpartition(-tail_scores, k)[:k] if k < len(tail_scores) else np.arange(len(tail_scores))
+            found.update({tail_keys[i]: float(tail_scores[i]) for i in best})
+        return sorted(found.items(), key=lambda item: -item[1])[:k]
+
+    def stats(self) -> Dict:
+        return {
+            "ready": self.ready,
+            "building": self.building,
+            "embedder": self._embedder.config if self._embedder is not None else None,
+            "rows": len(self._keys),
+            "tail_rows": len(self._tail_keys),
+            "lists": len(self._centroids) if self._centroids is not None else 0,
+            "nprobe": self.nprobe,
+            "directory": self.directory,
+            "built_at": self._built_at,
+            "build_seconds": self._build_seconds,
+        }